@@ -0,0 +1,574 @@
+import logging
+import os
+import random
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError, as_completed, wait
+
+from config import Config
+from schedule_store import schedule_store
+from shared_cache import shared_cache
+import metrics
+import upstream
+
+logger = logging.getLogger(__name__)
+
+AMION_URL = Config.AMION_BASE_URL + '/cgi-bin/ocs?Lo={location}&Rpt=619&Day={day}&Month={month}&Year={year}'
+
+# Services shown on the on-call page, declared in Config.AMION_FEEDS
+FEEDS = Config.AMION_FEEDS
+_FEEDS_BY_LOCATION = {feed['location']: feed for feed in FEEDS.values()}
+
+class StaleCSV(str):
+    """A last-known-good CSV served from the schedule store because Amion failed."""
+
+    def __new__(cls, csv_text, stored_at):
+        value = super().__new__(cls, csv_text)
+        value.stored_at = stored_at
+        return value
+
+class TTLCache:
+    """Thread-safe, size-bounded LRU cache with per-entry TTLs.
+
+    Entries younger than their TTL are served as-is. Entries past their TTL but
+    within ``stale_ttl`` are still served immediately while one of
+    ``refresh_workers`` background threads reloads them (stale-while-revalidate).
+    Anything older is loaded inline.
+    ``ttl`` may be a function of the loaded value.
+
+    With a ``shared`` cache (shared_cache.SharedCache), misses check it before
+    loading and every value that passes ``shareable`` is written through to
+    it, so other worker processes pick it up instead of loading it again.
+    """
+
+    def __init__(self, name, max_entries, stale_ttl, shared=None, shareable=None,
+                 refresh_workers=Config.AMION_REFRESH_WORKERS):
+        self.name = name
+        self.max_entries = max_entries
+        self.stale_ttl = stale_ttl
+        self.shared = shared
+        self.shareable = shareable or (lambda value: True)
+        self._entries = OrderedDict()  # key -> (value, stored_at, ttl)
+        self._refreshing = set()
+        self._refresh_executor = ThreadPoolExecutor(max_workers=refresh_workers,
+                                                    thread_name_prefix=f'{name}-refresh')
+        self._lock = threading.Lock()
+
+    def get_or_load(self, key, loader, ttl):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+
+        if entry is not None:
+            value, stored_at, entry_ttl = entry
+            age = time.monotonic() - stored_at
+            if age < entry_ttl:
+                metrics.cache_lookups.inc(self.name, 'hit')
+                return value
+            if age < entry_ttl + self.stale_ttl:
+                metrics.cache_lookups.inc(self.name, 'stale')
+                self._refresh_in_background(key, loader, ttl)
+                return value
+
+        return self._load(key, loader, ttl)
+
+    def _load(self, key, loader, ttl):
+        """Take a fresh copy another worker shared, or else run ``loader``."""
+        if self.shared is not None:
+            found = self.shared.get(self._shared_key(key))
+            if found is not None:
+                value, remaining = found
+                metrics.cache_lookups.inc(self.name, 'shared')
+                self._store(key, value, remaining)
+                return value
+        metrics.cache_lookups.inc(self.name, 'miss')
+        value = loader()
+        self.set(key, value, ttl)
+        return value
+
+    def set(self, key, value, ttl):
+        if callable(ttl):
+            ttl = ttl(value)
+        self._store(key, value, ttl)
+        if self.shared is not None and self.shareable(value):
+            self.shared.set(self._shared_key(key), value, ttl)
+
+    def _shared_key(self, key):
+        parts = key if isinstance(key, tuple) else (key,)
+        return '|'.join([self.name, *map(str, parts)])
+
+    def _store(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic(), ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _refresh_in_background(self, key, loader, ttl):
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        def refresh():
+            try:
+                self._load(key, loader, ttl)
+            except Exception as e:
+                logger.warning("Background refresh failed for %s: %s", key, e)
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        # Queued refreshes are bounded too: at most one per cached key
+        self._refresh_executor.submit(refresh)
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class SingleFlight:
+    """Collapse concurrent calls that share a key into a single execution.
+
+    The first caller for a key runs ``fn``; callers that arrive while it is in
+    flight wait for it and receive the same result or exception.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+# Stored-copy fallbacks stay per worker; each one re-checks Amion for itself
+schedule_cache = TTLCache('amion_schedule', Config.AMION_CACHE_MAX_ENTRIES, Config.AMION_CACHE_STALE_TTL,
+                          shared=shared_cache, shareable=lambda value: not isinstance(value, StaleCSV))
+inflight = SingleFlight()
+feed_executor = ThreadPoolExecutor(max_workers=Config.AMION_FETCH_WORKERS, thread_name_prefix='amion-fetch')
+# Separate pool so a month-long range request cannot starve single-day views
+range_executor = ThreadPoolExecutor(max_workers=Config.AMION_RANGE_WORKERS, thread_name_prefix='amion-range')
+breakers = {
+    feed['location']: upstream.CircuitBreaker(feed['location'], Config.AMION_BREAKER_FAILURES, Config.AMION_BREAKER_RESET)
+    for feed in FEEDS.values()
+}
+
+def fetch_schedule_csv(location, day, month, year):
+    """Download one day's Rpt=619 CSV for an Amion location, bypassing the cache.
+
+    Goes through the location's circuit breaker, so while Amion is failing for
+    a feed this raises upstream.CircuitOpenError without making a request.
+    """
+    url = AMION_URL.format(location=location, day=day, month=month, year=year)
+    breaker = breakers.get(location)
+    start = time.perf_counter()
+    outcome = 'ok'
+    try:
+        if breaker is None:
+            return upstream.client.get(url).decode('utf-8')
+        return breaker.call(lambda: upstream.client.get(url)).decode('utf-8')
+    except upstream.CircuitOpenError:
+        outcome = 'circuit_open'
+        raise
+    except upstream.UpstreamBusyError:
+        outcome = 'busy'
+        raise
+    except Exception:
+        outcome = 'error'
+        raise
+    finally:
+        metrics.upstream_seconds.observe(time.perf_counter() - start, location, outcome)
+
+def _cache_key(location, day, month, year):
+    return (location, int(day), int(month), int(year))
+
+def _cache_ttl(location):
+    """TTL for a cached CSV: the feed's own, or a short one for a stale fallback."""
+    ttl = _FEEDS_BY_LOCATION.get(location, {}).get('ttl', Config.CACHE_DEFAULT_TIMEOUT)
+    return lambda value: Config.AMION_FALLBACK_TTL if isinstance(value, StaleCSV) else ttl
+
+def _is_past(location, day, month, year):
+    """Whether an Amion request date falls on a calendar day before today."""
+    offset = _FEEDS_BY_LOCATION.get(location, {}).get('year_offset', 0)
+    try:
+        return date(year - offset, month, day) < date.today()
+    except ValueError:
+        return False
+
+def _fetch_and_store(key):
+    data = inflight.do(key, lambda: fetch_schedule_csv(*key))
+    try:
+        schedule_store.save(*key, data)
+    except (sqlite3.Error, OSError) as e:
+        # The fetch worked; a busy or broken store only costs this revision's history
+        logger.warning("Could not store %s %s: %s", key[0], key[1:], e)
+    return data
+
+def load_schedule_csv(location, day, month, year):
+    """Load a CSV that is not in the cache.
+
+    Past dates come from the local schedule store when it has them; everything
+    else is fetched from Amion and persisted. If Amion fails (or the feed's
+    circuit breaker is open), the last stored copy is returned as a StaleCSV.
+    """
+    key = _cache_key(location, day, month, year)
+    if _is_past(*key):
+        stored = schedule_store.latest(*key)
+        if stored is not None:
+            return stored
+    try:
+        return _fetch_and_store(key)
+    except Exception as e:
+        revision = schedule_store.latest_revision(*key)
+        if revision is None:
+            raise
+        if not isinstance(e, upstream.CircuitOpenError):
+            logger.warning("Amion fetch failed for %s %s, serving stored copy: %s", location, key[1:], e)
+        return StaleCSV(*revision)
+
+def get_schedule_csv(location, day, month, year):
+    """Return the CSV for an Amion location and date, served from the shared cache."""
+    key = _cache_key(location, day, month, year)
+    return schedule_cache.get_or_load(key, lambda: load_schedule_csv(*key), _cache_ttl(location))
+
+def refresh_schedule_csv(location, day, month, year):
+    """Fetch the CSV from Amion now and replace whatever the cache holds."""
+    key = _cache_key(location, day, month, year)
+    data = _fetch_and_store(key)
+    schedule_cache.set(key, data, _cache_ttl(location))
+    return data
+
+# Same field splitting the browser used, so parsed output matches what it rendered
+_FIELD_RE = re.compile(r'(".*?"|[^",\s]+)(?=\s*,|\s*$)')
+
+def _rows(csv_text, min_fields):
+    """Yield the cleaned fields of each data row, skipping Amion's five header lines."""
+    for line in csv_text.split('\n')[5:]:
+        if not line.strip():
+            continue
+        parts = _FIELD_RE.findall(line)
+        if len(parts) < min_fields:
+            continue
+        yield [part.replace('"', '').strip() for part in parts]
+
+def parse_schedule(csv_text):
+    """Resident schedule: ``{role: [{'name', 'time'}]}``."""
+    teams = {}
+    for fields in _rows(csv_text, 9):
+        name, role, start_time, end_time = fields[0], fields[3], fields[7], fields[8]
+        if not name or not role or role == 'Assignment name':
+            continue
+        teams.setdefault(role, []).append({'name': name, 'time': f'{start_time}-{end_time}'})
+    return teams
+
+def parse_churchill(csv_text):
+    """Churchill attendings plus the Blue APP roster."""
+    attendings = {'day': None, 'night': None, 'backup': None, 'pancreatitis': None, 'blueApp': []}
+    roles = {'Churchill Day': 'day', 'Churchill Night': 'night', 'Backup': 'backup', 'Pancreatitis': 'pancreatitis'}
+    for fields in _rows(csv_text, 9):
+        name, role, start_time, end_time = fields[0], fields[3], fields[7], fields[8]
+        if role in roles:
+            attendings[roles[role]] = name
+        elif 'blue app' in role.lower():
+            attendings['blueApp'].append({'name': name, 'time': f'{start_time}-{end_time}'})
+    return attendings
+
+def _attending_parser(attending_role, fellow_role):
+    def parse(csv_text):
+        attendings = {'attending': None, 'fellow': None}
+        for fields in _rows(csv_text, 4):
+            name, role = fields[0], fields[3]
+            if role == attending_role:
+                attendings['attending'] = name
+            elif role == fellow_role:
+                attendings['fellow'] = name
+        return attendings
+    return parse
+
+def parse_cardiac(csv_text):
+    """Cardiac rows lead with the division, so name and role sit one column later."""
+    attendings = {'attending': None, 'fellow': None}
+    for fields in _rows(csv_text, 4):
+        division, name = fields[0], fields[1]
+        role = fields[4] if len(fields) > 4 else None
+        if division == 'Attendings' and role == 'General Cardiac Call':
+            attendings['attending'] = name
+        elif division == 'Resident' and role == 'In House Fellow':
+            attendings['fellow'] = name
+    return attendings
+
+def _parser_for(feed):
+    if feed['parser'] == 'attending':
+        return _attending_parser(*feed['roles'])
+    return {'schedule': parse_schedule, 'churchill': parse_churchill, 'cardiac': parse_cardiac}[feed['parser']]
+
+PARSERS = {service: _parser_for(feed) for service, feed in FEEDS.items()}
+
+@lru_cache(maxsize=Config.AMION_CACHE_MAX_ENTRIES)
+def parse_feed(service, csv_text):
+    """Parse a feed's CSV into its compact JSON form.
+
+    Memoized on the CSV text: cached feeds hand back the same string object, so
+    repeat lookups are a hash hit and each download is parsed only once.
+    """
+    return PARSERS[service](csv_text)
+
+def _parse_feed_stats():
+    info = parse_feed.cache_info()
+    return {('parse_feed', 'hit'): info.hits, ('parse_feed', 'miss'): info.misses}
+
+metrics.register_cache_collector(_parse_feed_stats)
+
+def get_feed_csv(service, day, month, year):
+    """Return the CSV for a service in FEEDS on the given calendar date."""
+    feed = FEEDS[service]
+    return get_schedule_csv(feed['location'], day, month, int(year) + feed['year_offset'])
+
+def get_feed(service, day, month, year):
+    """Return a service's parsed schedule for the given calendar date."""
+    return parse_feed(service, get_feed_csv(service, day, month, year))
+
+def _load_feed(service, day, month, year):
+    csv_text = get_feed_csv(service, day, month, year)
+    return csv_text, parse_feed(service, csv_text)
+
+def feed_health():
+    """Circuit breaker state of every feed."""
+    return {
+        service: {'state': breakers[feed['location']].state, 'failures': breakers[feed['location']].failures}
+        for service, feed in FEEDS.items()
+    }
+
+def fetch_feeds(services, day, month, year, timeout=Config.AMION_BATCH_TIMEOUT):
+    """Fetch and parse several services concurrently, reporting on each separately.
+
+    Returns ``{service: {'status': 'ok', 'data': parsed}}`` for feeds that loaded
+    and ``{'status': 'error'|'timeout', 'error': message}`` for those that did
+    not, so one slow or failing feed never sinks the others. Feeds served from
+    the last stored copy because Amion is failing also carry ``'stale': True``
+    and ``'storedAt'``. Fetches that miss the deadline keep running and still
+    land in the cache.
+    """
+    futures = {service: feed_executor.submit(_load_feed, service, day, month, year) for service in services}
+    deadline = time.monotonic() + timeout
+    results = {}
+    for service, future in futures.items():
+        done, _ = wait([future], timeout=max(0, deadline - time.monotonic()))
+        results[service] = _feed_result(service, future) if done else _TIMEOUT_RESULT
+    return results
+
+_TIMEOUT_RESULT = {'status': 'timeout', 'error': 'Amion did not respond in time'}
+
+def _feed_result(service, future):
+    """The per-service entry fetch_feeds reports for a finished _load_feed future."""
+    try:
+        csv_text, data = future.result()
+    except Exception as e:
+        logger.error("Error fetching %s schedule: %s", service, e)
+        # The details (hosts, sizes, parser errors) stay in the log
+        return {'status': 'error', 'error': f'Failed to fetch {service} schedule'}
+    result = {'status': 'ok', 'data': data}
+    if isinstance(csv_text, StaleCSV):
+        result.update(stale=True, storedAt=csv_text.stored_at)
+    return result
+
+def parse_date_range(start, end):
+    """Parse ISO ``start``/``end`` query values into dates; raises ValueError if the range is unusable."""
+    try:
+        start, end = date.fromisoformat(start), date.fromisoformat(end)
+    except (TypeError, ValueError):
+        raise ValueError('start and end must be dates like 2025-01-31')
+    days = (end - start).days + 1
+    if days < 1:
+        raise ValueError('end must not be before start')
+    if days > Config.AMION_RANGE_MAX_DAYS:
+        raise ValueError(f'Ranges are limited to {Config.AMION_RANGE_MAX_DAYS} days')
+    return start, end
+
+def iter_feed_range(services, start, end, timeout=Config.AMION_RANGE_TIMEOUT):
+    """Fetch and parse several services for every date from ``start`` to ``end``.
+
+    All the (service, date) fetches go to a bounded pool at once, earliest date
+    first, and go through the same caches as single-day requests. Yields
+    ``{'date': ISO date, 'services': {...}}`` (entries as in fetch_feeds) for
+    each date as soon as all of its services have finished, so callers can
+    stream a week or month out as it fills in. Dates still incomplete at the
+    deadline are yielded last, with their missing services timed out.
+    Closing the generator early cancels fetches that have not started.
+    """
+    days = [start + timedelta(days=offset) for offset in range((end - start).days + 1)]
+    futures = {}
+    for day in days:
+        for service in services:
+            future = range_executor.submit(_load_feed, service, day.day, day.month, day.year)
+            futures[future] = (day, service)
+
+    pending = {day: set(services) for day in days}
+    results = {day: {} for day in days}
+    try:
+        try:
+            for future in as_completed(futures, timeout=timeout):
+                day, service = futures[future]
+                results[day][service] = _feed_result(service, future)
+                pending[day].discard(service)
+                if not pending[day]:
+                    del pending[day]
+                    yield {'date': day.isoformat(), 'services': results.pop(day)}
+        except FutureTimeoutError:
+            for day in sorted(pending):
+                for service in pending[day]:
+                    results[day][service] = _TIMEOUT_RESULT
+                yield {'date': day.isoformat(), 'services': results.pop(day)}
+    finally:
+        for future in futures:
+            future.cancel()
+
+class Prefetcher(threading.Thread):
+    """Background thread that keeps the cache warm for dates around today.
+
+    Every cycle it re-downloads each service in FEEDS for today minus
+    ``days_before`` through today plus ``days_after``, at most ``concurrency``
+    fetches at a time. Cycles run every ``peak_interval`` seconds inside
+    ``peak_hours`` and every ``interval`` seconds otherwise, plus up to
+    ``jitter`` seconds so restarts do not synchronize.
+
+    With ``shared``, every gunicorn worker runs one but only the worker holding
+    a lease in the shared cache fetches; the others read its results from
+    there. When the holder exits it releases the lease and another worker
+    takes over at its next cycle; a holder that crashes is replaced once its
+    lease expires.
+    """
+
+    LEASE_KEY = 'amion-prefetch:leader'
+
+    def __init__(self, days_before, days_after, interval, peak_interval, peak_hours, jitter, concurrency,
+                 shared=None):
+        super().__init__(name='amion-prefetch', daemon=True)
+        self.shared = shared
+        self.owner = os.getpid()
+        self.leading = shared is None
+        # Outlives the longest gap between cycles, so a live holder never loses it
+        self.lease_ttl = 2 * (max(interval, peak_interval) + jitter)
+        self.days_before = days_before
+        self.days_after = days_after
+        self.interval = interval
+        self.peak_interval = peak_interval
+        self.peak_hours = peak_hours
+        self.jitter = jitter
+        self.executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='amion-prefetch')
+        self.last_refreshed = {}  # (service, ISO date) -> ISO timestamp
+        self.last_run = None
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            if self.claim():
+                self.prefetch_window()
+            self._stop_event.wait(self.next_delay())
+
+    def claim(self):
+        """Whether this process should prefetch this cycle."""
+        if self.shared is None:
+            return True
+        leading = self.shared.claim(self.LEASE_KEY, self.owner, self.lease_ttl)
+        if leading != self.leading:
+            logger.info("Process %d %s prefetching", self.owner, 'took over' if leading else 'stopped')
+            self.leading = leading
+        return leading
+
+    def stop(self):
+        self._stop_event.set()
+        self.executor.shutdown(wait=False)
+        if self.shared is not None and self.leading:
+            self.shared.release(self.LEASE_KEY, self.owner)  # let another worker take over now
+
+    def next_delay(self):
+        hour = datetime.now().hour
+        at_peak = any(start <= hour < end for start, end in self.peak_hours)
+        return (self.peak_interval if at_peak else self.interval) + random.uniform(0, self.jitter)
+
+    def prefetch_window(self):
+        today = date.today()
+        jobs = [
+            self.executor.submit(self.prefetch, service, today + timedelta(days=offset))
+            for offset in range(-self.days_before, self.days_after + 1)
+            for service in FEEDS
+        ]
+        for job in jobs:
+            job.result()
+        self.last_run = datetime.now().isoformat(timespec='seconds')
+
+    def prefetch(self, service, day):
+        feed = FEEDS[service]
+        try:
+            refresh_schedule_csv(feed['location'], day.day, day.month, day.year + feed['year_offset'])
+            with self._lock:
+                self.last_refreshed[(service, day.isoformat())] = datetime.now().isoformat(timespec='seconds')
+        except upstream.CircuitOpenError:
+            pass  # the breaker already reported the outage; try again next cycle
+        except Exception as e:
+            logger.warning("Prefetch failed for %s on %s: %s", service, day.isoformat(), e)
+
+    def status(self):
+        """When each prefetched entry was last refreshed, grouped by date."""
+        with self._lock:
+            entries = sorted(self.last_refreshed.items(), key=lambda item: item[0][1])
+        dates = {}
+        for (service, day), refreshed_at in entries:
+            dates.setdefault(day, {})[service] = refreshed_at
+        return {'last_run': self.last_run, 'leading': self.leading, 'dates': dates}
+
+def start_prefetcher(shared=False):
+    """Start the background prefetcher if it is enabled in Config.
+
+    ``shared`` is for processes that run side by side (gunicorn workers): they
+    elect one prefetcher through the shared cache. Without a shared cache each
+    worker has only its own cache to warm, so each one prefetches.
+    """
+    if not Config.AMION_PREFETCH_ENABLED:
+        return None
+    prefetcher = Prefetcher(
+        days_before=Config.AMION_PREFETCH_DAYS_BEFORE,
+        days_after=Config.AMION_PREFETCH_DAYS_AFTER,
+        interval=Config.AMION_PREFETCH_INTERVAL,
+        peak_interval=Config.AMION_PREFETCH_PEAK_INTERVAL,
+        peak_hours=Config.AMION_PREFETCH_PEAK_HOURS,
+        jitter=Config.AMION_PREFETCH_JITTER,
+        concurrency=Config.AMION_PREFETCH_CONCURRENCY,
+        shared=shared_cache if shared else None,
+    )
+    prefetcher.start()
+    return prefetcher
@@ -1,111 +1,295 @@
-from flask import Flask, request, jsonify, session
-from flask_session import Session
+from flask import Flask, Response, g, request, jsonify, send_file, send_from_directory
 import os
-import sqlite3
-import requests
+import json
+import logging
+import queue
+import threading
+import time
 from datetime import datetime
 import csv
 from io import StringIO
-import redis
 from dotenv import load_dotenv
+from config import Config
+import amion
+import assets
+import auth
+import live
+import logsetup
+import metrics
+import phonebook
+import ratelimit
+import upstream
 
 # Load environment variables
 load_dotenv()
 
-app = Flask(__name__)
+logsetup.configure_logging()
+access_logger = logging.getLogger('access')
+logger = logging.getLogger(__name__)
 
-# Configure Redis for session handling
-app.config['SESSION_TYPE'] = 'redis'
-app.config['SESSION_REDIS'] = redis.from_url(os.getenv('REDIS_URL', 'redis://localhost:6379'))
-Session(app)
+app = Flask(__name__, static_folder=Config.STATIC_BUILD_DIR)
 
-# Database connection
-def get_db_connection():
-    conn = sqlite3.connect('data/phonebook.db')
-    conn.row_factory = sqlite3.Row
-    return conn
-
-# Authentication middleware
+# Authentication middleware: checks the signed session token in-process
 def require_auth(f):
     def decorated(*args, **kwargs):
-        if not session.get('authenticated'):
+        if not auth.authenticate(request.headers.get('Authorization')):
             return jsonify({'error': 'Unauthorized'}), 401
         return f(*args, **kwargs)
     decorated.__name__ = f.__name__
     return decorated
 
+@app.before_request
+def start_timer():
+    g.start = time.perf_counter()
+    metrics.requests_in_flight.inc()
+
+@app.after_request
+def record_request(response):
+    duration = time.perf_counter() - g.start
+    route = request.url_rule.rule if request.url_rule else 'other'
+    metrics.request_seconds.observe(duration, route, request.method, str(response.status_code))
+    access_logger.info(
+        '%s %s %s %.1fms', request.method, route, response.status_code, duration * 1000,
+        extra={'client': request.remote_addr, 'method': request.method, 'route': route,
+               'status': response.status_code, 'duration_ms': round(duration * 1000, 1),
+               'sample': response.status_code < 500 and duration < Config.LOG_SLOW_REQUEST},
+    )
+    return response
+
+@app.teardown_request
+def finish_request(exc):
+    if 'start' in g:
+        metrics.requests_in_flight.dec()
+
+@app.route('/metrics')
+def get_metrics():
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.before_request
+def enforce_rate_limit():
+    if ratelimit.limiter is None or not ratelimit.is_limited_path(request.path):
+        return None
+    route = request.url_rule.rule if request.url_rule else 'other'
+    client, endpoint = ratelimit.identify(request.remote_addr, request.headers, route)
+    allowed, retry_after = ratelimit.limiter.check(client, endpoint)
+    if not allowed:
+        return jsonify({'error': 'Too many requests'}), 429, {'Retry-After': str(retry_after)}
+    return None
+
+@app.after_request
+def cache_hashed_assets(response):
+    # Hashed builds never change under the same name, so browsers can keep them
+    if request.path.startswith('/static/') and assets.manifest.is_hashed(request.path[len('/static/'):]):
+        response.headers['Cache-Control'] = assets.IMMUTABLE_CACHE_CONTROL
+    return response
+
+@app.route('/')
+def index():
+    path = assets.manifest.index_path() or os.path.join(app.root_path, 'index.html')
+    return send_file(path, max_age=0)
+
+# The source index.html (no build yet) links these directly; the built one uses /static
+@app.route('/script.js')
+@app.route('/styles.css')
+def source_asset():
+    return send_file(os.path.join(app.root_path, request.path.lstrip('/')), max_age=0)
+
+@app.route('/images/<path:name>')
+def image(name):
+    return send_from_directory(os.path.join(app.root_path, 'images'), name)
+
 @app.route('/verify', methods=['GET'])
 def verify():
+    # Exchange the password (or a still-valid token) for a fresh session token
     auth_header = request.headers.get('Authorization')
-    if not auth_header:
+    if auth.check_password(auth_header):
+        issued = auth.issue_token()
+    else:
+        issued = auth.refresh_token(auth.bearer_token(auth_header))  # a refresh keeps its session
+    if issued is None:
         return jsonify({'success': False}), 401
-    
-    try:
-        # Your existing verification logic
-        session['authenticated'] = True
-        return jsonify({'success': True})
-    except Exception as e:
-        return jsonify({'success': False, 'error': str(e)}), 401
+
+    token, expires = issued
+    response = jsonify({'success': True, 'token': token, 'expires': expires})
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+@app.route('/logout', methods=['POST'])
+def logout():
+    token = auth.bearer_token(request.headers.get('Authorization'))
+    if token:
+        auth.revoke_token(token)
+    return jsonify({'success': True})
 
 @app.route('/api/phone/contacts')
 @require_auth
 def get_contacts():
     category = request.args.get('category')
     search = request.args.get('search')
-    
+    since = request.args.get('since')
     try:
-        with get_db_connection() as conn:
-            cursor = conn.cursor()
-            
-            query = '''
-                SELECT 
-                    c.*,
-                    cat.name as category_name,
-                    cat.display_name as category_display_name
-                FROM contacts c
-                JOIN categories cat ON c.category_id = cat.id
-                WHERE c.is_active = 1
-            '''
-            params = []
-            
-            if category:
-                query += ' AND cat.name = ?'
-                params.append(category)
-            
-            if search:
-                query += ' AND (c.name LIKE ? OR c.role LIKE ? OR c.phone_number LIKE ?)'
-                search_param = f'%{search}%'
-                params.extend([search_param, search_param, search_param])
-            
-            cursor.execute(query, params)
-            contacts = [dict(row) for row in cursor.fetchall()]
-            return jsonify(contacts)
-            
+        fields = phonebook.parse_fields(request.args.get('fields', ''))
+        limit, after = phonebook.parse_page(request.args.get('limit'), request.args.get('cursor'), search)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    try:
+        if since is not None:
+            # Delta sync: everything changed since the client's cursor, filters ignored
+            with phonebook.get_db_connection() as conn:
+                response = jsonify(phonebook.contacts_changed_since(conn, since, fields))
+            response.add_etag()
+            response.headers['Cache-Control'] = 'private, no-cache'
+            return response.make_conditional(request)
+
+        with phonebook.get_db_connection() as conn:
+            etag = phonebook.listing_etag(conn, category, search, fields, limit, after)
+            if etag is not None and request.if_none_match.contains_weak(etag):
+                response = Response(status=304)
+                response.set_etag(etag, weak=True)
+                return response
+            # Fetch one extra row when paging so we know whether a next page exists
+            rows = phonebook.iter_contacts(conn, category, search, fields,
+                                           limit=limit + 1 if limit is not None else None, after=after)
+        # Stream rows straight from the cursor instead of building the whole list
+        response = Response(phonebook.stream_contacts_json(rows, limit, pageable=not search),
+                            mimetype='application/json')
+        response.headers['Cache-Control'] = 'private, no-cache'
+        if etag is not None:
+            response.set_etag(etag, weak=True)
+        return response
+
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/schedule')
+def feed_csv_view(service):
+    """View serving one feed's raw CSV; the year is passed to Amion as given."""
+    location = amion.FEEDS[service]['location']
+
+    def view():
+        day = request.args.get('day', datetime.now().strftime('%d'))
+        month = request.args.get('month', datetime.now().strftime('%m'))
+        year = request.args.get('year', datetime.now().strftime('%Y'))
+        try:
+            data = amion.get_schedule_csv(location, day, month, year)
+        except ValueError:
+            return jsonify({'error': 'Invalid date'}), 400
+        except upstream.CircuitOpenError as e:
+            # Amion is down for this feed and nothing is stored: fail fast
+            return jsonify({'error': f'{service} schedule is unavailable; try again later'}), 503, \
+                {'Retry-After': str(e.retry_after)}
+        except upstream.UpstreamError as e:
+            logger.error("Error fetching %s schedule: %s", service, e)
+            return jsonify({'error': f'Failed to fetch {service} schedule'}), e.status or 502
+        except Exception:
+            # A bad CSV or a store error; the client still expects JSON
+            logger.exception("Error serving %s schedule", service)
+            return jsonify({'error': f'Failed to fetch {service} schedule'}), 500
+
+        response = Response(data, mimetype='text/csv')
+        if isinstance(data, amion.StaleCSV):
+            response.headers['Warning'] = '110 - "Response is Stale"'
+            response.headers['X-Stored-At'] = data.stored_at
+        return response
+
+    view.__name__ = f'get_{service}_csv'
+    return require_auth(view)
+
+# One CSV route per feed in the registry
+for service, feed in amion.FEEDS.items():
+    app.add_url_rule(feed['path'], view_func=feed_csv_view(service))
+
+@app.route('/api/schedules')
 @require_auth
-def get_schedule():
+def get_schedules():
+    day = request.args.get('day', datetime.now().strftime('%d'))
+    month = request.args.get('month', datetime.now().strftime('%m'))
+    year = request.args.get('year', datetime.now().strftime('%Y'))
+    requested = request.args.get('services')
+    services = requested.split(',') if requested else list(amion.FEEDS)
+
+    unknown = [service for service in services if service not in amion.FEEDS]
+    if unknown:
+        return jsonify({'error': f"Unknown services: {', '.join(unknown)}"}), 400
+
     try:
-        day = request.args.get('day')
-        month = request.args.get('month')
-        year = request.args.get('year')
-        
-        # Your existing Amion fetching logic
-        url = f"http://www.amion.com/cgi-bin/ocs?Lo=mghsurg&Rpt=619&Day={day}&Month={month}&Year={year}"
-        response = requests.get(url)
-        
-        if response.ok:
-            return response.text
-        else:
-            return jsonify({'error': 'Failed to fetch schedule'}), response.status_code
-            
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        date = datetime(int(year), int(month), int(day)).strftime('%Y-%m-%d')
+    except ValueError:
+        return jsonify({'error': 'Invalid date'}), 400
+
+    results = amion.fetch_feeds(services, day, month, year)
+    return jsonify({'date': date, 'services': results})
+
+@app.route('/api/schedules/range')
+@require_auth
+def get_schedule_range():
+    requested = request.args.get('services')
+    services = requested.split(',') if requested else list(amion.FEEDS)
+
+    unknown = [service for service in services if service not in amion.FEEDS]
+    if unknown:
+        return jsonify({'error': f"Unknown services: {', '.join(unknown)}"}), 400
+
+    try:
+        start, end = amion.parse_date_range(request.args.get('start'), request.args.get('end'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    def stream():
+        # One JSON line per date, sent as soon as all of that date's services are in
+        days = amion.iter_feed_range(services, start, end)
+        try:
+            for day in days:
+                yield json.dumps(day, separators=(',', ':')) + '\n'
+        finally:
+            days.close()
+
+    return Response(stream(), mimetype='application/x-ndjson', headers={'Cache-Control': 'no-store'})
+
+live_streams = threading.BoundedSemaphore(Config.LIVE_MAX_THREAD_STREAMS)
+
+@app.route('/api/schedules/live')
+@require_auth
+def schedule_live():
+    try:
+        keys = live.parse_watch(request.args.get('date'), request.args.get('services'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    # Each open stream holds one of this worker's request threads, so only a
+    # few may be open at once; everyone else polls
+    if not live_streams.acquire(blocking=False):
+        return jsonify(live.BUSY), 503, {'Retry-After': live.BUSY_RETRY_AFTER}
+    subscriber = live.QueueSubscriber()
+    if not live.get_watcher().subscribe(subscriber, keys):
+        live_streams.release()
+        return jsonify(live.BUSY), 503, {'Retry-After': live.BUSY_RETRY_AFTER}
+
+    def stream():
+        # Ends after a while and the client reconnects, so no thread is held for good
+        deadline = time.monotonic() + Config.LIVE_STREAM_MAX_SECONDS
+        yield live.PREAMBLE
+        while time.monotonic() < deadline:
+            try:
+                event = subscriber.events.get(timeout=Config.LIVE_HEARTBEAT)
+            except queue.Empty:
+                continue
+            if event is None:
+                break
+            yield event
+
+    closed = threading.Lock()
+
+    def close():
+        # Runs when the server closes the response, even if the stream never started
+        if closed.acquire(blocking=False):
+            live.get_watcher().unsubscribe(subscriber)
+            live_streams.release()
 
-# Similar routes for churchill, vascular, thoracic, and cardiac
-# Each with proper authentication and error handling
+    response = Response(stream(), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-store', 'X-Accel-Buffering': 'no'})
+    response.call_on_close(close)
+    return response
 
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=int(os.getenv('PORT', 8000))) 
\ No newline at end of file
@@ -0,0 +1,77 @@
+import json
+import logging
+import os
+import threading
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = 'manifest.json'
+
+IMMUTABLE_CACHE_CONTROL = f'public, max-age={Config.STATIC_IMMUTABLE_MAX_AGE}, immutable'
+
+class AssetManifest:
+    """The manifest written by build_assets.py, reloaded whenever a new build lands.
+
+    Without a build the app keeps serving the unhashed sources from the repo root.
+    """
+
+    def __init__(self, build_dir):
+        self.build_dir = build_dir
+        self.path = os.path.join(build_dir, MANIFEST_NAME)
+        self._mtime = None
+        self._hashed = frozenset()
+        self._lock = threading.Lock()
+
+    def _refresh(self):
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except OSError:
+            mtime = None
+        if mtime == self._mtime:
+            return
+        with self._lock:
+            hashed = frozenset()
+            if mtime is not None:
+                try:
+                    with open(self.path, encoding='utf-8') as f:
+                        hashed = frozenset(json.load(f)['files'].values())
+                except (OSError, ValueError, KeyError) as e:
+                    logger.error("Error loading asset manifest: %s", e)
+            self._hashed = hashed
+            self._mtime = mtime
+
+    @property
+    def built(self):
+        self._refresh()
+        return bool(self._hashed)
+
+    def is_hashed(self, name):
+        """Whether ``name`` is a content-hashed file from the current build."""
+        self._refresh()
+        return name in self._hashed
+
+    def resolve(self, url_path):
+        """Filesystem path for a /static/<hashed name> URL, or None."""
+        prefix = '/static/'
+        if not url_path.startswith(prefix):
+            return None
+        name = url_path[len(prefix):]
+        if not self.is_hashed(name):
+            return None
+        return os.path.join(self.build_dir, name)
+
+    def hashed_paths(self):
+        """Filesystem paths of every content-hashed file in the current build."""
+        self._refresh()
+        return [os.path.join(self.build_dir, name) for name in sorted(self._hashed)]
+
+    def index_path(self):
+        """The built index.html, or None to fall back to the source copy."""
+        if not self.built:
+            return None
+        path = os.path.join(self.build_dir, 'index.html')
+        return path if os.path.isfile(path) else None
+
+manifest = AssetManifest(Config.STATIC_BUILD_DIR)
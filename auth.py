@@ -0,0 +1,168 @@
+import base64
+import hashlib
+import hmac
+import logging
+import os
+import secrets
+import sqlite3
+import threading
+import time
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+TOKEN_VERSION = 'v2'
+
+def _b64(data):
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode('ascii')
+
+def _sign(message):
+    return _b64(hmac.new(Config.SECRET_KEY.encode(), message.encode(), hashlib.sha256).digest())
+
+def check_password(auth_header):
+    """Check a Basic Authorization header against the portal password, in constant time."""
+    try:
+        scheme, encoded = auth_header.split(' ', 1)
+        if scheme.lower() != 'basic':
+            return False
+        password = base64.b64decode(encoded).decode('utf-8').split(':', 1)[1]
+    except (AttributeError, ValueError, IndexError, UnicodeDecodeError):
+        return False
+    return hmac.compare_digest(password.encode(), Config.PORTAL_PASSWORD.encode())
+
+def bearer_token(auth_header):
+    """The token from a Bearer Authorization header, or None."""
+    scheme, _, token = (auth_header or '').partition(' ')
+    if scheme.lower() != 'bearer' or not token:
+        return None
+    return token.strip()
+
+class RevocationList:
+    """Session ids revoked before they expire (logout), dropped once they would have expired anyway.
+
+    Kept in a SQLite file so a logout handled by one gunicorn worker holds in
+    all of them. Each worker also remembers its own revocations, which keeps
+    logout working there if the file cannot be read.
+    """
+
+    SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS revoked_sessions (
+            token_id TEXT PRIMARY KEY,
+            expires REAL NOT NULL
+        ) WITHOUT ROWID
+    '''
+
+    def __init__(self, path, max_entries):
+        self.path = path
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._revoked = {}  # token id -> expiry, revoked in this process
+        self._lock = threading.Lock()
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=1, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(self.SCHEMA)
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def add(self, token_id, expires):
+        with self._lock:
+            self._revoked = {t: e for t, e in self._revoked.items() if e > time.time()}
+            self._revoked[token_id] = expires
+        conn = self._connection()
+        conn.execute('INSERT OR REPLACE INTO revoked_sessions (token_id, expires) VALUES (?, ?)',
+                     (token_id, expires))
+        conn.execute('DELETE FROM revoked_sessions WHERE expires <= ?', (time.time(),))
+        # Keep the file small; the soonest-expiring entries matter least
+        conn.execute('''
+            DELETE FROM revoked_sessions WHERE token_id IN (
+                SELECT token_id FROM revoked_sessions ORDER BY expires DESC LIMIT -1 OFFSET ?
+            )
+        ''', (self.max_entries,))
+
+    def __contains__(self, token_id):
+        # Plain dict reads are safe without the lock
+        if token_id in self._revoked:
+            return True
+        try:
+            return self._connection().execute(
+                'SELECT 1 FROM revoked_sessions WHERE token_id = ?', (token_id,)).fetchone() is not None
+        except sqlite3.Error as e:
+            logger.warning("Revocation list read failed: %s", e)
+            return False
+
+revoked = RevocationList(Config.SESSION_REVOCATION_PATH, Config.SESSION_REVOCATION_MAX)
+
+def issue_token(ttl=None, token_id=None, started=None):
+    """Issue a signed session token: v2.<expiry>.<login time>.<token id>.<signature>
+
+    A refresh passes the current ``token_id`` and ``started`` so the session
+    keeps its id and its login time; revoking the newest token then also
+    covers the older ones, and no token outlives SESSION_MAX_AGE.
+    """
+    now = int(time.time())
+    started = started or now
+    expires = min(now + (ttl or Config.SESSION_TOKEN_TTL), started + Config.SESSION_MAX_AGE)
+    message = f'{TOKEN_VERSION}.{expires}.{started}.{token_id or secrets.token_urlsafe(12)}'
+    return f'{message}.{_sign(message)}', expires
+
+def refresh_token(token):
+    """A new token for the session of a valid ``token``, or None once the session is past SESSION_MAX_AGE."""
+    parsed = _parse(token)
+    if parsed is None:
+        return None
+    expires, started, token_id = parsed
+    now = time.time()
+    if expires <= now or started + Config.SESSION_MAX_AGE <= now or token_id in revoked:
+        return None
+    return issue_token(token_id=token_id, started=started)
+
+def _parse(token):
+    """Return (expiry, login time, token id) for a correctly signed token, or None."""
+    try:
+        message, signature = token.rsplit('.', 1)
+        version, expires, started, token_id = message.split('.')
+        expires, started = int(expires), int(started)
+    except (AttributeError, ValueError):
+        return None
+    if version != TOKEN_VERSION or not hmac.compare_digest(signature, _sign(message)):
+        return None
+    return expires, started, token_id
+
+def verify_token(token):
+    """Whether a session token is authentic, unexpired and not revoked."""
+    return token_session(token) is not None
+
+def token_session(token):
+    """The session (token id) of an authentic, unexpired, unrevoked token, or None."""
+    parsed = _parse(token)
+    if parsed is None:
+        return None
+    expires, _, token_id = parsed
+    return token_id if expires > time.time() and token_id not in revoked else None
+
+def revoke_token(token):
+    parsed = _parse(token)
+    if parsed is not None:
+        revoked.add(parsed[2], parsed[0])
+
+def authenticate(auth_header):
+    """Check the session token on an API request's Authorization header."""
+    return session_id(auth_header) is not None
+
+def session_id(auth_header):
+    """The session of a valid Bearer token in an Authorization header, or None."""
+    token = bearer_token(auth_header)
+    return token_session(token) if token is not None else None
+
+if Config.SECRET_KEY == 'your-secret-key-here':
+    if not Config.ALLOW_DEFAULT_SECRET_KEY:
+        raise RuntimeError("SECRET_KEY is not set; refusing to sign session tokens with the public default key "
+                           "(set ALLOW_DEFAULT_SECRET_KEY=true for development)")
+    logger.warning("SECRET_KEY is not set; session tokens are signed with the default key")
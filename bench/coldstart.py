@@ -0,0 +1,122 @@
+"""Measure server.py's cold start: the time from launching the process until /ready answers 200.
+
+    python bench/coldstart.py --runs 10 --output startup.json
+    python bench/coldstart.py --runs 10 --compare startup.json
+
+Each run starts a fresh server.py on a free port, polls /ready, records the
+wall-clock time and the per-step timings the server reports, then stops it
+with SIGTERM and times the drain. Point AMION_BASE_URL at bench/fake_amion.py
+(the default here) so the schedule warm-up does not depend on amion.com.
+"""
+import argparse
+import json
+import os
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def poll_ready(port, deadline):
+    """Return the /ready body once it answers 200, or None at the deadline."""
+    url = f'http://127.0.0.1:{port}/ready'
+    while time.perf_counter() < deadline:
+        try:
+            with urllib.request.urlopen(url, timeout=1) as response:
+                return json.load(response)
+        except (OSError, urllib.error.HTTPError):
+            time.sleep(0.005)
+    return None
+
+def run_once(options, env):
+    port = free_port()
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, 'server.py'], cwd=REPO, env=dict(env, PORT=str(port)),
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        ready = poll_ready(port, start + options.timeout)
+        wall = time.perf_counter() - start
+        if ready is None:
+            return None
+        stop = time.perf_counter()
+        process.send_signal(signal.SIGTERM)
+        process.wait(timeout=options.timeout)
+        result = dict(ready['startup'])
+        result.update(wall=wall, stop=time.perf_counter() - stop)
+        return result
+    finally:
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+
+def summarize(runs):
+    steps = {}
+    for run in runs:
+        for step, seconds in run.items():
+            steps.setdefault(step, []).append(seconds)
+    return {step: {'median_ms': round(statistics.median(values) * 1000, 1),
+                   'max_ms': round(max(values) * 1000, 1)}
+            for step, values in steps.items()}
+
+def _change(before, after):
+    if not before:
+        return 'n/a'
+    return f'{(after - before) / before * 100:+.0f}%'
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--amion-url', default='http://127.0.0.1:8199', help='AMION_BASE_URL for the server')
+    parser.add_argument('--timeout', type=float, default=30, help='seconds to wait for /ready and for the exit')
+    parser.add_argument('--output', help='write results to this JSON file')
+    parser.add_argument('--compare', help='JSON results from an earlier run to compare against')
+    options = parser.parse_args(argv)
+
+    baseline = None
+    if options.compare:
+        with open(options.compare) as f:
+            baseline = json.load(f)
+
+    env = dict(os.environ, AMION_BASE_URL=options.amion_url, AMION_PREFETCH_ENABLED='false', LOG_FILE='')
+    env.setdefault('ALLOW_DEFAULT_SECRET_KEY', 'true')
+    runs = []
+    for i in range(options.runs):
+        result = run_once(options, env)
+        if result is None:
+            print(f"Run {i + 1}: server was not ready within {options.timeout:.0f}s")
+            return 1
+        runs.append(result)
+    steps = summarize(runs)
+
+    print(f"{options.runs} cold starts of server.py\n")
+    header = f"{'step':<20} {'median ms':>10} {'max ms':>10}" + (f" {'vs baseline':>12}" if baseline else '')
+    print(header)
+    print('-' * len(header))
+    for step, row in steps.items():
+        line = f"{step:<20} {row['median_ms']:>10.1f} {row['max_ms']:>10.1f}"
+        if baseline and step in baseline['steps']:
+            line += f" {_change(baseline['steps'][step]['median_ms'], row['median_ms']):>12}"
+        print(line)
+
+    if options.output:
+        with open(options.output, 'w') as f:
+            json.dump({
+                'runs': options.runs,
+                'started': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'steps': steps,
+            }, f, indent=2)
+        print(f"\nResults written to {options.output}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,124 @@
+"""Local stand-in for Amion's Rpt=619 CSV report, for benchmarks and offline work.
+
+    python bench/fake_amion.py --port 8199 --latency 150 --jitter 50 --failure-rate 0.02
+
+Point the servers at it with AMION_BASE_URL=http://127.0.0.1:8199. Every
+location and date gets a stable, seeded schedule in the same shape as the
+real report, so the servers' parsers see realistic rows.
+"""
+import argparse
+import random
+import sys
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+FIRST_NAMES = ['Alex', 'Jordan', 'Taylor', 'Morgan', 'Casey', 'Riley', 'Jamie', 'Avery', 'Quinn', 'Parker',
+               'Sam', 'Drew', 'Reese', 'Rowan', 'Hayden', 'Emerson', 'Finley', 'Sage', 'Kendall', 'Logan']
+LAST_NAMES = ['Smith', 'Chen', 'Patel', 'Garcia', 'Nguyen', 'Kim', 'Johnson', 'Williams', 'Brown', 'Lee',
+              'Martinez', 'Davis', 'Lopez', 'Wilson', 'Anderson', 'Thomas', 'Moore', 'Jackson', 'White', 'Harris']
+
+# Assignments per location, as (division, assignment, start, end). The resident
+# schedule lists every service, which is what makes it the large feed.
+RESIDENT_SERVICES = ['Pedi', 'Thoracic', 'Vascular', 'TXP', 'Baker', 'Churchill', 'Trauma', 'Bigelow', 'Wang', 'Ellison']
+ASSIGNMENTS = {
+    'mghsurgery1811': [
+        (None, f'{service} {level}', start, end)
+        for service in RESIDENT_SERVICES
+        for level, start, end in (('Senior', '0600', '1800'), ('Intern', '0600', '1800'),
+                                  ('Night Float', '1800', '0600'), ('Consult Resident Day', '0700', '1900'))
+    ],
+    'Churchill': [
+        (None, 'Churchill Day', '0700', '1900'), (None, 'Churchill Night', '1900', '0700'),
+        (None, 'Backup', '0700', '0700'), (None, 'Pancreatitis', '0700', '0700'),
+        (None, 'Blue APP Day', '0700', '1900'), (None, 'Blue APP Night', '1900', '0700'),
+    ],
+    'VascOncall!': [
+        (None, 'MGH Surgeon On-Call', '0700', '0700'), (None, 'MGH Fellow On-Call', '0700', '0700'),
+        (None, 'Vascular Clinic', '0800', '1700'),
+    ],
+    'MGHThoracic': [
+        (None, 'MGH & MD Connect', '0700', '0700'), (None, 'Fellow On Call (24 hr)', '0700', '0700'),
+        (None, 'Thoracic OR', '0730', '1730'),
+    ],
+    'mghcs': [
+        ('Attendings', 'General Cardiac Call', '0700', '0700'), ('Resident', 'In House Fellow', '0700', '0700'),
+        ('Attendings', 'Cardiac OR', '0730', '1730'), ('Resident', 'Cardiac Floor', '0700', '1900'),
+    ],
+}
+
+def schedule_csv(location, day, month, year, seed):
+    """The Rpt=619 CSV for one location and date; the same inputs always give the same rows."""
+    rng = random.Random(f'{seed}|{location}|{year}-{month}-{day}')
+    lines = [
+        f'Amion schedule for {location}',
+        'Report 619: assignments by day',
+        f'Dates {month}/{day}/{year} - {month}/{day}/{year}',
+        '',
+        '"Staff name","Staff ID","Backup ID","Assignment name","Assignment ID","Backup assignment ID",'
+        '"Date","Start time","End time"',
+    ]
+    for division, assignment, start, end in ASSIGNMENTS.get(location, ASSIGNMENTS['VascOncall!']):
+        for _ in range(rng.choice((1, 1, 1, 2))):
+            name = f'{rng.choice(LAST_NAMES)}, {rng.choice(FIRST_NAMES)}'
+            fields = [f'"{name}"', str(rng.randrange(1000, 9999)), '0', f'"{assignment}"',
+                      str(rng.randrange(100, 999)), '0', f'{month}/{day}/{year}', start, end]
+            if division:
+                fields.insert(0, f'"{division}"')
+            lines.append(','.join(fields))
+    return '\n'.join(lines) + '\n'
+
+class FakeAmionHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        options = self.server.options
+        delay = max(0.0, random.gauss(options.latency, options.jitter)) / 1000
+        if delay:
+            time.sleep(delay)
+
+        query = parse_qs(urlparse(self.path).query)
+        try:
+            location = query['Lo'][0]
+            day, month, year = (int(query[key][0]) for key in ('Day', 'Month', 'Year'))
+        except (KeyError, ValueError):
+            self.send_body(400, b'Bad request')
+            return
+        if random.random() < options.failure_rate:
+            self.send_body(503, b'Service unavailable')
+            return
+        self.send_body(200, schedule_csv(location, day, month, year, options.seed).encode())
+
+    def send_body(self, status, body):
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/csv' if status == 200 else 'text/plain')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--port', type=int, default=8199)
+    parser.add_argument('--latency', type=float, default=150, help='mean response delay in ms')
+    parser.add_argument('--jitter', type=float, default=50, help='standard deviation of the delay in ms')
+    parser.add_argument('--failure-rate', type=float, default=0.0, help='share of requests answered with 503')
+    parser.add_argument('--seed', default='mghsurgery', help='seed for the generated schedules')
+    options = parser.parse_args(argv)
+
+    server = ThreadingHTTPServer(('127.0.0.1', options.port), FakeAmionHandler)
+    server.daemon_threads = True
+    server.options = options
+    print(f"Fake Amion on http://127.0.0.1:{options.port} "
+          f"(latency {options.latency:g}±{options.jitter:g} ms, failure rate {options.failure_rate:g})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == '__main__':
+    sys.exit(main())
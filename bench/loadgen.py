@@ -0,0 +1,258 @@
+"""Replay the portal's client traffic against a running server and report latency per endpoint.
+
+    python bench/loadgen.py --url http://127.0.0.1:8000 --users 20 --duration 60 --output after.json
+    python bench/loadgen.py --url http://127.0.0.1:8000 --users 20 --duration 60 --compare after.json
+
+Each simulated user keeps one keep-alive connection and loops over a page
+visit: the index page and its static assets, a login on the first visit,
+the day's schedules, a phone directory delta sync and a few phone searches
+typed a key at a time. Results are throughput and p50/p95/p99 per endpoint,
+optionally saved as JSON and compared with an earlier run.
+"""
+import argparse
+import base64
+import gzip
+import http.client
+import json
+import math
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import defaultdict
+from datetime import date, timedelta
+from urllib.parse import urlencode, urlparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config  # noqa: E402
+
+PHONE_DIRECTORY_FIELDS = 'id,name,role,phone_number,pager_number,email,is_active,category_name,category_display_name'
+SEARCH_TERMS = ['smith', 'chen', 'trauma', 'pacu', 'vascular', 'pgy', '6175', 'charge', 'patel', 'sicu']
+ASSET_RE = re.compile(r'''(?:href|src)=["'](?!https?:|//|data:|#)([^"']+\.(?:css|js|png|svg|ico|jpg))["']''')
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, math.ceil(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+class Results:
+    """Latencies and error counts per endpoint, shared by all user threads."""
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def record(self, endpoint, seconds, ok):
+        with self._lock:
+            self.latencies[endpoint].append(seconds)
+            if not ok:
+                self.errors[endpoint] += 1
+
+    def summary(self, elapsed):
+        endpoints = {}
+        for endpoint in sorted(self.latencies):
+            values = sorted(self.latencies[endpoint])
+            endpoints[endpoint] = {
+                'count': len(values),
+                'errors': self.errors[endpoint],
+                'rps': round(len(values) / elapsed, 2),
+                'p50_ms': round(percentile(values, 0.50) * 1000, 2),
+                'p95_ms': round(percentile(values, 0.95) * 1000, 2),
+                'p99_ms': round(percentile(values, 0.99) * 1000, 2),
+            }
+        every = sorted(v for values in self.latencies.values() for v in values)
+        total = {
+            'count': len(every),
+            'errors': sum(self.errors.values()),
+            'rps': round(len(every) / elapsed, 2),
+            'p50_ms': round(percentile(every, 0.50) * 1000, 2),
+            'p95_ms': round(percentile(every, 0.95) * 1000, 2),
+            'p99_ms': round(percentile(every, 0.99) * 1000, 2),
+        }
+        return endpoints, total
+
+class User:
+    """One simulated browser: a keep-alive connection, a session token and a local cache."""
+
+    def __init__(self, options, results, rng):
+        self.options = options
+        self.results = results
+        self.rng = rng
+        url = urlparse(options.url)
+        self.host, self.port = url.hostname, url.port or 80
+        self.conn = None
+        self.token = None
+        self.etags = {}  # path -> ETag, for conditional requests like a browser cache
+        self.cached = set()  # immutable assets the browser would not ask for again
+        self.sync_cursor = '0'
+        self.assets = []
+
+    def request(self, endpoint, method, path, headers=None, conditional=False):
+        headers = dict(headers or {})
+        headers['Accept-Encoding'] = 'gzip'
+        if self.token:
+            headers['Authorization'] = 'Bearer ' + self.token
+        if conditional and path in self.etags:
+            headers['If-None-Match'] = self.etags[path]
+
+        start = time.perf_counter()
+        try:
+            if self.conn is None:
+                self.conn = http.client.HTTPConnection(self.host, self.port, timeout=self.options.timeout)
+            self.conn.request(method, path, headers=headers)
+            response = self.conn.getresponse()
+            body = response.read()
+        except (OSError, http.client.HTTPException):
+            self.results.record(endpoint, time.perf_counter() - start, False)
+            self.close()
+            return None, None, b''
+        self.results.record(endpoint, time.perf_counter() - start, response.status < 400)
+        if response.getheader('Content-Encoding') == 'gzip':
+            body = gzip.decompress(body)
+        if response.getheader('ETag'):
+            self.etags[path] = response.getheader('ETag')
+        if response.will_close:
+            self.close()
+        return response.status, response, body
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+    def login(self):
+        credentials = base64.b64encode(f':{self.options.password}'.encode()).decode()
+        status, _, body = self.request('/verify', 'GET', '/verify', {'Authorization': 'Basic ' + credentials})
+        if status == 200:
+            self.token = json.loads(body).get('token')
+
+    def load_page(self):
+        status, _, body = self.request('/', 'GET', '/', conditional=True)
+        if status == 200:
+            self.assets = sorted(set(ASSET_RE.findall(body.decode('utf-8', 'replace'))))
+        for asset in self.assets:
+            path = asset if asset.startswith('/') else '/' + asset
+            if path in self.cached:
+                continue
+            status, response, _ = self.request('static', 'GET', path, conditional=True)
+            if status == 200 and 'immutable' in (response.getheader('Cache-Control') or ''):
+                self.cached.add(path)
+
+    def load_schedules(self):
+        day = date.today() + timedelta(days=self.rng.choice((0, 0, 0, 1, -1)))
+        if self.options.schedules == 'batched':
+            query = urlencode({'day': day.day, 'month': day.month, 'year': day.year})
+            self.request('/api/schedules', 'GET', f'/api/schedules?{query}')
+        else:
+            # Feed paths pass the year to Amion as given; apply the offset the batched endpoint does
+            for feed in Config.AMION_FEEDS.values():
+                query = urlencode({'day': day.day, 'month': day.month, 'year': day.year + feed['year_offset']})
+                self.request(feed['path'], 'GET', f"{feed['path']}?{query}")
+
+    def sync_contacts(self):
+        path = '/api/phone/contacts?' + urlencode({'since': self.sync_cursor, 'fields': PHONE_DIRECTORY_FIELDS})
+        status, _, body = self.request('/api/phone/contacts?since', 'GET', path, conditional=True)
+        if status == 200:
+            self.sync_cursor = json.loads(body).get('cursor') or self.sync_cursor
+
+    def search_phonebook(self):
+        term = self.rng.choice(SEARCH_TERMS)
+        for length in range(1, len(term) + 1):
+            query = urlencode({'search': term[:length], 'limit': 50})
+            self.request('/api/phone/contacts?search', 'GET', f'/api/phone/contacts?{query}')
+            time.sleep(self.rng.uniform(0.05, 0.15))  # typing speed
+
+    def run(self, deadline):
+        while time.monotonic() < deadline:
+            self.load_page()
+            if self.token is None:
+                self.login()
+            self.load_schedules()
+            self.sync_contacts()
+            for _ in range(self.rng.randint(0, self.options.searches)):
+                self.search_phonebook()
+            time.sleep(self.rng.uniform(0, self.options.think))
+        self.close()
+
+def print_table(endpoints, total, baseline=None):
+    header = f"{'endpoint':<32} {'count':>7} {'errors':>6} {'rps':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}"
+    print(header)
+    print('-' * len(header))
+    for name, row in list(endpoints.items()) + [('total', total)]:
+        print(f"{name:<32} {row['count']:>7} {row['errors']:>6} {row['rps']:>8.1f} "
+              f"{row['p50_ms']:>9.1f} {row['p95_ms']:>9.1f} {row['p99_ms']:>9.1f}")
+        if baseline is not None:
+            before = baseline['total'] if name == 'total' else baseline['endpoints'].get(name)
+            if before:
+                print(f"{'  vs baseline':<32} {'':>7} {'':>6} {_change(before['rps'], row['rps']):>8} "
+                      f"{_change(before['p50_ms'], row['p50_ms']):>9} {_change(before['p95_ms'], row['p95_ms']):>9} "
+                      f"{_change(before['p99_ms'], row['p99_ms']):>9}")
+
+def _change(before, after):
+    if not before:
+        return 'n/a'
+    return f'{(after - before) / before * 100:+.0f}%'
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--url', default='http://127.0.0.1:8000')
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--duration', type=float, default=30, help='seconds to run')
+    parser.add_argument('--ramp', type=float, default=2, help='seconds over which users start')
+    parser.add_argument('--think', type=float, default=1.0, help='maximum pause between page visits, in seconds')
+    parser.add_argument('--searches', type=int, default=2, help='maximum phone searches per visit')
+    parser.add_argument('--schedules', choices=('batched', 'per-feed'), default='batched',
+                        help='one /api/schedules call per visit, or one call per feed like older clients')
+    parser.add_argument('--password', default=Config.PORTAL_PASSWORD)
+    parser.add_argument('--timeout', type=float, default=30)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='write results to this JSON file')
+    parser.add_argument('--compare', help='JSON results from an earlier run to compare against')
+    options = parser.parse_args(argv)
+
+    baseline = None
+    if options.compare:
+        with open(options.compare) as f:
+            baseline = json.load(f)
+
+    results = Results()
+    start = time.monotonic()
+    deadline = start + options.duration
+    threads = []
+    for i in range(options.users):
+        user = User(options, results, random.Random(options.seed * 1000 + i))
+        thread = threading.Thread(target=user.run, args=(deadline,), daemon=True)
+        thread.start()
+        threads.append(thread)
+        time.sleep(options.ramp / max(1, options.users))
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - start
+
+    endpoints, total = results.summary(elapsed)
+    print(f"{options.users} users for {elapsed:.1f}s against {options.url} (schedules: {options.schedules})\n")
+    print_table(endpoints, total, baseline)
+
+    if options.output:
+        with open(options.output, 'w') as f:
+            json.dump({
+                'url': options.url,
+                'users': options.users,
+                'duration': round(elapsed, 2),
+                'schedules': options.schedules,
+                'seed': options.seed,
+                'started': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'endpoints': endpoints,
+                'total': total,
+            }, f, indent=2)
+        print(f"\nResults written to {options.output}")
+    return 1 if total['errors'] else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
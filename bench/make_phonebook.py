@@ -0,0 +1,101 @@
+"""Generate a large, seeded phonebook database for benchmarks.
+
+    python bench/make_phonebook.py --contacts 50000 --output bench/data/phonebook.db
+
+Run the server under test with DATABASE_PATH pointing at the output. The
+same seed and size always produce the same contacts.
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from init_db import create_indexes, create_search_index, create_sync_tables, create_tables  # noqa: E402
+
+CATEGORIES = [
+    ('attending', 'Attending Surgeons'),
+    ('resident', 'Residents'),
+    ('app', 'APPs'),
+    ('other', 'Other Important Numbers'),
+]
+ROLES = {
+    'attending': ['Trauma Surgery', 'Vascular Surgery', 'Thoracic Surgery', 'Cardiac Surgery',
+                  'Transplant Surgery', 'Surgical Oncology', 'Pediatric Surgery', 'Colorectal Surgery'],
+    'resident': ['PGY-1', 'PGY-2', 'PGY-3', 'PGY-4', 'PGY-5', 'Chief Resident', 'Research Resident'],
+    'app': ['Surgical APP', 'Trauma APP', 'Cardiac APP', 'Transplant APP', 'ICU APP'],
+    'other': ['Main Line', 'Nurse Station', 'Front Desk', 'Charge Nurse', 'Scheduling', 'Pharmacy'],
+}
+UNITS = ['OR', 'PACU', 'SICU', 'Blake', 'White', 'Ellison', 'Bigelow', 'Lunder', 'Wang', 'Yawkey', 'ED', 'Radiology']
+FIRST_NAMES = ['Alex', 'Jordan', 'Taylor', 'Morgan', 'Casey', 'Riley', 'Jamie', 'Avery', 'Quinn', 'Parker',
+               'Sam', 'Drew', 'Reese', 'Rowan', 'Hayden', 'Emerson', 'Finley', 'Sage', 'Kendall', 'Logan',
+               'Priya', 'Wei', 'Carlos', 'Fatima', 'Mateo', 'Aisha', 'Hiro', 'Olga', 'Kwame', 'Ines']
+LAST_NAMES = ['Smith', 'Chen', 'Patel', 'Garcia', 'Nguyen', 'Kim', 'Johnson', 'Williams', 'Brown', 'Lee',
+              'Martinez', 'Davis', 'Lopez', 'Wilson', 'Anderson', 'Thomas', 'Moore', 'Jackson', 'White', 'Harris',
+              'Okafor', 'Rossi', 'Müller', 'Novak', 'Haddad', 'Tanaka', 'Silva', 'Cohen', 'Singh', "O'Brien"]
+
+def generate_contacts(count, rng):
+    """Yield (category_id, name, role, phone, pager, email, is_active, minutes ago) rows."""
+    weights = [15, 35, 20, 30]  # share of each category, in CATEGORIES order
+    taken = set()
+    for i in range(count):
+        category_id = rng.choices(range(1, len(CATEGORIES) + 1), weights)[0]
+        category = CATEGORIES[category_id - 1][0]
+        phone = f'617-{rng.randrange(200, 999)}-{rng.randrange(10000):04d}'
+        if category == 'other':
+            role, pager, email = rng.choice(ROLES['other']), None, None
+            name = f'{rng.choice(UNITS)} {role} {i}'
+        else:
+            first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+            name = f'Dr. {first} {last}' if category != 'app' else f'{first} {last}'
+            if (category_id, name) in taken:
+                name = f'{name} ({i})'  # (category, name) identifies a contact
+            taken.add((category_id, name))
+            role = rng.choice(ROLES[category])
+            pager = f'617-{rng.randrange(200, 999)}-{rng.randrange(10000):04d}' if rng.random() < 0.7 else None
+            email = f'{first[0].lower()}{last.lower()}{i}@hospital.org'
+        # Spread updates over the last 90 days so delta syncs have something to skip
+        yield (category_id, name, role, phone, pager, email,
+               int(rng.random() > 0.02), rng.randrange(90 * 24 * 60))
+
+def make_phonebook(path, count, seed):
+    if os.path.exists(path):
+        os.remove(path)
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+
+    rng = random.Random(seed)
+    conn = sqlite3.connect(path)
+    conn.execute('PRAGMA journal_mode=WAL')
+    cursor = conn.cursor()
+    create_tables(cursor)
+    cursor.executemany('INSERT INTO categories (name, display_name) VALUES (?, ?)', CATEGORIES)
+    # Load the rows before the search index exists; building it once afterwards
+    # is much faster than a trigger firing per row
+    cursor.executemany('''
+        INSERT INTO contacts
+        (category_id, name, role, phone_number, pager_number, email, is_active, updated_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, datetime('now', '-' || ? || ' minutes'))
+    ''', generate_contacts(count, rng))
+    create_indexes(cursor)
+    create_search_index(cursor)
+    create_sync_tables(cursor)
+    conn.commit()
+    conn.execute('ANALYZE')
+    conn.close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--contacts', type=int, default=50000)
+    parser.add_argument('--seed', default='mghsurgery')
+    parser.add_argument('--output', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'phonebook.db'))
+    options = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    make_phonebook(options.output, options.contacts, options.seed)
+    print(f"Wrote {options.contacts} contacts to {options.output} in {time.perf_counter() - start:.1f}s")
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,279 @@
+"""Build minified, content-hashed and precompressed front-end assets.
+
+Run after changing script.js, styles.css or index.html:
+
+    python build_assets.py
+
+Writes into Config.STATIC_BUILD_DIR (static/ by default):
+  - script.<hash>.js and styles.<hash>.css, minified
+  - .gz (and .br, when brotli is installed) copies of each
+  - index.html with its references rewritten to the hashed names
+  - manifest.json mapping each source name to its hashed name
+
+Hashed names change whenever the content does, so they are served with
+Cache-Control: immutable; index.html itself is always revalidated.
+"""
+import gzip
+import hashlib
+import json
+import os
+import re
+import sys
+import time
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+from config import Config
+from assets import MANIFEST_NAME
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# Source files that get a hashed, minified build
+ASSETS = ('script.js', 'styles.css')
+
+HASH_LENGTH = 10
+
+# Characters that can be part of an identifier or number
+_WORD_RE = re.compile(r'[\w$\\]|[^\x00-\x7f]')
+
+# After one of these a '/' starts a regular expression rather than a division
+_REGEX_PRECEDERS = set('(,=:[!&|?{};+-*%<>~^')
+_REGEX_KEYWORDS = {'return', 'typeof', 'case', 'do', 'else', 'in', 'of', 'new',
+                   'delete', 'void', 'throw', 'instanceof', 'yield', 'await'}
+
+# A newline next to one of these can never end a statement, so it can go
+_JOIN_AFTER = set('{([,;:=&|?!<>*%^~')
+_JOIN_BEFORE = set('})],;:.?=&|<>*%^')
+
+def _is_word(char):
+    return bool(char) and bool(_WORD_RE.match(char))
+
+def _scan_string(src, i):
+    """Index just past the quoted string starting at src[i]."""
+    quote = src[i]
+    i += 1
+    while i < len(src):
+        if src[i] == '\\':
+            i += 2
+        elif src[i] == quote:
+            return i + 1
+        elif src[i] == '\n':
+            raise ValueError(f'unterminated string at offset {i}')
+        else:
+            i += 1
+    raise ValueError('unterminated string')
+
+def _scan_template(src, i):
+    """Index just past the template literal starting at src[i], including nested ${...}."""
+    i += 1
+    while i < len(src):
+        if src[i] == '\\':
+            i += 2
+        elif src[i] == '`':
+            return i + 1
+        elif src.startswith('${', i):
+            i = _scan_braces(src, i + 2)
+        else:
+            i += 1
+    raise ValueError('unterminated template literal')
+
+def _scan_braces(src, i):
+    """Index just past the '}' closing a ${...} expression that starts at src[i]."""
+    depth = 1
+    while i < len(src):
+        char = src[i]
+        if char in '\'"':
+            i = _scan_string(src, i)
+        elif char == '`':
+            i = _scan_template(src, i)
+        else:
+            if char == '{':
+                depth += 1
+            elif char == '}':
+                depth -= 1
+                if depth == 0:
+                    return i + 1
+            i += 1
+    raise ValueError('unterminated template expression')
+
+def _scan_regex(src, i):
+    """Index just past the regular expression literal (and flags) starting at src[i]."""
+    i += 1
+    in_class = False
+    while i < len(src):
+        char = src[i]
+        if char == '\\':
+            i += 2
+            continue
+        if char == '\n':
+            raise ValueError(f'unterminated regular expression at offset {i}')
+        if char == '[':
+            in_class = True
+        elif char == ']':
+            in_class = False
+        elif char == '/' and not in_class:
+            i += 1
+            while i < len(src) and _is_word(src[i]):
+                i += 1
+            return i
+        i += 1
+    raise ValueError('unterminated regular expression')
+
+def minify_js(src):
+    """Strip comments and redundant whitespace from JavaScript.
+
+    Deliberately conservative: names are left alone and a line break is kept
+    wherever automatic semicolon insertion could depend on it.
+    """
+    out = []
+    last_word = ''
+    i = 0
+    while i < len(src):
+        char = src[i]
+
+        if char in ' \t\r\n' or src.startswith('//', i) or src.startswith('/*', i):
+            newline = False
+            while i < len(src):
+                if src[i] in ' \t\r\n':
+                    newline = newline or src[i] == '\n'
+                    i += 1
+                elif src.startswith('//', i):
+                    end = src.find('\n', i)
+                    i = len(src) if end == -1 else end
+                elif src.startswith('/*', i):
+                    end = src.find('*/', i + 2)
+                    if end == -1:
+                        raise ValueError('unterminated comment')
+                    newline = newline or '\n' in src[i:end]
+                    i = end + 2
+                else:
+                    break
+            prev = out[-1][-1] if out else ''
+            nxt = src[i] if i < len(src) else ''
+            if not prev or not nxt:
+                continue
+            if _is_word(prev) and _is_word(nxt):
+                out.append('\n' if newline else ' ')
+            elif prev in '+-' and nxt == prev:
+                out.append(' ')
+            elif newline and prev not in _JOIN_AFTER and nxt not in _JOIN_BEFORE:
+                out.append('\n')
+            continue
+
+        if char in '\'"':
+            end = _scan_string(src, i)
+        elif char == '`':
+            end = _scan_template(src, i)
+        elif char == '/':
+            significant = [token for token in out[-8:] if token.strip()]
+            prev = significant[-1][-1] if significant else ''
+            # Only postfix ++/-- can come right before a '/', and that is a division
+            postfix = ''.join(significant[-2:]) in ('++', '--')
+            if not postfix and (not prev or prev in _REGEX_PRECEDERS or last_word in _REGEX_KEYWORDS):
+                end = _scan_regex(src, i)
+            else:
+                end = i + 1
+        elif _is_word(char):
+            end = i + 1
+            while end < len(src) and _is_word(src[end]):
+                end += 1
+        else:
+            end = i + 1
+
+        token = src[i:end]
+        last_word = token if _is_word(char) else ''
+        out.append(token)
+        i = end
+    return ''.join(out) + '\n'
+
+_CSS_TOKEN_RE = re.compile(r'''("(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*')|/\*.*?\*/|(\s+)''', re.S)
+
+def minify_css(src):
+    """Strip comments and redundant whitespace from CSS, leaving strings untouched."""
+    def replace(match):
+        if match.group(1):
+            return match.group(1)
+        if match.group(2):
+            return ' '
+        return ''
+    css = _CSS_TOKEN_RE.sub(replace, src)
+    parts = re.split(r'''("(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*')''', css)
+    for n in range(0, len(parts), 2):
+        part = re.sub(r'\s*([{};,])\s*', r'\1', parts[n])
+        parts[n] = re.sub(r':\s+', ':', part).replace(';}', '}')
+    return ''.join(parts).strip() + '\n'
+
+MINIFIERS = {'.js': minify_js, '.css': minify_css}
+
+def write_file(path, data):
+    """Write atomically so a running server never sees a half-written file."""
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+def write_precompressed(path, data):
+    write_file(path + '.gz', gzip.compress(data, compresslevel=9, mtime=0))
+    if brotli is not None:
+        write_file(path + '.br', brotli.compress(data))
+
+def build_asset(name, build_dir):
+    """Minify and hash one asset, returning its hashed file name."""
+    with open(os.path.join(ROOT, name), encoding='utf-8') as f:
+        source = f.read()
+    stem, ext = os.path.splitext(name)
+    data = MINIFIERS[ext](source).encode('utf-8')
+    digest = hashlib.sha256(data).hexdigest()[:HASH_LENGTH]
+    hashed = f'{stem}.{digest}{ext}'
+    path = os.path.join(build_dir, hashed)
+    write_file(path, data)
+    write_precompressed(path, data)
+    print(f"{name} -> {hashed} ({len(source.encode('utf-8'))} -> {len(data)} bytes)")
+    return hashed
+
+def rewrite_index(files, build_dir):
+    """Point index.html's script and stylesheet references at the hashed builds."""
+    with open(os.path.join(ROOT, 'index.html'), encoding='utf-8') as f:
+        html = f.read()
+    for name, hashed in files.items():
+        pattern = r'''((?:src|href)=["'])(?:\./|/)?''' + re.escape(name) + r'''(["'])'''
+        html, count = re.subn(pattern, rf'\g<1>/static/{hashed}\g<2>', html)
+        if not count:
+            print(f"Warning: index.html does not reference {name}")
+    data = html.encode('utf-8')
+    path = os.path.join(build_dir, 'index.html')
+    write_file(path, data)
+    write_precompressed(path, data)
+
+def remove_stale_builds(files, build_dir):
+    """Delete hashed files left over from earlier builds."""
+    current = set(files.values())
+    for entry in os.listdir(build_dir):
+        base = entry
+        for suffix in ('.gz', '.br'):
+            base = base.removesuffix(suffix)
+        for name in files:
+            stem, ext = os.path.splitext(name)
+            if re.fullmatch(re.escape(stem) + r'\.[0-9a-f]+' + re.escape(ext), base) and base not in current:
+                os.remove(os.path.join(build_dir, entry))
+
+def build(build_dir=Config.STATIC_BUILD_DIR):
+    os.makedirs(build_dir, exist_ok=True)
+    files = {name: build_asset(name, build_dir) for name in ASSETS}
+    rewrite_index(files, build_dir)
+    # The manifest goes last: servers pick up a build once it appears
+    manifest = {'built_at': int(time.time()), 'files': files}
+    write_file(os.path.join(build_dir, MANIFEST_NAME), json.dumps(manifest, indent=2).encode('utf-8'))
+    remove_stale_builds(files, build_dir)
+    return files
+
+if __name__ == '__main__':
+    try:
+        build()
+    except (OSError, ValueError) as e:
+        print(f"Asset build failed: {e}")
+        sys.exit(1)
+    print("Assets built successfully!")
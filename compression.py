@@ -0,0 +1,141 @@
+import gzip
+import hashlib
+import os
+import threading
+import zlib
+from email.utils import formatdate, parsedate_to_datetime
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip covers every browser
+    brotli = None
+
+from config import Config
+import metrics
+
+# Static files worth compressing and caching in memory
+COMPRESSIBLE_TYPES = {
+    '.html': 'text/html; charset=utf-8',
+    '.css': 'text/css; charset=utf-8',
+    '.js': 'application/javascript; charset=utf-8',
+    '.json': 'application/json',
+    '.svg': 'image/svg+xml',
+    '.txt': 'text/plain; charset=utf-8',
+}
+
+def accepted_encodings(header):
+    """Content codings the client accepts, from an Accept-Encoding header."""
+    encodings = set()
+    for part in (header or '').split(','):
+        coding, _, params = part.strip().partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        quality = params.strip()
+        if quality.startswith('q='):
+            try:
+                if float(quality[2:]) == 0:
+                    continue
+            except ValueError:
+                continue
+        encodings.add(coding)
+    return encodings
+
+def choose_encoding(header, available):
+    """Pick the best of ``available`` the client accepts: brotli, then gzip, else identity."""
+    accepted = accepted_encodings(header)
+    for coding in ('br', 'gzip'):
+        if coding in available and (coding in accepted or '*' in accepted):
+            return coding
+    return 'identity'
+
+def gzip_compress(body):
+    return gzip.compress(body, compresslevel=Config.COMPRESSION_LEVEL, mtime=0)
+
+def gzip_stream():
+    """A compressor producing a gzip stream, for responses written in chunks."""
+    return zlib.compressobj(Config.COMPRESSION_LEVEL, zlib.DEFLATED, 31)
+
+def etag_matches(if_none_match, etag):
+    """Whether an If-None-Match header covers ``etag`` (weak or per-encoding variants included)."""
+    base = etag.strip('"')
+    for tag in (if_none_match or '').split(','):
+        tag = tag.strip().removeprefix('W/').strip('"')
+        if tag == '*' or tag == base or tag.startswith(base + '-'):
+            return True
+    return False
+
+def not_modified_since(if_modified_since, mtime):
+    """Whether an If-Modified-Since header is at or after ``mtime``."""
+    try:
+        return int(mtime) <= parsedate_to_datetime(if_modified_since).timestamp()
+    except (TypeError, ValueError, IndexError, OverflowError):
+        return False
+
+def _read_precompressed(path, source_stat):
+    """Contents of a precompressed sibling file, unless it is missing or older than its source."""
+    try:
+        if os.stat(path).st_mtime < source_stat.st_mtime:
+            return None
+        with open(path, 'rb') as f:
+            return f.read()
+    except OSError:
+        return None
+
+class StaticAsset:
+    """A static file held in memory with its precompressed variants."""
+
+    def __init__(self, path, stat, body):
+        self.path = path
+        self.mtime = stat.st_mtime
+        self.size = stat.st_size
+        self.content_type = COMPRESSIBLE_TYPES[os.path.splitext(path)[1].lower()]
+        self.etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+        self.last_modified = formatdate(self.mtime, usegmt=True)
+        self.variants = {'identity': body}
+        # build_assets.py leaves .gz/.br copies next to its output; compress anything else here
+        gzipped = _read_precompressed(path + '.gz', stat)
+        self.variants['gzip'] = gzipped if gzipped is not None else gzip_compress(body)
+        brotlied = _read_precompressed(path + '.br', stat)
+        if brotlied is None and brotli is not None:
+            brotlied = brotli.compress(body)
+        if brotlied is not None:
+            self.variants['br'] = brotlied
+
+    def variant_etag(self, encoding):
+        return self.etag if encoding == 'identity' else self.etag[:-1] + f'-{encoding}"'
+
+class StaticAssetCache:
+    """In-memory cache of compressible static files, reloaded when they change on disk."""
+
+    def __init__(self, max_file_size):
+        self.max_file_size = max_file_size
+        self._assets = {}
+        self._lock = threading.Lock()
+
+    def get(self, path):
+        """Return the cached asset for a filesystem path, or None if it should not be cached."""
+        if os.path.splitext(path)[1].lower() not in COMPRESSIBLE_TYPES:
+            return None
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        if not os.path.isfile(path) or stat.st_size > self.max_file_size:
+            return None
+
+        with self._lock:
+            asset = self._assets.get(path)
+        if asset is not None and asset.mtime == stat.st_mtime and asset.size == stat.st_size:
+            metrics.cache_lookups.inc('static', 'hit')
+            return asset
+
+        metrics.cache_lookups.inc('static', 'miss')
+
+        with open(path, 'rb') as f:
+            asset = StaticAsset(path, stat, f.read())
+        with self._lock:
+            self._assets[path] = asset
+        return asset
+
+static_cache = StaticAssetCache(Config.STATIC_CACHE_MAX_FILE_SIZE)
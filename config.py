@@ -1,20 +1,35 @@
 import os
-from dotenv import load_dotenv
+
+try:
+    from dotenv import load_dotenv
+except ImportError:  # server.py runs with the standard library only
+    load_dotenv = None
 
 # Load environment variables
-load_dotenv()
+if load_dotenv:
+    load_dotenv()
 
 class Config:
     # Basic Flask config
     SECRET_KEY = os.getenv('SECRET_KEY', 'your-secret-key-here')
-    SESSION_TYPE = 'redis'
+    # Development only: sign session tokens with the public default key instead of refusing to start
+    ALLOW_DEFAULT_SECRET_KEY = os.getenv('ALLOW_DEFAULT_SECRET_KEY', 'false').lower() == 'true'
     PERMANENT_SESSION_LIFETIME = 86400  # 24 hours
+
+    # Login: the shared portal password is exchanged at /verify for a signed session token
+    PORTAL_PASSWORD = os.getenv('PORTAL_PASSWORD', 'mgh')
+    SESSION_TOKEN_TTL = int(os.getenv('SESSION_TOKEN_TTL', PERMANENT_SESSION_LIFETIME))
+    # Refreshing a token keeps its session, but never past SESSION_MAX_AGE from the login
+    SESSION_MAX_AGE = int(os.getenv('SESSION_MAX_AGE', 7 * PERMANENT_SESSION_LIFETIME))
+    # Logged-out sessions, shared by every worker on the host until their tokens expire
+    SESSION_REVOCATION_PATH = os.getenv('SESSION_REVOCATION_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data/sessions.db'))
+    SESSION_REVOCATION_MAX = int(os.getenv('SESSION_REVOCATION_MAX', 1000))
     
     # Redis config
     REDIS_URL = os.getenv('REDIS_URL', 'redis://localhost:6379')
     
     # Database config
-    DATABASE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data/phonebook.db')
+    DATABASE_PATH = os.getenv('DATABASE_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data/phonebook.db'))
     
     # Security config
     SESSION_COOKIE_SECURE = True
@@ -27,16 +42,159 @@ class Config:
         'https://www.your-domain.com'
     ]
     
-    # Rate limiting
-    RATELIMIT_DEFAULT = "100 per minute"
-    RATELIMIT_STORAGE_URL = REDIS_URL
+    # Rate limiting: token buckets per client and endpoint. sqlite:///path shares
+    # them across gunicorn workers, redis://... across hosts, memory:// is per process.
+    RATELIMIT_ENABLED = os.getenv('RATELIMIT_ENABLED', 'true').lower() == 'true'
+    RATELIMIT_DEFAULT = os.getenv('RATELIMIT_DEFAULT', "100 per minute")
+    RATELIMIT_STORAGE_URL = os.getenv('RATELIMIT_STORAGE_URL', 'sqlite:///' + os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data/ratelimit.db'))
+    RATELIMIT_ENDPOINTS = {
+        '/verify': '10 per minute',  # password guesses, per address; token refreshes get the default
+        '/api/schedules': '60 per minute',
+        '/api/schedules/history': '30 per minute',
+        '/api/schedules/range': '20 per minute',
+    }
+    RATELIMIT_TRUST_PROXY = os.getenv('RATELIMIT_TRUST_PROXY', 'false').lower() == 'true'  # behind nginx
+    RATELIMIT_MAX_KEYS = int(os.getenv('RATELIMIT_MAX_KEYS', 10000))
+    RATELIMIT_IDLE_SECONDS = 86400  # buckets untouched this long are full again and can be dropped
     
-    # Logging
-    LOG_LEVEL = 'INFO'
-    LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-    LOG_FILE = 'app.log'
+    # Logging (queue-backed, see logsetup.py). LOG_FORMAT=json writes one JSON object
+    # per line; LOG_FILE='' logs to stderr only.
+    LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+    LOG_FORMAT = os.getenv('LOG_FORMAT', '%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    LOG_FILE = os.getenv('LOG_FILE', 'app.log')
+    # Share of routine access log lines kept; errors and slow requests are always logged
+    LOG_ACCESS_SAMPLE_RATE = float(os.getenv('LOG_ACCESS_SAMPLE_RATE', 0.1))
+    LOG_SLOW_REQUEST = float(os.getenv('LOG_SLOW_REQUEST', 1.0))  # seconds
     
     # Cache settings
     CACHE_TYPE = 'redis'
     CACHE_REDIS_URL = REDIS_URL
-    CACHE_DEFAULT_TIMEOUT = 300  # 5 minutes 
\ No newline at end of file
+    CACHE_DEFAULT_TIMEOUT = 300  # 5 minutes
+
+    # Standalone server (server.py) concurrency
+    SERVER_PORT = int(os.getenv('PORT', 8000))
+    SERVER_MAX_WORKERS = int(os.getenv('SERVER_MAX_WORKERS', 32))
+    SERVER_MAX_PENDING = int(os.getenv('SERVER_MAX_PENDING', 64))
+    SERVER_UPSTREAM_WORKERS = int(os.getenv('SERVER_UPSTREAM_WORKERS', 24))
+    SERVER_UPSTREAM_WAIT = float(os.getenv('SERVER_UPSTREAM_WAIT', 10))
+    SERVER_REQUEST_TIMEOUT = float(os.getenv('SERVER_REQUEST_TIMEOUT', 30))
+    # Restarts: with SO_REUSEPORT (set in both processes) a new server.py can bind the
+    # port while the old one drains. Off by default, since it also lets a stray second
+    # server share the port and take half the traffic. On SIGTERM in-flight requests
+    # get SERVER_DRAIN_TIMEOUT seconds to finish.
+    SERVER_REUSE_PORT = os.getenv('SERVER_REUSE_PORT', 'false').lower() == 'true'
+    SERVER_DRAIN_TIMEOUT = float(os.getenv('SERVER_DRAIN_TIMEOUT', 20))
+    # Fetch today's schedules before /ready reports ready (at most AMION_BATCH_TIMEOUT)
+    SERVER_WARM_SCHEDULES = os.getenv('SERVER_WARM_SCHEDULES', 'true').lower() == 'true'
+
+    # Amion feeds shown on the on-call page; adding a service is one entry here.
+    #   location     Amion Lo= code
+    #   path         per-feed CSV endpoint (takes the Amion year as-is)
+    #   year_offset  applied to calendar dates; the resident schedule is published a year behind
+    #   ttl          seconds a downloaded CSV is served from cache
+    #   parser       schedule | churchill | cardiac | attending (with roles=(attending, fellow))
+    AMION_FEEDS = {
+        'schedule': {'location': 'mghsurgery1811', 'path': '/api/schedule', 'year_offset': -1,
+                     'ttl': CACHE_DEFAULT_TIMEOUT, 'parser': 'schedule'},
+        'churchill': {'location': 'Churchill', 'path': '/api/churchill', 'year_offset': 0,
+                      'ttl': 900, 'parser': 'churchill'},
+        'vascular': {'location': 'VascOncall!', 'path': '/api/vascular', 'year_offset': 0,
+                     'ttl': 900, 'parser': 'attending', 'roles': ('MGH Surgeon On-Call', 'MGH Fellow On-Call')},
+        'thoracic': {'location': 'MGHThoracic', 'path': '/api/thoracic', 'year_offset': 0,
+                     'ttl': 900, 'parser': 'attending', 'roles': ('MGH & MD Connect', 'Fellow On Call (24 hr)')},
+        'cardiac': {'location': 'mghcs', 'path': '/api/cardiac', 'year_offset': 0,
+                    'ttl': 900, 'parser': 'cardiac'},
+    }
+
+    # Expired cache entries are still served for AMION_CACHE_STALE_TTL while refreshing
+    AMION_CACHE_STALE_TTL = int(os.getenv('AMION_CACHE_STALE_TTL', 3600))
+    AMION_REFRESH_WORKERS = int(os.getenv('AMION_REFRESH_WORKERS', 4))  # threads doing those refreshes
+    AMION_CACHE_MAX_ENTRIES = int(os.getenv('AMION_CACHE_MAX_ENTRIES', 512))
+
+    # Per-feed circuit breakers: after AMION_BREAKER_FAILURES consecutive failures a
+    # feed stops calling Amion for AMION_BREAKER_RESET seconds and serves its last
+    # stored copy, re-checking Amion every AMION_FALLBACK_TTL seconds
+    AMION_BREAKER_FAILURES = int(os.getenv('AMION_BREAKER_FAILURES', 5))
+    AMION_BREAKER_RESET = float(os.getenv('AMION_BREAKER_RESET', 30))
+    AMION_FALLBACK_TTL = int(os.getenv('AMION_FALLBACK_TTL', 30))
+
+    # Batched schedule fetches (/api/schedules)
+    AMION_FETCH_WORKERS = int(os.getenv('AMION_FETCH_WORKERS', 10))
+    AMION_BATCH_TIMEOUT = float(os.getenv('AMION_BATCH_TIMEOUT', 15))
+
+    # Date-range schedule fetches (/api/schedules/range)
+    AMION_RANGE_MAX_DAYS = int(os.getenv('AMION_RANGE_MAX_DAYS', 31))
+    AMION_RANGE_WORKERS = int(os.getenv('AMION_RANGE_WORKERS', 6))
+    AMION_RANGE_TIMEOUT = float(os.getenv('AMION_RANGE_TIMEOUT', 60))
+
+    # Live schedule changes (/api/schedules/live): one poll per watched feed and date
+    # per process, pushed to every client watching it as Server-Sent Events
+    LIVE_POLL_INTERVAL = float(os.getenv('LIVE_POLL_INTERVAL', 60))
+    LIVE_HEARTBEAT = float(os.getenv('LIVE_HEARTBEAT', 20))
+    LIVE_MAX_SUBSCRIBERS = int(os.getenv('LIVE_MAX_SUBSCRIBERS', 1000))
+    LIVE_MAX_DATES = int(os.getenv('LIVE_MAX_DATES', 7))
+    LIVE_RETRY_MS = int(os.getenv('LIVE_RETRY_MS', 5000))
+    # app.py streams hold a gunicorn thread, so they end after this and the client reconnects
+    LIVE_STREAM_MAX_SECONDS = float(os.getenv('LIVE_STREAM_MAX_SECONDS', 300))
+    # ...and each worker process keeps at most this many open, well below GUNICORN_THREADS;
+    # past it clients are told to poll every LIVE_POLL_INTERVAL seconds instead
+    LIVE_MAX_THREAD_STREAMS = int(os.getenv('LIVE_MAX_THREAD_STREAMS', 4))
+
+    # Background prefetch of schedules around today: server.py, or one gunicorn
+    # worker elected through the shared cache (see gunicorn.conf.py)
+    AMION_PREFETCH_ENABLED = os.getenv('AMION_PREFETCH_ENABLED', 'true').lower() == 'true'
+    AMION_PREFETCH_DAYS_BEFORE = int(os.getenv('AMION_PREFETCH_DAYS_BEFORE', 3))
+    AMION_PREFETCH_DAYS_AFTER = int(os.getenv('AMION_PREFETCH_DAYS_AFTER', 3))
+    AMION_PREFETCH_INTERVAL = int(os.getenv('AMION_PREFETCH_INTERVAL', 900))
+    AMION_PREFETCH_PEAK_INTERVAL = int(os.getenv('AMION_PREFETCH_PEAK_INTERVAL', 240))
+    AMION_PREFETCH_PEAK_HOURS = [(5, 7), (16, 19)]  # local [start, end) hours around sign-out
+    AMION_PREFETCH_JITTER = int(os.getenv('AMION_PREFETCH_JITTER', 30))
+    AMION_PREFETCH_CONCURRENCY = int(os.getenv('AMION_PREFETCH_CONCURRENCY', 2))
+
+    # Local copy of every schedule fetched from Amion, with revision history
+    SCHEDULE_DB_PATH = os.getenv('SCHEDULE_DB_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data/schedules.db'))
+    # Latest content hash per (feed, date) remembered in memory to skip unchanged writes
+    SCHEDULE_STORE_MAX_HASHES = int(os.getenv('SCHEDULE_STORE_MAX_HASHES', 4096))
+
+    # Cache shared by all worker processes on the host, behind each one's in-memory
+    # cache, so an Amion fetch by one gunicorn worker serves the rest. Empty disables it.
+    SHARED_CACHE_PATH = os.getenv('SHARED_CACHE_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data/cache.db'))
+    SHARED_CACHE_MAX_ENTRIES = int(os.getenv('SHARED_CACHE_MAX_ENTRIES', 2048))
+
+    # Upstream HTTP client used for every Amion call
+    AMION_BASE_URL = os.getenv('AMION_BASE_URL', 'http://www.amion.com')
+    UPSTREAM_CONNECT_TIMEOUT = float(os.getenv('UPSTREAM_CONNECT_TIMEOUT', 3))
+    UPSTREAM_READ_TIMEOUT = float(os.getenv('UPSTREAM_READ_TIMEOUT', 10))
+    UPSTREAM_RETRIES = int(os.getenv('UPSTREAM_RETRIES', 2))
+    UPSTREAM_BACKOFF = float(os.getenv('UPSTREAM_BACKOFF', 0.5))
+    UPSTREAM_MAX_BYTES = int(os.getenv('UPSTREAM_MAX_BYTES', 2 * 1024 * 1024))
+    UPSTREAM_POOL_SIZE = int(os.getenv('UPSTREAM_POOL_SIZE', 10))
+    # Cap on Amion requests in flight on the host, whatever triggered them. Each of
+    # UPSTREAM_PROCESSES worker processes (gunicorn.conf.py sets its worker count)
+    # enforces its share, so the total stays at the configured value.
+    UPSTREAM_PROCESSES = max(1, int(os.getenv('UPSTREAM_PROCESSES', 1)))
+    UPSTREAM_MAX_CONCURRENT = max(1, int(os.getenv('UPSTREAM_MAX_CONCURRENT', 10)) // UPSTREAM_PROCESSES)
+    UPSTREAM_ADMISSION_WAIT = float(os.getenv('UPSTREAM_ADMISSION_WAIT', 5))
+
+    # Long-lived per-thread phonebook connections
+    DATABASE_STATEMENT_CACHE = int(os.getenv('DATABASE_STATEMENT_CACHE', 64))
+    DATABASE_PRAGMAS = (
+        'PRAGMA journal_mode=WAL',  # readers never wait on writers
+        'PRAGMA synchronous=NORMAL',
+        'PRAGMA cache_size=-8000',  # 8 MB page cache
+        'PRAGMA mmap_size=67108864',  # 64 MB
+        'PRAGMA temp_store=MEMORY',
+        'PRAGMA busy_timeout=5000',
+    )
+
+    # Largest page a client can request from /api/phone/contacts with limit=
+    CONTACTS_MAX_PAGE = int(os.getenv('CONTACTS_MAX_PAGE', 500))
+
+    # Response compression and static asset caching (server.py)
+    COMPRESSION_MIN_SIZE = int(os.getenv('COMPRESSION_MIN_SIZE', 1024))
+    COMPRESSION_LEVEL = int(os.getenv('COMPRESSION_LEVEL', 6))
+    STATIC_CACHE_MAX_FILE_SIZE = int(os.getenv('STATIC_CACHE_MAX_FILE_SIZE', 1024 * 1024))
+
+    # Output of build_assets.py; hashed files there are cached by browsers for a year
+    STATIC_BUILD_DIR = os.getenv('STATIC_BUILD_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static'))
+    STATIC_IMMUTABLE_MAX_AGE = int(os.getenv('STATIC_IMMUTABLE_MAX_AGE', 365 * 24 * 3600))
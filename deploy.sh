@@ -17,7 +17,8 @@ pip3 install -r requirements.txt
 sudo mkdir -p /var/log/mghsurgery
 sudo mkdir -p /var/www/mghsurgery/static
 
-# Copy static files
+# Build hashed, minified assets and copy them
+python3 build_assets.py
 cp -r static/* /var/www/mghsurgery/static/
 
 # Set up Nginx
@@ -40,6 +41,7 @@ User=www-data
 Group=www-data
 WorkingDirectory=/path/to/your/app
 Environment="PATH=/path/to/your/venv/bin"
+Environment="RATELIMIT_TRUST_PROXY=true"
 ExecStart=/path/to/your/venv/bin/gunicorn -c gunicorn.conf.py app:app
 Restart=always
 
@@ -1,10 +1,41 @@
 import multiprocessing
+import os
 
 # Gunicorn configuration for production
 bind = "0.0.0.0:8000"
-workers = multiprocessing.cpu_count() * 2 + 1
-worker_class = "sync"
-timeout = 120
+
+# Requests spend nearly all their time waiting on Amion, so a few processes with
+# many threads each handle far more at once than one process per request. The
+# processes share fetched schedules through SHARED_CACHE_PATH and read the phone
+# directory from the same memory-mapped SQLite file. GUNICORN_WORKER_CLASS=sync
+# restores one request per process (gunicorn turns sync into gthread whenever
+# threads > 1, so sync pins threads to 1).
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "gthread")
+if worker_class == "sync":
+    workers = int(os.getenv("GUNICORN_WORKERS", multiprocessing.cpu_count() * 2 + 1))
+    threads = 1
+    # A live stream would hold the worker's only thread for LIVE_STREAM_MAX_SECONDS;
+    # tell clients to poll instead
+    os.environ.setdefault("LIVE_MAX_THREAD_STREAMS", "0")
+elif worker_class == "gthread":
+    workers = int(os.getenv("GUNICORN_WORKERS", max(2, min(multiprocessing.cpu_count(), 4))))
+    threads = int(os.getenv("GUNICORN_THREADS", 32))
+else:
+    raise RuntimeError(f"GUNICORN_WORKER_CLASS must be gthread or sync, not {worker_class!r}")
+
+# UPSTREAM_MAX_CONCURRENT is a host-wide cap; each worker takes its share
+os.environ["UPSTREAM_PROCESSES"] = str(workers)
+
+from config import Config  # after the environment above is settled
+
+# gthread workers report in from their main loop, so the timeout only catches a
+# wedged process; long requests (/api/schedules/range, live streams) run in
+# threads and are bounded by AMION_RANGE_TIMEOUT and LIVE_STREAM_MAX_SECONDS.
+# A sync worker is silent for the whole request, so it gets the longest one.
+if worker_class == "sync":
+    timeout = int(Config.AMION_RANGE_TIMEOUT) + 30
+else:
+    timeout = 30
 keepalive = 5
 max_requests = 1000
 max_requests_jitter = 50
@@ -12,6 +43,20 @@ accesslog = "access.log"
 errorlog = "error.log"
 loglevel = "info"
 
+# Schedule prefetching (amion.Prefetcher). Every worker starts a prefetcher
+# thread after the fork, but they elect one through the shared cache
+# (SHARED_CACHE_PATH): only the worker holding the lease fetches, and the rest
+# read what it stored. A recycled worker (max_requests) hands the lease on
+# when it exits.
+def post_fork(server, worker):
+    import amion
+    worker.prefetcher = amion.start_prefetcher(shared=True)
+
+def worker_exit(server, worker):
+    prefetcher = getattr(worker, "prefetcher", None)
+    if prefetcher is not None:
+        prefetcher.stop()
+
 # SSL configuration (if needed)
 # keyfile = "path/to/keyfile"
 # certfile = "path/to/certfile" 
\ No newline at end of file
@@ -1,15 +1,102 @@
 import sqlite3
 import os
 
-def init_db():
-    # Create database directory if it doesn't exist
-    os.makedirs('data', exist_ok=True)
-    
-    # Connect to SQLite database (creates it if it doesn't exist)
-    conn = sqlite3.connect('data/phonebook.db')
-    cursor = conn.cursor()
+# SQL expression for a number with its punctuation stripped, e.g. 617-555-0101 -> 6175550101
+DIGITS_SQL = "replace(replace(replace(replace(replace(coalesce({column}, ''), '-', ''), ' ', ''), '(', ''), ')', ''), '.', '')"
+
+def fts_values(prefix):
+    """Column values for a contacts_fts row taken from the contacts row ``prefix`` (new/old/c)."""
+    phone_digits = DIGITS_SQL.format(column=f'{prefix}.phone_number')
+    pager_digits = DIGITS_SQL.format(column=f'{prefix}.pager_number')
+    return (f"{prefix}.id, {prefix}.name, {prefix}.role, coalesce({prefix}.email, ''), "
+            f"{prefix}.phone_number, coalesce({prefix}.pager_number, ''), "
+            f"trim({phone_digits} || ' ' || {pager_digits})")
+
+def search_index_statements():
+    """Statements creating contacts_fts and the triggers that keep it in sync."""
+    return [
+        '''
+        CREATE VIRTUAL TABLE IF NOT EXISTS contacts_fts USING fts5(
+            name, role, email, phone_number, pager_number, digits,
+            tokenize = 'unicode61 remove_diacritics 2'
+        )
+        ''',
+        f'''
+        CREATE TRIGGER IF NOT EXISTS contacts_fts_insert
+        AFTER INSERT ON contacts
+        BEGIN
+            INSERT INTO contacts_fts (rowid, name, role, email, phone_number, pager_number, digits)
+            VALUES ({fts_values('new')});
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS contacts_fts_delete
+        AFTER DELETE ON contacts
+        BEGIN
+            DELETE FROM contacts_fts WHERE rowid = old.id;
+        END
+        ''',
+        f'''
+        CREATE TRIGGER IF NOT EXISTS contacts_fts_update
+        AFTER UPDATE OF name, role, email, phone_number, pager_number ON contacts
+        BEGIN
+            DELETE FROM contacts_fts WHERE rowid = old.id;
+            INSERT INTO contacts_fts (rowid, name, role, email, phone_number, pager_number, digits)
+            VALUES ({fts_values('new')});
+        END
+        ''',
+    ]
+
+def create_search_index(cursor):
+    """Create the contacts_fts full-text index and the triggers that keep it in sync.
+
+    Phone and pager numbers are indexed both as written, so 617-555-0101 matches
+    "0101", and as bare digits, so it also matches "6175550101".
+    """
+    for statement in search_index_statements():
+        cursor.execute(statement)
+    # Rebuild from scratch so the index also covers rows from before it existed
+    rebuild_search_index(cursor)
+
+def rebuild_search_index(cursor):
+    """Refill contacts_fts from the contacts table."""
+    cursor.execute('DELETE FROM contacts_fts')
+    cursor.execute(f'''
+        INSERT INTO contacts_fts (rowid, name, role, email, phone_number, pager_number, digits)
+        SELECT {fts_values('c')} FROM contacts c
+    ''')
 
-    # Create tables
+def create_sync_tables(cursor):
+    """Support delta sync: an index on updated_at and tombstones for deleted contacts."""
+    cursor.executescript('''
+        CREATE INDEX IF NOT EXISTS idx_contacts_updated_at ON contacts (updated_at);
+
+        CREATE TABLE IF NOT EXISTS contacts_deleted (
+            id INTEGER PRIMARY KEY,
+            deleted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+
+        CREATE INDEX IF NOT EXISTS idx_contacts_deleted_at ON contacts_deleted (deleted_at);
+
+        CREATE TRIGGER IF NOT EXISTS contacts_record_delete
+        AFTER DELETE ON contacts
+        BEGIN
+            INSERT OR REPLACE INTO contacts_deleted (id) VALUES (old.id);
+        END;
+    ''')
+
+# Keeps updated_at current for delta sync
+TIMESTAMP_TRIGGER = '''
+    CREATE TRIGGER IF NOT EXISTS update_contacts_timestamp
+    AFTER UPDATE ON contacts
+    BEGIN
+        UPDATE contacts SET updated_at = CURRENT_TIMESTAMP
+        WHERE id = NEW.id;
+    END
+'''
+
+def create_tables(cursor):
+    """Create the categories and contacts tables."""
     cursor.executescript('''
         -- Create categories table
         CREATE TABLE IF NOT EXISTS categories (
@@ -32,15 +119,40 @@ def init_db():
             updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
             FOREIGN KEY (category_id) REFERENCES categories (id)
         );
-
-        -- Create trigger to update the updated_at timestamp
-        CREATE TRIGGER IF NOT EXISTS update_contacts_timestamp 
-        AFTER UPDATE ON contacts
-        BEGIN
-            UPDATE contacts SET updated_at = CURRENT_TIMESTAMP
-            WHERE id = NEW.id;
-        END;
     ''')
+    cursor.execute(TIMESTAMP_TRIGGER)
+
+def create_indexes(cursor):
+    """Indexes for the contact queries and the natural key that imports upsert on.
+
+    Listings filter on is_active and usually a category and page by id;
+    SQLite appends the rowid to every index, so (category_id, is_active)
+    serves the filter and the ordering without touching other rows. A
+    contact is identified by its category and name. On an older database
+    with duplicates of that key the unique index cannot be built; the other
+    indexes are still created and manage_contacts.py reports the duplicates.
+    """
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_contacts_category_active ON contacts (category_id, is_active)')
+    try:
+        cursor.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_contacts_natural_key ON contacts (category_id, name)')
+    except sqlite3.IntegrityError:
+        print("Warning: contacts has duplicate (category, name) pairs; "
+              "run 'python manage_contacts.py duplicates' to list them")
+
+def init_db(path='data/phonebook.db'):
+    # Create database directory if it doesn't exist
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    
+    # Connect to SQLite database (creates it if it doesn't exist)
+    conn = sqlite3.connect(path)
+    # WAL lets the servers keep reading while contacts are being written
+    conn.execute('PRAGMA journal_mode=WAL')
+    cursor = conn.cursor()
+
+    create_tables(cursor)
+    create_indexes(cursor)
+    create_search_index(cursor)
+    create_sync_tables(cursor)
 
     # Insert default categories
     categories = [
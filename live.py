@@ -0,0 +1,227 @@
+"""Push schedule changes to clients as Server-Sent Events.
+
+One ScheduleWatcher per process re-reads every (service, date) that some
+client is watching, through the normal caches, and compares a hash of the
+parsed schedule with the last one it saw. When a feed really changed, each
+subscriber to it gets a compact diff instead of re-fetching the whole day.
+"""
+import hashlib
+import json
+import logging
+import queue
+import socket
+import threading
+import time
+from datetime import date
+
+from config import Config
+import amion
+
+logger = logging.getLogger(__name__)
+
+def content_hash(data):
+    """Hash of a parsed feed that ignores key order and formatting."""
+    normalized = json.dumps(data, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(normalized.encode()).hexdigest()[:16]
+
+def diff(old, new):
+    """Top-level changes between two parsed feeds: ``{'set': {key: value}, 'removed': [key]}``.
+
+    Every parsed feed is a dict of roles or slots, so replacing the keys that
+    changed is enough for a client to rebuild ``new`` from ``old``.
+    """
+    return {
+        'set': {key: value for key, value in new.items() if old.get(key) != value},
+        'removed': [key for key in old if key not in new],
+    }
+
+def format_event(event, data):
+    return f'event: {event}\ndata: {json.dumps(data, separators=(",", ":"))}\n\n'.encode()
+
+PREAMBLE = f'retry: {Config.LIVE_RETRY_MS}\n\n'.encode()
+HEARTBEAT = b': ping\n\n'
+# Answer (with a 503) when a process has no room for another stream: the
+# client reloads the schedule every ``poll`` seconds instead
+BUSY = {'error': 'Live updates are busy; poll instead', 'poll': Config.LIVE_POLL_INTERVAL}
+BUSY_RETRY_AFTER = str(int(Config.LIVE_POLL_INTERVAL))
+
+def parse_watch(dates, services):
+    """Parse the date= and services= query values into (service, ISO date) keys; raises ValueError."""
+    try:
+        days = [date.fromisoformat(value).isoformat() for value in (dates or '').split(',') if value]
+    except ValueError:
+        raise ValueError('date must be a comma-separated list of dates like 2025-01-31')
+    if not days or len(days) > Config.LIVE_MAX_DATES:
+        raise ValueError(f'Watch between 1 and {Config.LIVE_MAX_DATES} dates')
+    services = services.split(',') if services else list(amion.FEEDS)
+    unknown = [service for service in services if service not in amion.FEEDS]
+    if unknown:
+        raise ValueError(f"Unknown services: {', '.join(unknown)}")
+    return [(service, day) for day in days for service in services]
+
+class SocketSubscriber:
+    """A client socket handed off by server.py once the event-stream headers are sent.
+
+    No thread waits on it; the watcher writes to it directly. Writes never
+    block: a client that cannot keep up with a few small events is dropped and
+    reconnects.
+    """
+
+    def __init__(self, sock):
+        self.sock = sock
+        sock.setblocking(False)
+
+    def deliver(self, data):
+        try:
+            return self.sock.send(data) == len(data)
+        except OSError:
+            return False
+
+    def close(self):
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+
+class QueueSubscriber:
+    """Events queued for a response generator (app.py), which writes them out itself."""
+
+    def __init__(self):
+        self.events = queue.SimpleQueue()
+        self.closed = False
+
+    def deliver(self, data):
+        if self.closed:
+            return False
+        self.events.put(data)
+        return True
+
+    def close(self):
+        self.closed = True
+        self.events.put(None)
+
+class ScheduleWatcher(threading.Thread):
+    """Background thread polling the watched feeds and fanning changes out to subscribers.
+
+    Every ``interval`` seconds each (service, date) with a subscriber is read
+    through amion.get_feed, so Amion itself is asked at most once per feed TTL
+    however many clients are watching. Subscribers get a heartbeat every
+    ``heartbeat`` seconds, which is also how dead connections are found.
+    """
+
+    def __init__(self, interval, heartbeat, max_subscribers):
+        super().__init__(name='live-watcher', daemon=True)
+        self.interval = interval
+        self.heartbeat = heartbeat
+        self.max_subscribers = max_subscribers
+        self._subscribers = {}  # subscriber -> keys
+        self._watchers = {}  # (service, ISO date) -> set of subscribers
+        self._seen = {}  # (service, ISO date) -> (hash, parsed feed)
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+
+    def subscribe(self, subscriber, keys):
+        """Register a subscriber for some (service, ISO date) keys; False if the process is full."""
+        with self._lock:
+            if len(self._subscribers) >= self.max_subscribers:
+                return False
+            self._subscribers[subscriber] = keys
+            for key in keys:
+                self._watchers.setdefault(key, set()).add(subscriber)
+        self._wake.set()  # take a baseline for new keys now rather than at the next poll
+        return True
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            for key in self._subscribers.pop(subscriber, ()):
+                watchers = self._watchers.get(key)
+                if watchers is not None:
+                    watchers.discard(subscriber)
+                    if not watchers:
+                        del self._watchers[key]
+                        self._seen.pop(key, None)
+        subscriber.close()
+
+    def subscriber_count(self):
+        return len(self._subscribers)
+
+    def close_all(self):
+        """Disconnect every subscriber; browsers reconnect after the retry delay."""
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            self.unsubscribe(subscriber)
+
+    def run(self):
+        next_poll = next_heartbeat = time.monotonic()
+        while True:
+            self._wake.wait(max(0, min(next_poll, next_heartbeat) - time.monotonic()))
+            woken = self._wake.is_set()
+            self._wake.clear()
+            now = time.monotonic()
+            if now >= next_heartbeat:
+                self._send_all(HEARTBEAT)
+                next_heartbeat = now + self.heartbeat
+            if woken or now >= next_poll:
+                self.poll(baseline_only=woken and now < next_poll)
+                if now >= next_poll:
+                    next_poll = now + self.interval
+
+    def poll(self, baseline_only=False):
+        """Check each watched feed once and push any change; with ``baseline_only``, just hash new keys."""
+        with self._lock:
+            keys = [key for key in self._watchers if not baseline_only or key not in self._seen]
+        for service, day in keys:
+            try:
+                when = date.fromisoformat(day)
+                data = amion.get_feed(service, when.day, when.month, when.year)
+            except Exception as e:
+                logger.debug("Live check of %s on %s failed: %s", service, day, e)
+                continue
+            self._compare((service, day), data)
+
+    def _compare(self, key, data):
+        new_hash = content_hash(data)
+        with self._lock:
+            if key not in self._watchers:
+                return
+            previous = self._seen.get(key)
+            self._seen[key] = (new_hash, data)
+            subscribers = list(self._watchers[key])
+        if previous is None or previous[0] == new_hash:
+            return
+        service, day = key
+        logger.info("Schedule changed: %s on %s, notifying %d clients", service, day, len(subscribers))
+        event = format_event('change', {'service': service, 'date': day, 'hash': new_hash,
+                                        'diff': diff(previous[1], data)})
+        self._send(subscribers, event)
+
+    def _send_all(self, data):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        self._send(subscribers, data)
+
+    def _send(self, subscribers, data):
+        for subscriber in subscribers:
+            if not subscriber.deliver(data):
+                self.unsubscribe(subscriber)
+
+_watcher = None
+_watcher_lock = threading.Lock()
+
+def get_watcher():
+    """This process's watcher, started on first use."""
+    global _watcher
+    with _watcher_lock:
+        if _watcher is None:
+            _watcher = ScheduleWatcher(Config.LIVE_POLL_INTERVAL, Config.LIVE_HEARTBEAT, Config.LIVE_MAX_SUBSCRIBERS)
+            _watcher.start()
+        return _watcher
+
+def close_subscribers():
+    """Disconnect everyone watching this process, e.g. before it exits."""
+    with _watcher_lock:
+        watcher = _watcher
+    if watcher is not None:
+        watcher.close_all()
@@ -0,0 +1,86 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import random
+
+from config import Config
+
+# Attributes every LogRecord has; anything else was passed in extra= and is structured data
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'sample'}
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per line, with any extra= fields alongside the message."""
+
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        entry.update((key, value) for key, value in vars(record).items() if key not in _RECORD_ATTRS)
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+class SamplingFilter(logging.Filter):
+    """Pass only a fraction of routine records; warnings and above always pass.
+
+    A record can opt out of sampling with ``extra={'sample': False}``.
+    """
+
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING or not getattr(record, 'sample', True):
+            return True
+        return self.rate >= 1 or random.random() < self.rate
+
+_listener = None
+
+def configure_logging():
+    """Route all logging through a queue so request threads never block on I/O.
+
+    Records are formatted and written by a single listener thread to stderr
+    and, if set, Config.LOG_FILE. LOG_FORMAT=json switches to one JSON object
+    per line. Safe to call more than once.
+    """
+    global _listener
+    if _listener is not None:
+        return _listener
+
+    if Config.LOG_FORMAT == 'json':
+        formatter = JSONFormatter()
+    else:
+        formatter = logging.Formatter(Config.LOG_FORMAT)
+
+    handlers = [logging.StreamHandler()]
+    if Config.LOG_FILE:
+        handlers.append(logging.FileHandler(Config.LOG_FILE))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue = queue.SimpleQueue()
+    root = logging.getLogger()
+    root.handlers[:] = [logging.handlers.QueueHandler(log_queue)]
+    root.setLevel(Config.LOG_LEVEL)
+
+    access = logging.getLogger('access')
+    access.addFilter(SamplingFilter(Config.LOG_ACCESS_SAMPLE_RATE))
+
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+    return _listener
+
+def stop_logging():
+    """Write out every queued record and stop the listener; safe to call more than once."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+    logging.shutdown()
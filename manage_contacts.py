@@ -0,0 +1,280 @@
+"""Bulk import and export of the phone directory.
+
+    python manage_contacts.py import directory.csv
+    python manage_contacts.py import directory.json
+    python manage_contacts.py export directory.csv
+    python manage_contacts.py duplicates
+
+Files have one contact per row (CSV) or object (JSON, a list or
+{"contacts": [...]}) with the columns category, name, role, phone_number
+and optionally pager_number, email, is_active and category_display_name.
+Unknown categories are created. A contact is identified by its category
+and name: an import inserts new contacts and updates existing ones in a
+single transaction, leaving unchanged rows (and their updated_at, which
+delta sync reads) alone. Two different people with the same name in one
+category cannot both be stored, so a file with such a pair is refused;
+give them distinct names (e.g. "Dr. Lee (Vascular)"). Exports use the
+same columns, so a file can be exported, edited and imported again.
+"""
+import argparse
+import csv
+import json
+import os
+import sqlite3
+import sys
+import time
+
+from config import Config
+from init_db import (TIMESTAMP_TRIGGER, create_indexes, create_search_index, create_sync_tables,
+                     create_tables, rebuild_search_index, search_index_statements)
+
+COLUMNS = ['category', 'category_display_name', 'name', 'role', 'phone_number', 'pager_number', 'email', 'is_active']
+REQUIRED = ['category', 'name', 'role', 'phone_number']
+
+# Dropped for a bulk load and rebuilt once at the end, instead of being
+# maintained row by row; the natural key stays because the upsert needs it
+DEFERRED_TRIGGERS = ['update_contacts_timestamp', 'contacts_fts_insert', 'contacts_fts_delete', 'contacts_fts_update']
+DEFERRED_INDEXES = ['idx_contacts_category_active', 'idx_contacts_updated_at']
+
+UPSERT = '''
+    INSERT INTO contacts (category_id, name, role, phone_number, pager_number, email, is_active)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (category_id, name) DO UPDATE SET
+        role = excluded.role,
+        phone_number = excluded.phone_number,
+        pager_number = excluded.pager_number,
+        email = excluded.email,
+        is_active = excluded.is_active,
+        updated_at = CURRENT_TIMESTAMP
+    WHERE (contacts.role, contacts.phone_number, contacts.pager_number, contacts.email, contacts.is_active)
+        IS NOT (excluded.role, excluded.phone_number, excluded.pager_number, excluded.email, excluded.is_active)
+'''
+
+def _file_format(path, requested):
+    if requested:
+        return requested
+    return 'json' if path.lower().endswith('.json') else 'csv'
+
+def read_contacts(path, file_format=None):
+    """Read contact dicts from a CSV or JSON file."""
+    if _file_format(path, file_format) == 'json':
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+        rows = data.get('contacts', []) if isinstance(data, dict) else data
+    else:
+        with open(path, newline='', encoding='utf-8-sig') as f:
+            rows = list(csv.DictReader(f))
+    return [{key: (str(value).strip() if value is not None else '') for key, value in row.items() if key}
+            for row in rows]
+
+def _is_active(value):
+    return 0 if str(value).strip().lower() in ('0', 'false', 'no', 'n', 'inactive') else 1
+
+def prepare_rows(conn, contacts):
+    """Validate and de-duplicate contacts into upsert parameters.
+
+    Returns (rows, duplicates), where duplicates counts rows that repeat
+    another row exactly; categories missing from the database are created.
+    Raises ValueError listing every invalid row, or every (category, name)
+    that appears with different details, since only one of them could be kept.
+    """
+    errors = []
+    for number, contact in enumerate(contacts, start=1):
+        missing = [column for column in REQUIRED if not contact.get(column)]
+        if missing:
+            errors.append(f"contact {number}: missing {', '.join(missing)}")
+    if errors:
+        raise ValueError('Invalid rows:\n  ' + '\n  '.join(errors[:20])
+                         + (f'\n  ... and {len(errors) - 20} more' if len(errors) > 20 else ''))
+
+    category_ids = {name: id for id, name in conn.execute('SELECT id, name FROM categories')}
+    for contact in contacts:
+        category = contact['category']
+        if category not in category_ids:
+            display_name = contact.get('category_display_name') or category.title()
+            category_ids[category] = conn.execute(
+                'INSERT INTO categories (name, display_name) VALUES (?, ?)', (category, display_name)).lastrowid
+
+    rows = {}
+    collisions = []
+    for contact in contacts:
+        key = (category_ids[contact['category']], contact['name'])
+        row = (*key, contact['role'], contact['phone_number'], contact.get('pager_number') or None,
+               contact.get('email') or None, _is_active(contact.get('is_active', 1)))
+        if rows.setdefault(key, row) != row:
+            collisions.append(f"{contact['category']}: {contact['name']}")
+    if collisions:
+        collisions = sorted(set(collisions))
+        raise ValueError('Different contacts share a category and name; only one could be kept:\n  '
+                         + '\n  '.join(collisions[:20])
+                         + (f'\n  ... and {len(collisions) - 20} more' if len(collisions) > 20 else ''))
+    return list(rows.values()), len(contacts) - len(rows)
+
+def find_duplicates(conn):
+    return conn.execute('''
+        SELECT cat.name, c.name, count(*) FROM contacts c
+        JOIN categories cat ON c.category_id = cat.id
+        GROUP BY c.category_id, c.name HAVING count(*) > 1
+        ORDER BY cat.name, c.name
+    ''').fetchall()
+
+def _has_natural_key(conn):
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'idx_contacts_natural_key'").fetchone() is not None
+
+def _ensure_schema(cursor):
+    """Bring an older or empty database up to the current schema before a load."""
+    has_search_index = cursor.execute(
+        "SELECT 1 FROM sqlite_master WHERE name = 'contacts_fts'").fetchone() is not None
+    create_tables(cursor)
+    create_indexes(cursor)
+    create_sync_tables(cursor)
+    if has_search_index:
+        for statement in search_index_statements():
+            cursor.execute(statement)
+    else:
+        create_search_index(cursor)
+
+def import_contacts(path, database=Config.DATABASE_PATH, file_format=None, defer=None):
+    """Upsert every contact in a file in one transaction; returns a dict of counts and timings.
+
+    With ``defer`` (by default, when the file has more contacts than the
+    table, as in a first load) the search index, the updated_at trigger and
+    the secondary indexes are dropped for the load and rebuilt once at the
+    end rather than maintained row by row.
+    """
+    start = time.perf_counter()
+    contacts = read_contacts(path, file_format)
+
+    os.makedirs(os.path.dirname(database) or '.', exist_ok=True)
+    conn = sqlite3.connect(database, isolation_level=None)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA busy_timeout=5000')
+    try:
+        cursor = conn.cursor()
+        _ensure_schema(cursor)
+        if not _has_natural_key(conn):
+            raise ValueError("contacts has duplicate (category, name) pairs; "
+                             "run 'python manage_contacts.py duplicates' and fix them first")
+
+        cursor.execute('BEGIN IMMEDIATE')
+        try:
+            rows, duplicates = prepare_rows(conn, contacts)
+            before, = cursor.execute('SELECT count(*) FROM contacts').fetchone()
+            if defer is None:
+                defer = len(rows) > before
+            if defer:
+                for trigger in DEFERRED_TRIGGERS:
+                    cursor.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+                for index in DEFERRED_INDEXES:
+                    cursor.execute(f'DROP INDEX IF EXISTS {index}')
+
+            load_start = time.perf_counter()
+            cursor.executemany(UPSERT, rows)
+            changed = cursor.rowcount
+            load_seconds = time.perf_counter() - load_start
+
+            if defer:
+                cursor.execute(TIMESTAMP_TRIGGER)
+                create_indexes(cursor)
+                cursor.execute('CREATE INDEX IF NOT EXISTS idx_contacts_updated_at ON contacts (updated_at)')
+                for statement in search_index_statements():
+                    cursor.execute(statement)
+                rebuild_search_index(cursor)
+            after, = cursor.execute('SELECT count(*) FROM contacts').fetchone()
+            cursor.execute('COMMIT')
+        except BaseException:
+            cursor.execute('ROLLBACK')
+            raise
+        conn.execute('PRAGMA optimize')
+    finally:
+        conn.close()
+
+    seconds = time.perf_counter() - start
+    return {
+        'rows': len(contacts),
+        'inserted': after - before,
+        'updated': changed - (after - before),
+        'unchanged': len(rows) - changed,
+        'duplicates': duplicates,
+        'deferred': defer,
+        'load_seconds': load_seconds,
+        'seconds': seconds,
+    }
+
+def export_contacts(path, database=Config.DATABASE_PATH, file_format=None, include_inactive=False):
+    """Write every contact to a CSV or JSON file in the import format; returns the row count."""
+    conn = sqlite3.connect(database)
+    conn.row_factory = sqlite3.Row
+    try:
+        rows = conn.execute(f'''
+            SELECT cat.name AS category, cat.display_name AS category_display_name, c.name, c.role,
+                   c.phone_number, c.pager_number, c.email, c.is_active
+            FROM contacts c JOIN categories cat ON c.category_id = cat.id
+            {'' if include_inactive else 'WHERE c.is_active = 1'}
+            ORDER BY cat.id, c.name
+        ''')
+        count = 0
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            if _file_format(path, file_format) == 'json':
+                f.write('[')
+                for count, row in enumerate(rows, start=1):
+                    f.write((',\n ' if count > 1 else '\n ') + json.dumps(dict(row)))
+                f.write('\n]\n')
+            else:
+                writer = csv.DictWriter(f, fieldnames=COLUMNS)
+                writer.writeheader()
+                for count, row in enumerate(rows, start=1):
+                    writer.writerow(dict(row))
+    finally:
+        conn.close()
+    return count
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--database', default=Config.DATABASE_PATH)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    import_parser = commands.add_parser('import', help='insert or update contacts from a CSV or JSON file')
+    import_parser.add_argument('path')
+    import_parser.add_argument('--format', choices=('csv', 'json'))
+    defer = import_parser.add_mutually_exclusive_group()
+    defer.add_argument('--defer-indexes', dest='defer', action='store_true', default=None,
+                       help='drop and rebuild the search index and secondary indexes around the load')
+    defer.add_argument('--no-defer-indexes', dest='defer', action='store_false')
+
+    export_parser = commands.add_parser('export', help='write contacts to a CSV or JSON file')
+    export_parser.add_argument('path')
+    export_parser.add_argument('--format', choices=('csv', 'json'))
+    export_parser.add_argument('--include-inactive', action='store_true')
+
+    commands.add_parser('duplicates', help='list (category, name) pairs that occur more than once')
+    options = parser.parse_args(argv)
+
+    try:
+        if options.command == 'import':
+            result = import_contacts(options.path, options.database, options.format, options.defer)
+            print(f"Imported {result['rows']} rows: {result['inserted']} inserted, {result['updated']} updated, "
+                  f"{result['unchanged']} unchanged, {result['duplicates']} duplicates skipped")
+            print(f"{result['seconds']:.2f}s total ({result['rows'] / result['seconds']:.0f} rows/s), "
+                  f"upsert {result['load_seconds']:.2f}s, indexes "
+                  f"{'rebuilt after the load' if result['deferred'] else 'maintained during the load'}")
+        elif options.command == 'export':
+            start = time.perf_counter()
+            count = export_contacts(options.path, options.database, options.format, options.include_inactive)
+            seconds = time.perf_counter() - start
+            print(f"Exported {count} contacts to {options.path} in {seconds:.2f}s ({count / max(seconds, 1e-6):.0f} rows/s)")
+        else:
+            conn = sqlite3.connect(options.database)
+            duplicates = find_duplicates(conn)
+            conn.close()
+            for category, name, count in duplicates:
+                print(f"{category}\t{name}\t{count}")
+            print(f"{len(duplicates)} duplicated (category, name) pairs")
+    except (OSError, ValueError, sqlite3.Error) as e:
+        print(f"Error: {e}")
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
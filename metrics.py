@@ -0,0 +1,140 @@
+"""In-process metrics, exposed in Prometheus text format at /metrics.
+
+Each process keeps its own numbers; under gunicorn every worker reports on
+itself, so scrape through something that tolerates that (or run server.py).
+"""
+import functools
+import threading
+import time
+from contextlib import contextmanager
+
+# Upper bounds in seconds; the last bucket is +Inf
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+def _label_str(names, values):
+    if not names:
+        return ''
+    pairs = ','.join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+    return '{' + pairs + '}'
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+class Counter:
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def value(self, *label_values):
+        return self._values.get(label_values, 0)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} counter']
+        with self._lock:
+            items = sorted(self._values.items())
+        for label_values, value in items:
+            lines.append(f'{self.name}{_label_str(self.labels, label_values)} {value}')
+        return lines
+
+class Gauge(Counter):
+    def dec(self, *label_values, amount=1):
+        self.inc(*label_values, amount=-amount)
+
+    def set(self, value, *label_values):
+        with self._lock:
+            self._values[label_values] = value
+
+    def render(self):
+        lines = super().render()
+        lines[1] = f'# TYPE {self.name} gauge'
+        return lines
+
+class Histogram:
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.buckets = buckets
+        self._series = {}  # label values -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, seconds, *label_values):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    series[i] += 1
+                    break
+            else:
+                series[len(self.buckets)] += 1
+            series[-1] += seconds
+
+    @contextmanager
+    def time(self, *label_values):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *label_values)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            items = sorted((labels, list(series)) for labels, series in self._series.items())
+        for label_values, series in items:
+            names = self.labels + ('le',)
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), series):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{_label_str(names, label_values + (bound,))} {cumulative}')
+            labels = _label_str(self.labels, label_values)
+            lines.append(f'{self.name}_count{labels} {cumulative}')
+            lines.append(f'{self.name}_sum{labels} {series[-1]:.6f}')
+        return lines
+
+def timed(histogram, *label_values):
+    """Decorator recording how long each call takes in ``histogram``."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with histogram.time(*label_values):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+request_seconds = Histogram('http_request_duration_seconds', 'Time to handle a request', ('route', 'method', 'status'))
+requests_in_flight = Gauge('http_requests_in_flight', 'Requests currently being handled')
+upstream_seconds = Histogram('amion_fetch_duration_seconds', 'Time spent fetching a CSV from Amion', ('feed', 'outcome'))
+cache_lookups = Counter('cache_lookups_total', 'Cache lookups by result', ('cache', 'result'))
+sqlite_seconds = Histogram('sqlite_query_duration_seconds', 'Time to run a SQLite query', ('query',))
+startup_seconds = Gauge('process_startup_seconds', 'Seconds spent in each startup step; "ready" is the total from process start', ('step',))
+
+METRICS = [request_seconds, requests_in_flight, upstream_seconds, cache_lookups, sqlite_seconds, startup_seconds]
+
+# Callables returning {(cache name, result): count} for caches that keep their own stats
+_cache_collectors = []
+
+def register_cache_collector(collect):
+    _cache_collectors.append(collect)
+
+def render():
+    """All metrics in Prometheus text exposition format."""
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    if _cache_collectors:
+        lines.append('# HELP cache_lookups_memoized_total Lookups in memoized functions by result')
+        lines.append('# TYPE cache_lookups_memoized_total counter')
+        for collect in _cache_collectors:
+            for (cache, result), value in sorted(collect().items()):
+                lines.append(f'cache_lookups_memoized_total{_label_str(("cache", "result"), (cache, result))} {value}')
+    return '\n'.join(lines) + '\n'
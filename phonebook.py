@@ -0,0 +1,276 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+from config import Config
+import metrics
+
+logger = logging.getLogger(__name__)
+
+_local = threading.local()
+
+CATEGORIES_QUERY = 'SELECT * FROM categories'
+
+CONTACTS_FROM = '''
+    FROM contacts c
+    JOIN categories cat ON c.category_id = cat.id
+'''
+
+CONTACTS_QUERY = '''
+    SELECT
+        c.*,
+        cat.name as category_name,
+        cat.display_name as category_display_name
+''' + CONTACTS_FROM
+
+# Fields a client may ask for with fields=, and the column each one reads
+CONTACT_FIELDS = {
+    'id': 'c.id',
+    'category_id': 'c.category_id',
+    'name': 'c.name',
+    'role': 'c.role',
+    'phone_number': 'c.phone_number',
+    'pager_number': 'c.pager_number',
+    'email': 'c.email',
+    'is_active': 'c.is_active',
+    'created_at': 'c.created_at',
+    'updated_at': 'c.updated_at',
+    'category_name': 'cat.name',
+    'category_display_name': 'cat.display_name',
+}
+
+# Delta sync cursors are "<updated_at>,<id>" of the last change sent (a bare
+# timestamp from an older client also works); anything else means a full sync
+SYNC_CURSOR_RE = re.compile(r'^(\d{4}-\d{2}-\d{2}(?: \d{2}:\d{2}:\d{2})?)(?:,(\d+))?$')
+
+# Contacts encoded per write when streaming JSON
+STREAM_CHUNK_ROWS = 100
+
+# bm25 column weights for contacts_fts: name, role, email, phone_number, pager_number, digits
+SEARCH_RANK = 'bm25(contacts_fts, 10.0, 4.0, 1.0, 2.0, 2.0, 2.0)'
+
+# Input made only of digits and phone punctuation is also looked up as a bare number
+PHONE_INPUT_RE = re.compile(r'^[\d\s\-().+]*\d[\d\s\-().+]*$')
+
+def _connect():
+    conn = sqlite3.connect(Config.DATABASE_PATH, cached_statements=Config.DATABASE_STATEMENT_CACHE)
+    conn.row_factory = sqlite3.Row
+    for pragma in Config.DATABASE_PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+@contextmanager
+def get_db_connection():
+    """Yield this thread's long-lived phonebook connection.
+
+    Each thread (and each forked worker) opens one tuned connection on first
+    use and keeps it, so the schema is parsed once and the fixed queries below
+    stay in the connection's statement cache.
+    """
+    conn = getattr(_local, 'conn', None)
+    if conn is None or _local.pid != os.getpid():
+        conn = _local.conn = _connect()
+        _local.pid = os.getpid()
+    try:
+        yield conn
+    finally:
+        if conn.in_transaction:
+            conn.rollback()
+
+@metrics.timed(metrics.sqlite_seconds, 'phonebook.list_categories')
+def list_categories(conn):
+    return [dict(row) for row in conn.execute(CATEGORIES_QUERY)]
+
+def fts_query(search):
+    """Turn a search box value into an FTS5 prefix query, or None if it has no terms.
+
+    Every word must match the start of some indexed token, so "dr smi" finds
+    "Dr. Smith". Phone-like input additionally matches the digits column, so
+    "6175550101" and "617-555-01" find 617-555-0101.
+    """
+    tokens = re.findall(r'\w+', search)
+    if not tokens:
+        return None
+    query = ' '.join(f'"{token}"*' for token in tokens)
+    if PHONE_INPUT_RE.match(search):
+        digits = re.sub(r'\D', '', search)
+        query = f'({query}) OR digits : "{digits}"*'
+    return query
+
+def parse_fields(value):
+    """Parse a comma-separated fields= value; raises ValueError on unknown names."""
+    fields = [field.strip() for field in value.split(',') if field.strip()]
+    unknown = [field for field in fields if field not in CONTACT_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    return fields
+
+def parse_page(limit, cursor, search=None):
+    """Parse the limit= and cursor= query values into (limit, after); raises ValueError.
+
+    Ranked searches return their best matches and cannot be paged, so a
+    cursor together with a search is an error rather than silently ignored.
+    """
+    try:
+        limit = int(limit) if limit is not None else None
+        after = int(cursor) if cursor is not None else None
+    except ValueError:
+        raise ValueError('limit and cursor must be integers')
+    if limit is not None and limit < 1:
+        raise ValueError('limit must be at least 1')
+    if after is not None and search:
+        raise ValueError('cursor cannot be combined with search; searches return their best matches')
+    return (min(limit, Config.CONTACTS_MAX_PAGE) if limit is not None else None), after
+
+def _contacts_select(fields, required=('id',)):
+    """SELECT ... FROM for the contacts queries, projected to ``fields`` if given."""
+    if not fields:
+        return CONTACTS_QUERY
+    columns = list(required) + [field for field in fields if field not in required]
+    return 'SELECT ' + ', '.join(f'{CONTACT_FIELDS[field]} AS {field}' for field in columns) + CONTACTS_FROM
+
+@metrics.timed(metrics.sqlite_seconds, 'phonebook.iter_contacts')
+def iter_contacts(conn, category=None, search=None, fields=None, limit=None, after=None):
+    """Active contacts, optionally limited to a category and ranked by a search.
+
+    The query runs immediately, so errors surface here, but rows are turned
+    into dicts lazily as the caller consumes them. Plain listings are ordered
+    by id and can be paged with ``limit`` and ``after`` (the last id seen);
+    ranked searches return their best ``limit`` matches and ignore ``after``.
+    """
+    select = _contacts_select(fields)
+    filters = ['c.is_active = 1']
+    params = []
+    if category and category != 'all':
+        filters.append('cat.name = ?')
+        params.append(category)
+    limit_sql = ' LIMIT ?' if limit is not None else ''
+    limit_params = [limit] if limit is not None else []
+
+    match = fts_query(search) if search else None
+    if match:
+        query = (select + ' JOIN contacts_fts ON contacts_fts.rowid = c.id'
+                 + ' WHERE ' + ' AND '.join(filters + ['contacts_fts MATCH ?'])
+                 + f' ORDER BY {SEARCH_RANK}, c.name' + limit_sql)
+        try:
+            rows = conn.execute(query, params + [match] + limit_params)
+            return (dict(row) for row in rows)
+        except sqlite3.OperationalError as e:
+            # Database built before the search index existed; see init_db.py
+            logger.warning("Full-text search unavailable, falling back to LIKE: %s", e)
+
+    if search:
+        filters.append('(c.name LIKE ? OR c.role LIKE ? OR c.phone_number LIKE ?)')
+        search_param = f'%{search}%'
+        params.extend([search_param, search_param, search_param])
+    if after is not None:
+        filters.append('c.id > ?')
+        params.append(after)
+
+    query = select + ' WHERE ' + ' AND '.join(filters) + ' ORDER BY c.id' + limit_sql
+    rows = conn.execute(query, params + limit_params)
+    return (dict(row) for row in rows)
+
+def search_contacts(conn, category=None, search=None, fields=None):
+    return list(iter_contacts(conn, category, search, fields))
+
+def stream_contacts_json(rows, limit=None, pageable=True):
+    """Encode contacts as JSON text chunks without building the whole list.
+
+    Without a limit the output is a plain JSON array. With one, ``rows``
+    should yield up to ``limit + 1`` contacts and the output is
+    ``{"contacts": [...], "next_cursor": id}``, where next_cursor is null on
+    the last page, and always for results that are not ``pageable`` (searches).
+    """
+    if limit is not None:
+        yield '{"contacts": '
+    yield '['
+    buffer = []
+    count = 0
+    last_id = None
+    has_more = False
+    for row in rows:
+        if limit is not None and count == limit:
+            has_more = True
+            break
+        buffer.append(json.dumps(row))
+        count += 1
+        last_id = row.get('id')
+        if len(buffer) == STREAM_CHUNK_ROWS:
+            yield (', ' if count > len(buffer) else '') + ', '.join(buffer)
+            buffer = []
+    if buffer:
+        yield (', ' if count > len(buffer) else '') + ', '.join(buffer)
+    yield ']'
+    if limit is not None:
+        yield f', "next_cursor": {json.dumps(last_id if has_more and pageable else None)}}}'
+
+@metrics.timed(metrics.sqlite_seconds, 'phonebook.contacts_changed_since')
+def contacts_changed_since(conn, since, fields=None):
+    """Delta sync: contacts changed and ids deleted after the ``since`` cursor.
+
+    Changes are ordered by (timestamp, id) and the cursor names the last one
+    sent, so each change goes out once. Rows are returned whether active or
+    not, so clients see deactivations. Timestamps have one-second resolution
+    and a later write in the current second may have a lower id, so the
+    cursor never moves into the current second; its changes are sent again
+    next time. Clients apply rows by id, so repeats are harmless.
+    """
+    # updated_at has NUMERIC affinity, so a number-like cursor such as "0"
+    # would compare as an integer; anything unrecognized syncs from scratch
+    match = SYNC_CURSOR_RE.match(since)
+    after = (match.group(1), int(match.group(2) or 0)) if match else ('', 0)
+    now, = conn.execute("SELECT datetime('now')").fetchone()
+    try:
+        deleted = conn.execute('''
+            SELECT deleted_at, id FROM contacts_deleted
+            WHERE (deleted_at, id) > (?, ?)
+        ''', after).fetchall()
+    except sqlite3.OperationalError:
+        deleted = []  # no tombstone table yet; see init_db.py
+
+    select = _contacts_select(fields, required=('id', 'is_active', 'updated_at'))
+    contacts = [dict(row) for row in conn.execute(
+        select + ' WHERE (c.updated_at, c.id) > (?, ?) ORDER BY c.updated_at, c.id', after)]
+
+    changes = [tuple(row) for row in deleted] + [(row['updated_at'], row['id']) for row in contacts]
+    cursor = max((change for change in changes if change[0] < now), default=after)
+    if fields and 'updated_at' not in fields:
+        for row in contacts:
+            del row['updated_at']
+    return {'cursor': f'{cursor[0]},{cursor[1]}' if cursor[0] else '',
+            'contacts': contacts, 'deleted': [id for _, id in deleted]}
+
+def _latest_change(conn):
+    """Timestamp of the newest insert, update or delete in the directory ('' if none)."""
+    try:
+        latest, = conn.execute('''
+            SELECT max(coalesce((SELECT max(updated_at) FROM contacts), ''),
+                       coalesce((SELECT max(deleted_at) FROM contacts_deleted), ''))
+        ''').fetchone()
+    except sqlite3.OperationalError:
+        # No tombstone table yet; see init_db.py
+        latest, = conn.execute("SELECT coalesce(max(updated_at), '') FROM contacts").fetchone()
+    return latest
+
+@metrics.timed(metrics.sqlite_seconds, 'phonebook.listing_etag')
+def listing_etag(conn, *query):
+    """Weak ETag value (unquoted) for a streamed listing, from the directory version and the query.
+
+    Streamed bodies cannot be hashed before the headers go out, so the tag
+    covers the newest change and the row count instead. Timestamps have
+    one-second resolution: while the newest change is from the current
+    second, another write in that second could leave the tag unchanged, so no
+    tag (None) is given until it has passed.
+    """
+    latest = _latest_change(conn)
+    count, now = conn.execute("SELECT count(*), datetime('now') FROM contacts").fetchone()
+    if latest >= now:
+        return None
+    version = json.dumps([latest, count, *query])
+    return hashlib.sha1(version.encode()).hexdigest()
@@ -0,0 +1,194 @@
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+
+try:
+    import redis
+except ImportError:  # Redis is optional; SQLite shares buckets across workers on one host
+    redis = None
+
+from config import Config
+import auth
+
+logger = logging.getLogger(__name__)
+
+PERIODS = {'second': 1, 'minute': 60, 'hour': 3600, 'day': 86400}
+
+_RATE_RE = re.compile(r'^\s*(\d+)\s*(?:per|/)\s*(second|minute|hour|day)s?\s*$', re.IGNORECASE)
+
+def parse_rate(rate):
+    """Parse a limit like "100 per minute" or "10/second" into (requests, seconds)."""
+    match = _RATE_RE.match(rate)
+    if not match:
+        raise ValueError(f'Invalid rate limit: {rate!r}')
+    return int(match.group(1)), PERIODS[match.group(2).lower()]
+
+def _refill(tokens, updated, now, capacity, rate):
+    return min(capacity, tokens + (now - updated) * rate)
+
+class MemoryBucketStore:
+    """Token buckets in this process only (memory://); fine for a single server.py."""
+
+    def __init__(self):
+        self._buckets = {}  # key -> (tokens, updated)
+        self._lock = threading.Lock()
+
+    def take(self, key, capacity, rate, now):
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (capacity, now))
+            tokens = _refill(tokens, updated, now, capacity, rate)
+            allowed = tokens >= 1
+            self._buckets[key] = (tokens - 1 if allowed else tokens, now)
+            if len(self._buckets) > Config.RATELIMIT_MAX_KEYS:
+                # Idle buckets are full again, so forgetting them changes nothing
+                cutoff = now - Config.RATELIMIT_IDLE_SECONDS
+                self._buckets = {k: v for k, v in self._buckets.items() if v[1] >= cutoff}
+        return allowed, tokens
+
+class SQLiteBucketStore:
+    """Token buckets in a SQLite file, shared by every gunicorn worker on the host."""
+
+    SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS rate_buckets (
+            key TEXT PRIMARY KEY,
+            tokens REAL NOT NULL,
+            updated REAL NOT NULL
+        ) WITHOUT ROWID
+    '''
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._calls = 0
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=1, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=OFF')  # losing a bucket on power loss is harmless
+            conn.execute(self.SCHEMA)
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def take(self, key, capacity, rate, now):
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute('SELECT tokens, updated FROM rate_buckets WHERE key = ?', (key,)).fetchone()
+            tokens = _refill(row[0], row[1], now, capacity, rate) if row else capacity
+            allowed = tokens >= 1
+            conn.execute('INSERT OR REPLACE INTO rate_buckets (key, tokens, updated) VALUES (?, ?, ?)',
+                         (key, tokens - 1 if allowed else tokens, now))
+            self._calls += 1
+            if self._calls % 1000 == 0:
+                conn.execute('DELETE FROM rate_buckets WHERE updated < ?', (now - Config.RATELIMIT_IDLE_SECONDS,))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return allowed, tokens
+
+class RedisBucketStore:
+    """Token buckets in Redis, for limits shared across hosts."""
+
+    SCRIPT = '''
+        local capacity, rate, now = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+        local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+        local tokens = capacity
+        if bucket[1] then
+            tokens = math.min(capacity, tonumber(bucket[1]) + (now - tonumber(bucket[2])) * rate)
+        end
+        local allowed = 0
+        if tokens >= 1 then
+            allowed = 1
+            tokens = tokens - 1
+        end
+        redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+        redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+        return {allowed, tostring(tokens)}
+    '''
+
+    def __init__(self, url):
+        self._script = redis.from_url(url).register_script(self.SCRIPT)
+
+    def take(self, key, capacity, rate, now):
+        allowed, tokens = self._script(keys=[f'ratelimit:{key}'], args=[capacity, rate, now])
+        allowed = bool(allowed)
+        tokens = float(tokens)
+        # The script reports what is left after the take; callers want what was there before
+        return allowed, tokens + 1 if allowed else tokens
+
+def open_store(url):
+    """Bucket store for RATELIMIT_STORAGE_URL: memory://, sqlite:///path or redis://host."""
+    if url.startswith('memory://'):
+        return MemoryBucketStore()
+    if url.startswith(('redis://', 'rediss://')):
+        if redis is None:
+            raise RuntimeError('RATELIMIT_STORAGE_URL points at Redis but the redis package is not installed')
+        return RedisBucketStore(url)
+    if url.startswith('sqlite:///'):
+        return SQLiteBucketStore(url[len('sqlite:///'):])
+    raise ValueError(f'Unsupported RATELIMIT_STORAGE_URL: {url}')
+
+class RateLimiter:
+    """Token-bucket limits per client and endpoint.
+
+    Each (client, endpoint) pair gets a bucket holding up to the endpoint's
+    request count, refilled evenly over its period, so short bursts pass but a
+    client looping on one endpoint is held to the average rate. If the store
+    fails, requests are let through rather than taking the app down with it.
+    """
+
+    def __init__(self, store, default, endpoint_limits):
+        self.store = store
+        self.default = parse_rate(default)
+        self.endpoint_limits = {path: parse_rate(rate) for path, rate in endpoint_limits.items()}
+
+    def check(self, client, endpoint):
+        """Take a token; returns (allowed, seconds until the next one is available)."""
+        capacity, period = self.endpoint_limits.get(endpoint, self.default)
+        rate = capacity / period
+        try:
+            allowed, tokens = self.store.take(f'{client}|{endpoint}', capacity, rate, time.time())
+        except Exception as e:
+            logger.error("Rate limit check failed, allowing request: %s", e)
+            return True, 0
+        if allowed:
+            return True, 0
+        return False, max(1, int((1 - tokens) / rate + 0.999))
+
+def client_address(remote_addr, headers):
+    """The address to limit on; behind nginx that is X-Real-IP, not the proxy."""
+    if Config.RATELIMIT_TRUST_PROXY:
+        forwarded = headers.get('X-Real-IP') or (headers.get('X-Forwarded-For') or '').split(',')[0].strip()
+        if forwarded:
+            return forwarded
+    return remote_addr or 'unknown'
+
+def identify(remote_addr, headers, route):
+    """The (client, endpoint) bucket a request counts against.
+
+    ``route`` is the matched route rather than the raw path, so made-up URLs
+    cannot create buckets. Requests with a valid session token count against
+    their session, not their address: behind a hospital NAT every user shares
+    one IP. A token refresh at /verify is not a password guess, so it gets the
+    default limit instead of /verify's.
+    """
+    session = auth.session_id(headers.get('Authorization'))
+    if session is None:
+        return client_address(remote_addr, headers), route
+    return f'session:{session}', f'{route}:refresh' if route == '/verify' else route
+
+def is_limited_path(path):
+    """Only API calls and logins cost anything worth limiting; static files are free."""
+    return path.startswith('/api/') or path in ('/verify', '/logout')
+
+limiter = None
+if Config.RATELIMIT_ENABLED:
+    limiter = RateLimiter(open_store(Config.RATELIMIT_STORAGE_URL), Config.RATELIMIT_DEFAULT, Config.RATELIMIT_ENDPOINTS)
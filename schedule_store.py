@@ -0,0 +1,108 @@
+import hashlib
+import os
+import sqlite3
+import threading
+
+from config import Config
+import metrics
+
+SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS schedule_revisions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        location TEXT NOT NULL,
+        schedule_date TEXT NOT NULL,
+        content_hash TEXT NOT NULL,
+        csv TEXT NOT NULL,
+        fetched_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+
+    CREATE INDEX IF NOT EXISTS idx_schedule_revisions_key
+    ON schedule_revisions (location, schedule_date, id);
+'''
+
+class ScheduleStore:
+    """SQLite copy of the Amion CSVs, one row per distinct revision.
+
+    Rows are keyed by Amion location and the date as requested from Amion. A
+    refresh only writes when the content hash differs from the latest revision,
+    so the table doubles as a history of schedule changes.
+    """
+
+    def __init__(self, path, max_hashes=Config.SCHEDULE_STORE_MAX_HASHES):
+        self.path = path
+        self.max_hashes = max_hashes
+        self._local = threading.local()
+        self._latest_hashes = {}  # (location, date) -> hash, oldest first
+        self._lock = threading.Lock()
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.executescript(SCHEMA)
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    @staticmethod
+    def _date(day, month, year):
+        return f'{int(year):04d}-{int(month):02d}-{int(day):02d}'
+
+    def latest(self, location, day, month, year):
+        """Return the most recent stored CSV for a location and date, or None."""
+        revision = self.latest_revision(location, day, month, year)
+        return revision[0] if revision else None
+
+    @metrics.timed(metrics.sqlite_seconds, 'schedule_store.latest_revision')
+    def latest_revision(self, location, day, month, year):
+        """Return ``(csv, fetched_at)`` for the most recent stored revision, or None."""
+        row = self._connection().execute('''
+            SELECT csv, fetched_at FROM schedule_revisions
+            WHERE location = ? AND schedule_date = ?
+            ORDER BY id DESC LIMIT 1
+        ''', (location, self._date(day, month, year))).fetchone()
+        return tuple(row) if row else None
+
+    @metrics.timed(metrics.sqlite_seconds, 'schedule_store.save')
+    def save(self, location, day, month, year, csv_text):
+        """Store a freshly fetched CSV; returns True if it was a new revision."""
+        key = (location, self._date(day, month, year))
+        content_hash = hashlib.sha256(csv_text.encode()).hexdigest()
+        with self._lock:
+            if self._latest_hashes.get(key) == content_hash:
+                return False
+
+        conn = self._connection()
+        with conn:
+            row = conn.execute('''
+                SELECT content_hash FROM schedule_revisions
+                WHERE location = ? AND schedule_date = ?
+                ORDER BY id DESC LIMIT 1
+            ''', key).fetchone()
+            changed = row is None or row[0] != content_hash
+            if changed:
+                conn.execute('''
+                    INSERT INTO schedule_revisions (location, schedule_date, content_hash, csv)
+                    VALUES (?, ?, ?, ?)
+                ''', (*key, content_hash, csv_text))
+
+        with self._lock:
+            self._latest_hashes.pop(key, None)
+            self._latest_hashes[key] = content_hash
+            while len(self._latest_hashes) > self.max_hashes:
+                del self._latest_hashes[next(iter(self._latest_hashes))]
+        return changed
+
+    @metrics.timed(metrics.sqlite_seconds, 'schedule_store.history')
+    def history(self, location, day, month, year):
+        """List the stored revisions for a location and date, newest first."""
+        rows = self._connection().execute('''
+            SELECT content_hash, fetched_at FROM schedule_revisions
+            WHERE location = ? AND schedule_date = ?
+            ORDER BY id DESC
+        ''', (location, self._date(day, month, year))).fetchall()
+        return [{'content_hash': content_hash, 'fetched_at': fetched_at} for content_hash, fetched_at in rows]
+
+schedule_store = ScheduleStore(Config.SCHEDULE_DB_PATH)
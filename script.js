@@ -17,13 +17,13 @@ async function loadAllSchedules() {
         }
 
         console.log('Loading all schedules for date:', currentDisplayDate);
-        const [teams, churchillAttendings, vascularAttendings, thoracicAttendings, cardiacAttendings] = await Promise.all([
-            fetchAmionData(currentDisplayDate),
-            fetchChurchillData(currentDisplayDate),
-            fetchVascularData(currentDisplayDate),
-            fetchThoracicData(currentDisplayDate),
-            fetchCardiacData(currentDisplayDate)
-        ]);
+        const {
+            teams,
+            churchill: churchillAttendings,
+            vascular: vascularAttendings,
+            thoracic: thoracicAttendings,
+            cardiac: cardiacAttendings
+        } = await fetchAllSchedules(currentDisplayDate);
 
         console.log('Loaded schedules:', {
             teams: teams ? 'present' : 'missing',
@@ -38,6 +38,7 @@ async function loadAllSchedules() {
         updateVascularAttendingDisplay(vascularAttendings);
         updateThoracicAttendingDisplay(thoracicAttendings);
         updateCardiacAttendingDisplay(cardiacAttendings);
+        watchScheduleChanges(currentDisplayDate);
     } catch (error) {
         console.error('Error loading schedules:', error);
         updateScheduleDisplay({});
@@ -124,6 +125,9 @@ document.addEventListener('DOMContentLoaded', function() {
     });
 });
 
+const SCHEDULE_NAVIGATION_DEBOUNCE_MS = 250;
+let scheduleNavigationTimer = null;
+
 function updateDate(offset) {
     const dateElement = document.querySelector('.date');
     if (!dateElement) return;
@@ -153,133 +157,243 @@ function updateDate(offset) {
         <div class="number">${monthDay}</div>
     `;
     
-    // Load all schedules
-    loadAllSchedules();
+    // Load schedules once the user stops clicking through days
+    clearTimeout(scheduleNavigationTimer);
+    scheduleNavigationTimer = setTimeout(loadAllSchedules, SCHEDULE_NAVIGATION_DEBOUNCE_MS);
+}
+
+// Days streamed ahead of time from /api/schedules/range, keyed by ISO date
+const scheduleDayCache = new Map();
+const SCHEDULE_DAY_CACHE_MS = 5 * 60 * 1000;
+const SCHEDULE_PREFETCH_DAYS = 6;
+const schedulePrefetching = new Set();
+
+function isoDate(date) {
+    const month = String(date.getMonth() + 1).padStart(2, '0');
+    const day = String(date.getDate()).padStart(2, '0');
+    return `${date.getFullYear()}-${month}-${day}`;
 }
 
-async function fetchAmionData(date) {
+function cachedScheduleDay(iso) {
+    const cached = scheduleDayCache.get(iso);
+    return cached && Date.now() - cached.storedAt < SCHEDULE_DAY_CACHE_MS ? cached.payload : null;
+}
+
+// Stream the days after `date` into scheduleDayCache; the server sends each day as soon as it is ready.
+// Only the first run of days that are neither cached nor already on their way is requested.
+async function prefetchScheduleDays(date, authToken) {
+    const missing = [];
+    for (let offset = 1; offset <= SCHEDULE_PREFETCH_DAYS; offset++) {
+        const day = new Date(date);
+        day.setDate(day.getDate() + offset);
+        const iso = isoDate(day);
+        if (!cachedScheduleDay(iso) && !schedulePrefetching.has(iso)) {
+            missing.push(iso);
+        } else if (missing.length) {
+            break;
+        }
+    }
+    if (missing.length === 0) {
+        return;
+    }
+    const start = missing[0];
+    const end = missing[missing.length - 1];
+    missing.forEach(iso => schedulePrefetching.add(iso));
+
     try {
-        // Format the date parameters
-        const day = date.getDate();
-        const month = date.getMonth() + 1;
-        const year = date.getFullYear() - 1; // Subtract 1 from year for Amion's URL format
-        
-        console.log(`Fetching schedule for ${month}/${day}/${year+1} (using year=${year} in URL)`);
-        const authToken = sessionStorage.getItem('authToken');
-        const response = await fetch(`/api/schedule?day=${day}&month=${month}&year=${year}`, {
+        const params = new URLSearchParams({ start, end });
+        const response = await fetch(`/api/schedules/range?${params}`, {
             headers: {
-                'Authorization': 'Basic ' + authToken
+                'Authorization': 'Bearer ' + authToken
             }
         });
-        const csvText = await response.text();
-        console.log('Received CSV data:', csvText);
-        return parseAmionCSV(csvText);
-    } catch (error) {
-        console.error('Error fetching Amion data:', error);
-        return null;
+        if (!response.ok || !response.body) {
+            return;
+        }
+
+        const reader = response.body.pipeThrough(new TextDecoderStream()).getReader();
+        let buffer = '';
+        for (;;) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffer += value;
+            const lines = buffer.split('\n');
+            buffer = lines.pop();
+            lines.filter(line => line.trim()).forEach(line => {
+                const payload = JSON.parse(line);
+                // Only keep complete days; a failed service is retried when the day is shown
+                if (Object.values(payload.services).every(result => result.status === 'ok')) {
+                    scheduleDayCache.set(payload.date, { payload, storedAt: Date.now() });
+                }
+            });
+        }
+    } finally {
+        missing.forEach(iso => schedulePrefetching.delete(iso));
     }
 }
 
-function parseAmionCSV(csvText) {
-    console.log('Starting CSV parsing');
-    const lines = csvText.split('\n');
-    const teams = {};
-    
-    // Skip header lines
-    const dataLines = lines.slice(5);
-    
-    dataLines.forEach((line, index) => {
-        if (!line.trim()) return;
-        
-        // Parse CSV line, handling quoted values correctly
-        const parts = line.match(/(".*?"|[^",\s]+)(?=\s*,|\s*$)/g);
-        if (!parts || parts.length < 9) return;
-        
-        const [name, , , role, , , date, startTime, endTime] = parts.map(p => p.replace(/"/g, '').trim());
-        
-        // Skip empty or header rows
-        if (!name || !role || role === 'Assignment name') return;
-        
-        const member = {
-            name,
-            role,
-            time: `${startTime}-${endTime}`
-        };
+// Live connection for the displayed date; the server pushes a diff when a schedule changes in Amion
+const SCHEDULE_WATCH_RETRY_MS = 5000;
+let scheduleWatch = null;
 
-        // Create team entry if it doesn't exist
-        if (!teams[role]) {
-            teams[role] = [];
-        }
-        teams[role].push(member);
-    });
-    
-    console.log('Parsed teams:', teams);
-    return teams;
+function watchScheduleChanges(date) {
+    const watchDate = isoDate(date);
+    if (scheduleWatch && scheduleWatch.date === watchDate) {
+        return;
+    }
+    if (scheduleWatch) {
+        scheduleWatch.controller.abort();
+    }
+    const controller = new AbortController();
+    scheduleWatch = { date: watchDate, controller };
+
+    readScheduleChanges(watchDate, controller.signal)
+        .then(() => null)
+        .catch(error => {
+            if (!controller.signal.aborted) {
+                console.warn('Schedule change stream ended:', error);
+            }
+            return error.pollSeconds || null;
+        })
+        .then(pollSeconds => {
+            if (scheduleWatch && scheduleWatch.controller === controller) {
+                scheduleWatch = null;
+            }
+            if (controller.signal.aborted) {
+                return;
+            }
+            // Reconnect while the same date is still on screen and the session is valid. When the
+            // server has no room for another stream, reload the day on its polling interval instead.
+            setTimeout(() => {
+                if (sessionStorage.getItem('authToken') && isoDate(currentDisplayDate) === watchDate) {
+                    if (pollSeconds) {
+                        scheduleDayCache.delete(watchDate);
+                        loadAllSchedules();
+                    } else {
+                        watchScheduleChanges(currentDisplayDate);
+                    }
+                }
+            }, pollSeconds ? pollSeconds * 1000 : SCHEDULE_WATCH_RETRY_MS);
+        });
 }
 
-async function fetchChurchillData(date) {
-    try {
-        const day = date.getDate();
-        const month = date.getMonth() + 1;
-        const year = date.getFullYear(); // Note: No year offset for Churchill URL
-        
-        console.log(`Fetching Churchill schedule for ${month}/${day}/${year}`);
-        const authToken = sessionStorage.getItem('authToken');
-        const response = await fetch(`/api/churchill?day=${day}&month=${month}&year=${year}`, {
-            headers: {
-                'Authorization': 'Basic ' + authToken
+// Read the Server-Sent Events stream; fetch rather than EventSource so the token stays in a header
+async function readScheduleChanges(watchDate, signal) {
+    const authToken = sessionStorage.getItem('authToken');
+    const response = await fetch(`/api/schedules/live?date=${watchDate}`, {
+        headers: {
+            'Authorization': 'Bearer ' + authToken
+        },
+        signal
+    });
+    if (response.status === 503) {
+        const busy = await response.json().catch(() => ({}));
+        const error = new Error('Live updates are busy; polling instead');
+        error.pollSeconds = busy.poll || null;
+        throw error;
+    }
+    if (!response.ok || !response.body) {
+        throw new Error(`HTTP error! status: ${response.status}`);
+    }
+
+    const reader = response.body.pipeThrough(new TextDecoderStream()).getReader();
+    let buffer = '';
+    for (;;) {
+        const { value, done } = await reader.read();
+        if (done) return;
+        buffer += value;
+        const events = buffer.split('\n\n');
+        buffer = events.pop();
+        events.forEach(block => {
+            const fields = {};
+            block.split('\n').forEach(line => {
+                const separator = line.indexOf(': ');
+                if (separator > 0) {
+                    fields[line.slice(0, separator)] = line.slice(separator + 2);
+                }
+            });
+            if (fields.event === 'change' && fields.data) {
+                applyScheduleChange(JSON.parse(fields.data));
             }
         });
-        const csvText = await response.text();
-        console.log('Received Churchill CSV data:', csvText);
-        return parseChurchillCSV(csvText);
-    } catch (error) {
-        console.error('Error fetching Churchill data:', error);
-        return null;
     }
 }
 
-function parseChurchillCSV(csvText) {
-    console.log('Starting Churchill CSV parsing');
-    const lines = csvText.split('\n');
-    const attendings = {
-        day: null,
-        night: null,
-        backup: null,
-        pancreatitis: null,
-        blueApp: []
-    };
-    
-    // Skip header lines
-    const dataLines = lines.slice(5);
-    
-    dataLines.forEach(line => {
-        if (!line.trim()) return;
-        
-        const parts = line.match(/(".*?"|[^",\s]+)(?=\s*,|\s*$)/g);
-        if (!parts || parts.length < 9) return;
-        
-        const [name, , , role, , , , startTime, endTime] = parts.map(p => p.replace(/"/g, '').trim());
-        
-        // Match roles to their respective positions
-        if (role === 'Churchill Day') {
-            attendings.day = name;
-        } else if (role === 'Churchill Night') {
-            attendings.night = name;
-        } else if (role === 'Backup') {
-            attendings.backup = name;
-        } else if (role === 'Pancreatitis') {
-            attendings.pancreatitis = name;
-        } else if (role.toLowerCase().includes('blue app')) {
-            attendings.blueApp.push({
-                name: name,
-                time: `${startTime}-${endTime}`
-            });
+// Patch the cached day with the pushed diff and redraw if it is the day on screen
+function applyScheduleChange(change) {
+    console.log(`Schedule changed: ${change.service} on ${change.date}`);
+    const cached = scheduleDayCache.get(change.date);
+    const result = cached && cached.payload.services[change.service];
+    if (result && result.status === 'ok') {
+        const data = { ...result.data, ...change.diff.set };
+        change.diff.removed.forEach(key => delete data[key]);
+        cached.payload.services[change.service] = { ...result, data };
+        cached.storedAt = Date.now();
+    } else {
+        scheduleDayCache.delete(change.date);
+    }
+    if (change.date === isoDate(currentDisplayDate)) {
+        loadAllSchedules();
+    }
+}
+
+// Fetch every service for a date in one request; each section degrades on its own
+async function fetchAllSchedules(date) {
+    const day = date.getDate();
+    const month = date.getMonth() + 1;
+    const year = date.getFullYear(); // Server applies Amion's year offset per service
+    const authToken = sessionStorage.getItem('authToken');
+
+    let payload = cachedScheduleDay(isoDate(date));
+    if (!payload) {
+        console.log(`Fetching all schedules for ${month}/${day}/${year}`);
+        const response = await fetch(`/api/schedules?day=${day}&month=${month}&year=${year}`, {
+            headers: {
+                'Authorization': 'Bearer ' + authToken
+            }
+        });
+
+        if (!response.ok) {
+            throw new Error(`HTTP error! status: ${response.status}`);
+        }
+
+        payload = await response.json();
+        if (Object.values(payload.services || {}).every(result => result.status === 'ok')) {
+            scheduleDayCache.set(isoDate(date), { payload, storedAt: Date.now() });
         }
+        // Load the rest of the week in the background so stepping through it is instant
+        prefetchScheduleDays(date, authToken).catch(error => console.warn('Schedule prefetch failed:', error));
+    }
+    const services = payload.services || {};
+
+    // The server sends each service already parsed into compact JSON
+    const serviceData = (service) => {
+        const result = services[service];
+        if (!result || result.status !== 'ok') {
+            console.error(`Error fetching ${service} schedule:`, result ? result.error : 'missing from response');
+            return null;
+        }
+        if (result.stale) {
+            console.warn(`Amion is unavailable; showing ${service} schedule stored at ${result.storedAt}`);
+        }
+        return result.data;
+    };
+
+    // Team members arrive grouped by role; restore the role on each member for display
+    const teams = {};
+    Object.entries(serviceData('schedule') || {}).forEach(([role, members]) => {
+        teams[role] = members.map(member => ({ ...member, role }));
     });
-    
-    console.log('Parsed Churchill attendings:', attendings);
-    return attendings;
+
+    const vascular = serviceData('vascular');
+    return {
+        teams,
+        churchill: serviceData('churchill'),
+        // Treat a vascular feed with nobody on call as unavailable
+        vascular: vascular && (vascular.attending || vascular.fellow) ? vascular : null,
+        thoracic: serviceData('thoracic'),
+        cardiac: serviceData('cardiac')
+    };
 }
 
 function updateChurchillAttendingDisplay(attendings) {
@@ -1030,69 +1144,6 @@ function updateSchedule(data) {
     // ... existing code ...
 }
 
-async function fetchVascularData(date) {
-    try {
-        const day = date.getDate();
-        const month = date.getMonth() + 1;
-        const year = date.getFullYear();
-        
-        const authToken = sessionStorage.getItem('authToken');
-        if (!authToken) return null;
-        
-        const response = await fetch(`/api/vascular?day=${day}&month=${month}&year=${year}`, {
-            headers: {
-                'Authorization': 'Basic ' + authToken
-            }
-        });
-        
-        if (!response.ok) {
-            throw new Error(`HTTP error! status: ${response.status}`);
-        }
-        
-        const csvText = await response.text();
-        if (!csvText || csvText.trim() === '') return null;
-        
-        const attendings = parseVascularCSV(csvText);
-        
-        // Validate the parsed data
-        if (!attendings || (!attendings.attending && !attendings.fellow)) return null;
-        
-        return attendings;
-    } catch (error) {
-        console.error('Error fetching Vascular data:', error);
-        return null;
-    }
-}
-
-function parseVascularCSV(csvText) {
-    const lines = csvText.split('\n');
-    const attendings = {
-        attending: null,
-        fellow: null
-    };
-    
-    // Skip header lines
-    const dataLines = lines.slice(5);
-    
-    dataLines.forEach(line => {
-        if (!line.trim()) return;
-        
-        const parts = line.match(/(".*?"|[^",\s]+)(?=\s*,|\s*$)/g);
-        if (!parts || parts.length < 4) return;
-        
-        const [name, , , role] = parts.map(p => p.replace(/"/g, '').trim());
-        
-        // Match roles to their respective positions
-        if (role === 'MGH Surgeon On-Call') {
-            attendings.attending = name;
-        } else if (role === 'MGH Fellow On-Call') {
-            attendings.fellow = name;
-        }
-    });
-    
-    return attendings;
-}
-
 function updateVascularAttendingDisplay(attendings) {
     const attendingElement = document.getElementById('vascular-attending');
     const fellowElement = document.getElementById('vascular-fellow');
@@ -1125,65 +1176,6 @@ function updateVascularAttendingDisplay(attendings) {
     }
 }
 
-async function fetchThoracicData(date) {
-    try {
-        const day = date.getDate();
-        const month = date.getMonth() + 1;
-        const year = date.getFullYear();
-        
-        const authToken = sessionStorage.getItem('authToken');
-        if (!authToken) return null;
-        
-        const response = await fetch(`/api/thoracic?day=${day}&month=${month}&year=${year}`, {
-            headers: {
-                'Authorization': 'Basic ' + authToken
-            }
-        });
-        
-        if (!response.ok) {
-            throw new Error(`HTTP error! status: ${response.status}`);
-        }
-        
-        const csvText = await response.text();
-        if (!csvText || csvText.trim() === '') return null;
-        
-        const attendings = parseThoracicCSV(csvText);
-        return attendings;
-    } catch (error) {
-        console.error('Error fetching Thoracic schedule:', error);
-        return null;
-    }
-}
-
-function parseThoracicCSV(csvText) {
-    const lines = csvText.split('\n');
-    const attendings = {
-        attending: null,
-        fellow: null
-    };
-    
-    // Skip header lines
-    const dataLines = lines.slice(5);
-    
-    dataLines.forEach(line => {
-        if (!line.trim()) return;
-        
-        const parts = line.match(/(\".*?\"|[^\",\s]+)(?=\s*,|\s*$)/g);
-        if (!parts || parts.length < 4) return;
-        
-        const [name, , , role] = parts.map(p => p.replace(/\"/g, '').trim());
-        
-        // Match roles to their respective positions
-        if (role === 'MGH & MD Connect') {
-            attendings.attending = name;
-        } else if (role === 'Fellow On Call (24 hr)') {
-            attendings.fellow = name;
-        }
-    });
-    
-    return attendings;
-}
-
 function updateThoracicAttendingDisplay(attendings) {
     const attendingElement = document.getElementById('thoracic-attending');
     const fellowElement = document.getElementById('thoracic-fellow');
@@ -1199,76 +1191,6 @@ function updateThoracicAttendingDisplay(attendings) {
     fellowElement.textContent = attendings.fellow || 'Not assigned';
 }
 
-async function fetchCardiacData(date) {
-    try {
-        const day = date.getDate();
-        const month = date.getMonth() + 1;
-        const year = date.getFullYear();
-        
-        const authToken = sessionStorage.getItem('authToken');
-        if (!authToken) return null;
-        
-        const response = await fetch(`/api/cardiac?day=${day}&month=${month}&year=${year}`, {
-            headers: {
-                'Authorization': 'Basic ' + authToken
-            }
-        });
-        
-        if (!response.ok) {
-            throw new Error(`HTTP error! status: ${response.status}`);
-        }
-        
-        const csvText = await response.text();
-        if (!csvText || csvText.trim() === '') return null;
-        
-        const attendings = parseCardiacCSV(csvText);
-        return attendings;
-    } catch (error) {
-        console.error('Error loading cardiac data:', error);
-        return null;
-    }
-}
-
-function parseCardiacCSV(csvText) {
-    const lines = csvText.split('\n');
-    const attendings = {
-        attending: null,
-        fellow: null
-    };
-    
-    console.log('Parsing cardiac CSV data:', csvText);
-    
-    // Skip header lines
-    const dataLines = lines.slice(5);
-    
-    // Log all roles we find
-    const allRoles = new Set();
-    
-    dataLines.forEach(line => {
-        if (!line.trim()) return;
-        
-        const parts = line.match(/(".*?"|[^",\s]+)(?=\s*,|\s*$)/g);
-        if (!parts || parts.length < 4) return;
-        
-        // Extract division and role
-        const [division, name, , , role] = parts.map(p => p.replace(/"/g, '').trim());
-        allRoles.add(role);
-        
-        // Match roles to their respective positions
-        if (division === 'Attendings' && role === 'General Cardiac Call') {
-            console.log('Found cardiac attending:', name, 'with role:', role);
-            attendings.attending = name;
-        } else if (division === 'Resident' && role === 'In House Fellow') {
-            console.log('Found cardiac fellow:', name, 'with role:', role);
-            attendings.fellow = name;
-        }
-    });
-    
-    console.log('All roles found in cardiac data:', Array.from(allRoles));
-    console.log('Parsed cardiac attendings:', attendings);
-    return attendings;
-}
-
 function updateCardiacAttendingDisplay(attendings) {
     // First ensure the main content is visible
     const mainContent = document.getElementById('main-content');
@@ -1524,13 +1446,78 @@ function initializePhoneDirectory() {
         searchTimeout = setTimeout(() => {
             const activeTab = document.querySelector('.tab-button.active');
             const category = activeTab ? activeTab.dataset.category || 'all' : 'all';
-            loadPhoneDirectory(category, e.target.value);
+            // Search runs against the local copy; no request per keystroke
+            loadPhoneDirectory(category, e.target.value, false);
         }, 300);
     });
 }
 
+// Only the fields the phone cards and filters use
+const PHONE_DIRECTORY_FIELDS = 'id,name,role,phone_number,pager_number,email,is_active,category_name,category_display_name';
+
+// Local copy of the phone directory, kept current with delta syncs
+const phoneDirectoryCache = {
+    contacts: new Map(),
+    cursor: null,
+    etag: null
+};
+
+// Pull contacts changed since the last sync and apply them to the local copy
+async function syncPhoneDirectory(authToken) {
+    const since = phoneDirectoryCache.cursor || '0';
+    const headers = {
+        'Authorization': 'Bearer ' + authToken
+    };
+    if (phoneDirectoryCache.etag) {
+        headers['If-None-Match'] = phoneDirectoryCache.etag;
+    }
+
+    const params = new URLSearchParams({ since, fields: PHONE_DIRECTORY_FIELDS });
+    const response = await fetch(`/api/phone/contacts?${params}`, { headers });
+    if (response.status === 304) {
+        return;
+    }
+    if (!response.ok) {
+        throw new Error(`HTTP error! status: ${response.status}`);
+    }
+
+    const changes = await response.json();
+    changes.contacts.forEach(contact => {
+        if (contact.is_active) {
+            phoneDirectoryCache.contacts.set(contact.id, contact);
+        } else {
+            phoneDirectoryCache.contacts.delete(contact.id);
+        }
+    });
+    changes.deleted.forEach(id => phoneDirectoryCache.contacts.delete(id));
+    phoneDirectoryCache.cursor = changes.cursor;
+    phoneDirectoryCache.etag = response.headers.get('ETag');
+    console.log('Phone directory synced:', changes.contacts.length, 'changed,', changes.deleted.length, 'deleted');
+}
+
+// Filter the local copy by category and search term without a round trip
+function filterPhoneContacts(category, searchTerm) {
+    const term = searchTerm.trim().toLowerCase();
+    const digits = term.replace(/\D/g, '');
+    const phoneLike = digits !== '' && /^[\d\s\-().+]+$/.test(term);
+
+    return Array.from(phoneDirectoryCache.contacts.values())
+        .filter(contact => {
+            if (category && category !== 'all' &&
+                (!contact.category_name || contact.category_name.toLowerCase() !== category.toLowerCase())) {
+                return false;
+            }
+            if (!term) return true;
+            const fields = [contact.name, contact.role, contact.email, contact.phone_number, contact.pager_number];
+            if (fields.some(value => value && value.toLowerCase().includes(term))) return true;
+            return phoneLike && [contact.phone_number, contact.pager_number]
+                .some(value => value && value.replace(/\D/g, '').includes(digits));
+        })
+        .sort((a, b) => a.id - b.id);
+}
+
 // Update loadPhoneDirectory function
-async function loadPhoneDirectory(category = 'all', searchTerm = '') {
+async function loadPhoneDirectory(category = 'all', searchTerm = '', sync = true) {
     console.log('Loading phone directory - Category:', category, 'Search:', searchTerm);
     
     try {
@@ -1540,32 +1527,12 @@ async function loadPhoneDirectory(category = 'all', searchTerm = '') {
             return;
         }
 
-        // Construct the API URL with query parameters
-        let url = '/api/phone/contacts';
-        const params = new URLSearchParams();
-        if (category && category !== 'all') {
-            params.append('category', category);
-        }
-        if (searchTerm) {
-            params.append('search', searchTerm);
-        }
-        if (params.toString()) {
-            url += '?' + params.toString();
-        }
-
-        console.log('Fetching contacts from:', url);
-        const response = await fetch(url, {
-            headers: {
-                'Authorization': 'Basic ' + authToken
-            }
-        });
-
-        if (!response.ok) {
-            throw new Error(`HTTP error! status: ${response.status}`);
+        if (sync || phoneDirectoryCache.cursor === null) {
+            await syncPhoneDirectory(authToken);
         }
 
-        const contacts = await response.json();
-        console.log('Received contacts:', contacts.length);
+        const contacts = filterPhoneContacts(category, searchTerm);
+        console.log('Filtered contacts:', contacts.length);
         updatePhoneGrids(contacts, category);
     } catch (error) {
         console.error('Error loading phone directory:', error);
@@ -1616,9 +1583,9 @@ async function login() {
         if (data.success) {
             document.getElementById('login-container').classList.add('hidden');
             document.getElementById('main-content').classList.remove('hidden');
-            // Store login state and password
+            // Store login state and the signed session token; the password is not kept
             sessionStorage.setItem('isLoggedIn', 'true');
-            sessionStorage.setItem('authToken', btoa(':' + password));
+            sessionStorage.setItem('authToken', data.token);
             // Load initial schedule after successful login
             loadAllSchedules();
             // Initialize phone directory after successful login
@@ -1647,6 +1614,41 @@ async function login() {
     }
 }
 
+// End the session on the server too, so the token stops working even if a copy of it survives
+async function logout() {
+    const authToken = sessionStorage.getItem('authToken');
+    sessionStorage.removeItem('isLoggedIn');
+    sessionStorage.removeItem('authToken');
+    if (scheduleWatch) {
+        scheduleWatch.controller.abort();
+        scheduleWatch = null;
+    }
+    scheduleDayCache.clear();
+    phoneDirectoryCache.contacts.clear();
+    phoneDirectoryCache.cursor = null;
+    phoneDirectoryCache.etag = null;
+
+    document.getElementById('main-content').classList.add('hidden');
+    document.getElementById('login-container').classList.remove('hidden');
+    const passwordInput = document.getElementById('password');
+    if (passwordInput) {
+        passwordInput.value = '';
+    }
+
+    if (authToken) {
+        try {
+            await fetch('/logout', {
+                method: 'POST',
+                headers: {
+                    'Authorization': 'Bearer ' + authToken
+                }
+            });
+        } catch (error) {
+            console.warn('Logout request failed:', error);
+        }
+    }
+}
+
 // Update the window.onload function
 window.onload = async function() {
     const loginContainer = document.getElementById('login-container');
@@ -1657,28 +1659,23 @@ window.onload = async function() {
     
     if (isLoggedIn && authToken) {
         // Verify the stored token
+        const showPortal = () => {
+            loginContainer.classList.add('hidden');
+            mainContent.classList.remove('hidden');
+            // Load initial schedule after verifying stored token
+            loadAllSchedules();
+            // Initialize phone directory after verifying token
+            initializePhoneDirectory();
+        };
         try {
             const response = await fetch('/verify', {
                 headers: {
-                    'Authorization': 'Basic ' + authToken
+                    'Authorization': 'Bearer ' + authToken
                 }
             });
             
-            if (!response.ok) {
-                throw new Error(`HTTP error! status: ${response.status}`);
-            }
-            
-            const data = await response.json();
-            
-            if (data.success) {
-                loginContainer.classList.add('hidden');
-                mainContent.classList.remove('hidden');
-                // Load initial schedule after verifying stored token
-                loadAllSchedules();
-                // Initialize phone directory after verifying token
-                initializePhoneDirectory();
-            } else {
-                // Token is invalid, clear storage and show login
+            if (response.status === 401) {
+                // Token is invalid or expired, clear storage and show login
                 sessionStorage.removeItem('isLoggedIn');
                 sessionStorage.removeItem('authToken');
                 loginContainer.classList.remove('hidden');
@@ -1687,22 +1684,25 @@ window.onload = async function() {
                     errorMessage.textContent = 'Session expired. Please log in again.';
                     errorMessage.classList.add('error');
                 }
+                return;
+            }
+
+            if (response.ok) {
+                const data = await response.json();
+                // Keep the refreshed token so the session slides forward
+                sessionStorage.setItem('authToken', data.token);
+            } else {
+                // Rate limited or a server error: the stored token may well still be good, so keep it
+                console.warn(`Token refresh failed with status ${response.status}; using the stored token`);
             }
+            showPortal();
         } catch (error) {
             console.error('Error verifying token:', error);
-            // Clear session storage
-            sessionStorage.removeItem('isLoggedIn');
-            sessionStorage.removeItem('authToken');
-            
+            // Network trouble says nothing about the session; keep it for the next page load
             loginContainer.classList.remove('hidden');
             mainContent.classList.add('hidden');
-            
             if (errorMessage) {
-                if (error.message === 'Failed to fetch') {
-                    errorMessage.textContent = 'Unable to connect to server. Please ensure the server is running and refresh the page.';
-                } else {
-                    errorMessage.textContent = 'Session expired. Please log in again.';
-                }
+                errorMessage.textContent = 'Unable to connect to server. Please ensure the server is running and refresh the page.';
                 errorMessage.classList.add('error');
             }
         }
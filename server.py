@@ -1,59 +1,271 @@
+import time
+STARTED = time.perf_counter()  # cold-start timings are measured from here, before the imports below
+
 from http.server import HTTPServer, SimpleHTTPRequestHandler
+from concurrent.futures import ThreadPoolExecutor
+import threading
 import json
-import urllib.request
 import csv
 from io import StringIO
-from datetime import datetime
+from datetime import date, datetime
+import errno
 import os
-import base64
-import sqlite3
-from contextlib import contextmanager
-from urllib.parse import urlparse, parse_qs
+import logging
+import posixpath
+import hashlib
+import signal
+import socket
+import socketserver
+import sys
+import zlib
+from urllib.parse import urlparse, parse_qs, parse_qsl, unquote
+from config import Config
+import amion
+import assets
+import auth
+import compression
+import live
+import logsetup
+import metrics
+import phonebook
+import ratelimit
+import upstream
+from schedule_store import schedule_store
+
+# Per-feed CSV endpoints, from the feed registry
+FEED_PATHS = {feed['path']: service for service, feed in amion.FEEDS.items()}
+
+# API paths that are answered by fetching from amion.com
+UPSTREAM_PATHS = set(FEED_PATHS) | {'/api/schedules', '/api/schedules/range'}
+
+# Routes reported individually in /metrics; everything else is grouped
+ROUTES = UPSTREAM_PATHS | {'/', '/verify', '/logout', '/metrics', '/healthz', '/ready',
+                           '/api/schedules/status', '/api/schedules/live',
+                           '/api/schedules/history', '/api/phone/categories', '/api/phone/contacts'}
+
+# More query parameters than any API endpoint takes is a malformed request
+MAX_QUERY_FIELDS = 32
+
+# Files served from the repo root, which also holds the code, logs and
+# databases; anything not listed here (or a built asset) is a 404
+PUBLIC_FILES = {'/', '/index.html', '/script.js', '/styles.css'}
+PUBLIC_DIRS = ('/images/',)
+
+logger = logging.getLogger('server')
+access_logger = logging.getLogger('access')
+
+def route_label(path):
+    path = path.rstrip('/') or '/'
+    if path in ROUTES:
+        return path
+    if path.startswith('/api/'):
+        return '/api/other'
+    return 'static'
+
+def is_public_path(url_path):
+    """Whether server.py may serve ``url_path`` from disk."""
+    if url_path in PUBLIC_FILES or assets.manifest.resolve(url_path) is not None:
+        return True
+    # Resolve ../ (and its %-encoded forms) before checking the directory
+    return (posixpath.normpath(unquote(url_path)).startswith(PUBLIC_DIRS)
+            and not url_path.endswith('/'))
+
+class PooledHTTPServer(HTTPServer):
+    """HTTPServer that hands each connection to a bounded pool of worker threads.
+
+    At most ``max_workers`` requests are handled at once and ``max_pending`` more
+    may wait for a worker; anything beyond that is answered with a 503 straight
+    from the accept loop. Upstream (Amion) requests additionally share a smaller
+    pool of ``upstream_workers`` slots so static files and phone lookups always
+    have a worker free. A handler can hand its connection off (see hand_off)
+    to keep it open after the request without holding a worker.
+
+    ``sock`` is an already listening socket to serve instead of binding
+    ``server_address`` (see inherited_socket). With ``reuse_port`` a new
+    process can bind the port while the old one is still draining.
+    """
+
+    def __init__(self, server_address, handler_class, max_workers, max_pending,
+                 upstream_workers, sock=None, reuse_port=False):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='http-worker')
+        self.slots = threading.BoundedSemaphore(max_workers + max_pending)
+        self.upstream_slots = threading.BoundedSemaphore(min(upstream_workers, max_workers))
+        self.prefetcher = None
+        self.handed_off = set()
+        self.reuse_port = reuse_port
+        self.ready = threading.Event()  # set once warm_up has run
+        self.draining = False
+        self.startup = {}  # startup step -> seconds, reported by /ready
+        self.active = 0  # requests accepted and not yet finished
+        self._idle = threading.Condition()
+        super().__init__(server_address, handler_class, bind_and_activate=sock is None)
+        if sock is not None:
+            self.socket.close()
+            self.socket = sock
+            self.server_address = sock.getsockname()
+            self.server_name, self.server_port = self.server_address[:2]
+
+    def server_bind(self):
+        if self.reuse_port and hasattr(socket, 'SO_REUSEPORT'):
+            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        # Not HTTPServer.server_bind: its getfqdn() lookup can stall startup on
+        # DNS, and nothing here uses server_name
+        socketserver.TCPServer.server_bind(self)
+        self.server_name, self.server_port = self.server_address[:2]
+
+    def is_ready(self):
+        return self.ready.is_set() and not self.draining
+
+    def hand_off(self, request):
+        """Leave ``request`` open when its handler returns; the new owner closes it."""
+        self.handed_off.add(request)
+
+    def process_request(self, request, client_address):
+        if not self.slots.acquire(blocking=False):
+            self.reject_request(request)
+            return
+        with self._idle:
+            self.active += 1
+        try:
+            self.executor.submit(self.process_request_worker, request, client_address)
+        except RuntimeError:  # executor already shut down
+            self._finished()
+            self.shutdown_request(request)
+
+    def process_request_worker(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            if request in self.handed_off:
+                self.handed_off.discard(request)
+            else:
+                self.shutdown_request(request)
+            self._finished()
 
-# Password for authentication
-PASSWORD = "mgh"
+    def _finished(self):
+        self.slots.release()
+        with self._idle:
+            self.active -= 1
+            if not self.active:
+                self._idle.notify_all()
+
+    def accept_pending(self):
+        """Take every connection already queued on the listening socket.
+
+        Called after serve_forever stops: closing the socket would otherwise
+        reset connections the kernel accepted on our behalf.
+        """
+        self.socket.setblocking(False)
+        while True:
+            try:
+                request, client_address = self.socket.accept()
+            except OSError:
+                return
+            self.process_request(request, client_address)
+
+    def drain(self, timeout):
+        """Wait up to ``timeout`` seconds for requests in progress; True if they all finished."""
+        with self._idle:
+            return self._idle.wait_for(lambda: not self.active, timeout)
+
+    def reject_request(self, request):
+        body = json.dumps({'error': 'Server busy'}).encode()
+        try:
+            request.sendall(
+                b'HTTP/1.0 503 Service Unavailable\r\n'
+                b'Content-Type: application/json\r\n'
+                b'Retry-After: 1\r\n'
+                b'Content-Length: ' + str(len(body)).encode() + b'\r\n\r\n' + body
+            )
+        except OSError:
+            pass
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        self.executor.shutdown(wait=False)
 
 class RequestHandler(SimpleHTTPRequestHandler):
+    # Drop idle or slow clients instead of letting them hold a worker
+    timeout = Config.SERVER_REQUEST_TIMEOUT
+
+    def send_response(self, code, message=None):
+        self.status_code = code
+        super().send_response(code, message)
+
+    def log_request(self, code='-', size='-'):
+        pass  # logged with its timing by handle_instrumented
+
     def log_message(self, format, *args):
-        # Override to provide minimal logging
+        logger.info("%s - %s", self.address_string(), format % args)
+
+    def handle_instrumented(self, handler):
+        """Run a request handler, recording its latency and writing the access log"""
+        start = time.perf_counter()
+        self.status_code = None
+        metrics.requests_in_flight.inc()
         try:
-            # Convert all args to strings
-            str_args = []
-            for arg in args:
-                if hasattr(arg, 'value'):  # HTTPStatus object
-                    str_args.append(str(arg.value))
-                elif hasattr(arg, 'startswith'):  # String
-                    str_args.append(str(arg))
-                else:  # Other types
-                    str_args.append(str(arg))
-            
-            # Format the message
-            try:
-                message = format % tuple(str_args)
-            except:
-                message = f"{format} {' '.join(str_args)}"
-            
-            # Log based on message content
-            if isinstance(message, str):
-                if 'GET /api/' in message:
-                    print(f"{self.address_string()} - API request: {message}")
-                elif 'GET /verify' in message:
-                    print(f"{self.address_string()} - Verify request")
-                else:
-                    print(f"{self.address_string()} - {message}")
-        except Exception as e:
-            # Fallback logging
-            print(f"{self.address_string()} - Error in logging: {e}")
+            handler()
+        finally:
+            metrics.requests_in_flight.dec()
+            duration = time.perf_counter() - start
+            route = route_label(urlparse(self.path).path)
+            status = self.status_code or 0
+            metrics.request_seconds.observe(duration, route, self.command, str(status))
+            access_logger.info(
+                '%s %s %s %.1fms', self.command, route, status, duration * 1000,
+                extra={'client': self.client_address[0], 'method': self.command, 'route': route,
+                       'status': status, 'duration_ms': round(duration * 1000, 1),
+                       'sample': status < 500 and duration < Config.LOG_SLOW_REQUEST},
+            )
 
     def do_GET(self):
+        self.handle_instrumented(self.route_get)
+
+    def do_POST(self):
+        self.handle_instrumented(self.route_post)
+
+    def route_get(self):
+        if ratelimit.is_limited_path(urlparse(self.path).path) and self.reject_if_rate_limited():
+            return
+
+        if self.path == '/metrics':
+            self.send_payload(metrics.render().encode(), 'text/plain; version=0.0.4; charset=utf-8')
+            return
+
+        # Liveness: the process is up and answering
+        if self.path == '/healthz':
+            self.send_payload(json.dumps({'status': 'ok'}).encode(), 'application/json',
+                              headers={'Cache-Control': 'no-store'})
+            return
+
+        # Readiness: caches and databases are warm and we are not shutting down
+        if self.path == '/ready':
+            ready = self.server.is_ready()
+            body = {'ready': ready, 'draining': self.server.draining,
+                    'startup': {step: round(seconds, 4) for step, seconds in self.server.startup.items()}}
+            headers = {'Cache-Control': 'no-store'}
+            if not ready:
+                headers['Retry-After'] = '1'
+            self.send_payload(json.dumps(body).encode(), 'application/json', status=200 if ready else 503,
+                              headers=headers)
+            return
+
         # Check if the request is for the login verification
         if self.path == '/verify':
+            # Exchange the password (or a still-valid token) for a fresh session token
             auth_header = self.headers.get('Authorization')
-            if auth_header and self.verify_password(auth_header):
-                self.send_response(200)
-                self.send_header('Content-type', 'application/json')
-                self.end_headers()
-                self.wfile.write(json.dumps({'success': True}).encode())
+            if auth.check_password(auth_header):
+                issued = auth.issue_token()
+            else:
+                issued = auth.refresh_token(auth.bearer_token(auth_header))  # a refresh keeps its session
+            if issued is not None:
+                token, expires = issued
+                self.send_payload(json.dumps({'success': True, 'token': token, 'expires': expires}).encode(),
+                                  'application/json', headers={'Cache-Control': 'no-store'})
                 return
             else:
                 self.send_response(401)
@@ -67,22 +279,42 @@ class RequestHandler(SimpleHTTPRequestHandler):
             self.handle_api_request()
             return
 
-        # For all other requests, serve static files
+        # For all other requests, serve static files, but only the public ones
+        if not is_public_path(urlparse(self.path).path):
+            self.send_error(404)
+            return
+        if self.send_static_asset():
+            return
         return SimpleHTTPRequestHandler.do_GET(self)
 
-    def verify_password(self, auth_header):
-        try:
-            encoded_credentials = auth_header.split(' ')[1]
-            decoded_credentials = base64.b64decode(encoded_credentials).decode('utf-8')
-            password = decoded_credentials.split(':')[1]
-            return password == PASSWORD
-        except:
+    def route_post(self):
+        if ratelimit.is_limited_path(urlparse(self.path).path) and self.reject_if_rate_limited():
+            return
+
+        if self.path == '/logout':
+            token = auth.bearer_token(self.headers.get('Authorization'))
+            if token:
+                auth.revoke_token(token)
+            self.send_payload(json.dumps({'success': True}).encode(), 'application/json')
+            return
+        self.send_error(405)
+
+    def reject_if_rate_limited(self):
+        """Answer 429 and return True if this client is over its limit for the endpoint"""
+        if ratelimit.limiter is None:
+            return False
+        client, endpoint = ratelimit.identify(self.client_address[0], self.headers,
+                                              route_label(urlparse(self.path).path))
+        allowed, retry_after = ratelimit.limiter.check(client, endpoint)
+        if allowed:
             return False
+        self.send_payload(json.dumps({'error': 'Too many requests'}).encode(), 'application/json', status=429,
+                          headers={'Retry-After': str(retry_after)})
+        return True
 
     def handle_api_request(self):
-        # Check authentication for all API requests
-        auth_header = self.headers.get('Authorization')
-        if not auth_header or not self.verify_password(auth_header):
+        # Check the session token on all API requests; no credentials are decoded here
+        if not auth.authenticate(self.headers.get('Authorization')):
             self.send_response(401)
             self.send_header('Content-type', 'application/json')
             self.end_headers()
@@ -90,160 +322,316 @@ class RequestHandler(SimpleHTTPRequestHandler):
             return
 
         # Extract date parameters from the request
-        if '?' in self.path:
-            base_path, params = self.path.split('?', 1)
-            params = dict(param.split('=') for param in params.split('&'))
-            day = params.get('day', datetime.now().strftime('%d'))
-            month = params.get('month', datetime.now().strftime('%m'))
-            year = params.get('year', datetime.now().strftime('%Y'))
-        else:
-            base_path = self.path
-            day = datetime.now().strftime('%d')
-            month = datetime.now().strftime('%m')
-            year = datetime.now().strftime('%Y')
+        base_path, _, query = self.path.partition('?')
+        try:
+            params = dict(parse_qsl(query, keep_blank_values=True, max_num_fields=MAX_QUERY_FIELDS))
+        except ValueError:
+            self.send_payload(json.dumps({'error': 'Malformed query string'}).encode(), 'application/json',
+                              status=400)
+            return
+        day = params.get('day', datetime.now().strftime('%d'))
+        month = params.get('month', datetime.now().strftime('%m'))
+        year = params.get('year', datetime.now().strftime('%Y'))
 
         # Clean up base path by removing trailing slashes
         base_path = base_path.rstrip('/')
 
-        if base_path == '/api/schedule':
-            self.handle_schedule_request(day, month, year)
-        elif base_path == '/api/churchill':
-            self.handle_churchill_request(day, month, year)
-        elif base_path == '/api/vascular':
-            self.handle_vascular_request(day, month, year)
-        elif base_path == '/api/thoracic':
-            self.handle_thoracic_request(day, month, year)
-        elif base_path == '/api/cardiac':
-            self.handle_cardiac_request(day, month, year)
+        if base_path in UPSTREAM_PATHS:
+            # Wait briefly for an upstream slot, then shed load rather than queue forever
+            if not self.server.upstream_slots.acquire(timeout=Config.SERVER_UPSTREAM_WAIT):
+                self.send_response(503)
+                self.send_header('Content-type', 'application/json')
+                self.send_header('Retry-After', '2')
+                self.end_headers()
+                self.wfile.write(json.dumps({'error': 'Schedule service busy'}).encode())
+                return
+            try:
+                self.dispatch_api_request(base_path, day, month, year)
+            finally:
+                self.server.upstream_slots.release()
+        else:
+            self.dispatch_api_request(base_path, day, month, year)
+
+    def dispatch_api_request(self, base_path, day, month, year):
+        if base_path == '/api/schedules':
+            self.handle_schedules_request(day, month, year)
+        elif base_path == '/api/schedules/status':
+            self.handle_schedules_status_request()
+        elif base_path == '/api/schedules/history':
+            self.handle_schedules_history_request(day, month, year)
+        elif base_path == '/api/schedules/range':
+            self.handle_schedules_range_request()
+        elif base_path == '/api/schedules/live':
+            self.handle_schedules_live_request()
+        elif base_path in FEED_PATHS:
+            self.handle_feed_request(FEED_PATHS[base_path], day, month, year)
         elif base_path == '/api/phone/categories':
             self.handle_phone_categories_request()
         elif base_path == '/api/phone/contacts':
             self.handle_phone_contacts_request()
         else:
-            print(f"404 Not Found for path: {base_path}")  # Add debug logging
+            logger.debug("404 Not Found for path: %s", base_path)
             self.send_response(404)
             self.send_header('Content-type', 'application/json')
             self.end_headers()
             self.wfile.write(json.dumps({'error': 'Not found'}).encode())
 
-    def handle_schedule_request(self, day, month, year):
-        try:
-            url = f'http://www.amion.com/cgi-bin/ocs?Lo=mghsurgery1811&Rpt=619&Day={day}&Month={month}&Year={year}'
-            with urllib.request.urlopen(url) as response:
-                data = response.read().decode('utf-8')
-                
-            self.send_response(200)
-            self.send_header('Content-type', 'text/csv')
+    def handle_schedules_request(self, day, month, year):
+        """Fetch several services for one calendar date in a single round trip"""
+        query_params = parse_qs(urlparse(self.path).query)
+        requested = query_params.get('services', [None])[0]
+        services = requested.split(',') if requested else list(amion.FEEDS)
+
+        unknown = [service for service in services if service not in amion.FEEDS]
+        if unknown:
+            self.send_response(400)
+            self.send_header('Content-type', 'application/json')
             self.end_headers()
-            self.wfile.write(data.encode())
-            
-        except Exception as e:
-            print(f"Error fetching schedule: {e}")
-            self.send_error(500)
+            self.wfile.write(json.dumps({'error': f"Unknown services: {', '.join(unknown)}"}).encode())
+            return
 
-    def handle_churchill_request(self, day, month, year):
         try:
-            url = f'http://www.amion.com/cgi-bin/ocs?Lo=Churchill&Rpt=619&Day={day}&Month={month}&Year={year}'
-            with urllib.request.urlopen(url) as response:
-                data = response.read().decode('utf-8')
-                
-            self.send_response(200)
-            self.send_header('Content-type', 'text/csv')
+            schedule_date = datetime(int(year), int(month), int(day)).strftime('%Y-%m-%d')
+        except ValueError:
+            self.send_response(400)
+            self.send_header('Content-type', 'application/json')
             self.end_headers()
-            self.wfile.write(data.encode())
-            
-        except Exception as e:
-            print(f"Error fetching Churchill schedule: {e}")
-            self.send_error(500)
+            self.wfile.write(json.dumps({'error': 'Invalid date'}).encode())
+            return
+
+        results = amion.fetch_feeds(services, day, month, year)
+        self.send_payload(json.dumps({'date': schedule_date, 'services': results}, separators=(',', ':')).encode(), 'application/json')
 
-    def handle_vascular_request(self, day, month, year):
+    def handle_schedules_range_request(self):
+        """Stream several services over a date range as NDJSON, one line per date as it completes"""
+        query_params = parse_qs(urlparse(self.path).query)
+        requested = query_params.get('services', [None])[0]
+        services = requested.split(',') if requested else list(amion.FEEDS)
+
+        unknown = [service for service in services if service not in amion.FEEDS]
         try:
-            url = f'http://www.amion.com/cgi-bin/ocs?Lo=VascOncall!&Rpt=619&Day={day}&Month={month}&Year={year}'
-            with urllib.request.urlopen(url) as response:
-                data = response.read().decode('utf-8')
-                
-            self.send_response(200)
-            self.send_header('Content-type', 'text/csv')
+            if unknown:
+                raise ValueError(f"Unknown services: {', '.join(unknown)}")
+            start, end = amion.parse_date_range(query_params.get('start', [None])[0],
+                                                query_params.get('end', [None])[0])
+        except ValueError as e:
+            self.send_response(400)
+            self.send_header('Content-type', 'application/json')
             self.end_headers()
-            self.wfile.write(data.encode())
-            
-        except Exception as e:
-            print(f"Error fetching Vascular schedule: {e}")
-            self.send_error(500)
+            self.wfile.write(json.dumps({'error': str(e)}).encode())
+            return
 
-    def handle_thoracic_request(self, day, month, year):
-        """Handle requests for thoracic schedule data"""
+        compressor = None
+        self.send_response(200)
+        self.send_header('Content-type', 'application/x-ndjson')
+        self.send_header('Cache-Control', 'no-store')
+        self.send_header('Vary', 'Accept-Encoding')
+        if 'gzip' in compression.accepted_encodings(self.headers.get('Accept-Encoding')):
+            compressor = compression.gzip_stream()
+            self.send_header('Content-Encoding', 'gzip')
+        self.end_headers()
+
+        days = amion.iter_feed_range(services, start, end)
         try:
-            # Construct the URL for the thoracic schedule
-            url = f'http://www.amion.com/cgi-bin/ocs?Lo=MGHThoracic&Rpt=619&Day={day}&Month={month}&Year={year}'
-            
-            print(f"Fetching data from: {url}")
-            with urllib.request.urlopen(url) as response:
-                csv_text = response.read().decode('utf-8')
-                print("Received CSV data:", csv_text.split('\n')[0])  # Print first line only
-                
-                self.send_response(200)
-                self.send_header('Content-type', 'text/csv')
-                self.end_headers()
-                self.wfile.write(csv_text.encode())
+            for day in days:
+                line = json.dumps(day, separators=(',', ':')).encode() + b'\n'
+                if compressor:
+                    # Sync flush so each day reaches the client now rather than when the buffer fills
+                    line = compressor.compress(line) + compressor.flush(zlib.Z_SYNC_FLUSH)
+                self.wfile.write(line)
+                self.wfile.flush()
+            if compressor:
+                self.wfile.write(compressor.flush())
         except Exception as e:
-            print(f"Error fetching thoracic schedule: {str(e)}")
-            self.send_response(500)
+            # Headers are already out; closing the connection truncates the response
+            logger.error("Error streaming schedule range: %s", e)
+        finally:
+            days.close()
+
+    def handle_schedules_live_request(self):
+        """Subscribe to changes in the schedules for some dates, as a Server-Sent Events stream
+
+        Once the headers are out the socket is handed to the live watcher, which
+        writes events to it directly, so an open stream does not hold a worker.
+        """
+        query_params = parse_qs(urlparse(self.path).query)
+        try:
+            keys = live.parse_watch(query_params.get('date', [None])[0], query_params.get('services', [None])[0])
+        except ValueError as e:
+            self.send_response(400)
             self.send_header('Content-type', 'application/json')
             self.end_headers()
             self.wfile.write(json.dumps({'error': str(e)}).encode())
+            return
+
+        watcher = live.get_watcher()
+        if watcher.subscriber_count() >= watcher.max_subscribers:
+            self.send_response(503)
+            self.send_header('Content-type', 'application/json')
+            self.send_header('Retry-After', live.BUSY_RETRY_AFTER)
+            self.end_headers()
+            self.wfile.write(json.dumps(live.BUSY).encode())
+            return
+
+        self.send_response(200)
+        self.send_header('Content-type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-store')
+        self.send_header('X-Accel-Buffering', 'no')
+        self.end_headers()
+        self.wfile.write(live.PREAMBLE)
+        self.wfile.flush()
+
+        self.close_connection = True
+        self.server.hand_off(self.request)
+        if not watcher.subscribe(live.SocketSubscriber(self.request), keys):
+            self.server.handed_off.discard(self.request)  # filled up meanwhile; close it as usual
+
+    def handle_schedules_status_request(self):
+        """Report when the prefetcher last refreshed each service and date, and each feed's breaker state"""
+        prefetcher = self.server.prefetcher
+        status = prefetcher.status() if prefetcher else {'last_run': None, 'dates': {}}
+        status['enabled'] = prefetcher is not None
+        status['feeds'] = amion.feed_health()
+        self.send_payload(json.dumps(status).encode(), 'application/json')
+
+    def handle_schedules_history_request(self, day, month, year):
+        """List the stored revisions of one service's schedule for a date"""
+        service = parse_qs(urlparse(self.path).query).get('service', [None])[0]
+        feed = amion.FEEDS.get(service)
+        if feed is None:
+            self.send_response(400)
+            self.send_header('Content-type', 'application/json')
+            self.end_headers()
+            self.wfile.write(json.dumps({'error': 'Unknown or missing service'}).encode())
+            return
 
-    def handle_cardiac_request(self, day, month, year):
         try:
-            # Don't subtract 1 from year for cardiac schedule
-            url = f'http://www.amion.com/cgi-bin/ocs?Lo=mghcs&Rpt=619&Day={day}&Month={month}&Year={year}'
-            print(f"Fetching cardiac data from: {url}")
-            
-            try:
-                response = urllib.request.urlopen(url)
-            except urllib.error.HTTPError as e:
-                print(f"HTTP Error fetching cardiac data: {e.code} - {e.reason}")
-                self.send_response(500)
-                self.send_header('Content-type', 'application/json')
-                self.end_headers()
-                self.wfile.write(json.dumps({'error': str(e)}).encode())
-                return
-            except urllib.error.URLError as e:
-                print(f"URL Error fetching cardiac data: {e.reason}")
-                self.send_response(500)
-                self.send_header('Content-type', 'application/json')
-                self.end_headers()
-                self.wfile.write(json.dumps({'error': str(e)}).encode())
-                return
-                
-            data = response.read().decode('utf-8')
-            print("Received cardiac CSV data:", data.split('\n')[0])  # Print first line only
-            
-            self.send_response(200)
-            self.send_header('Content-type', 'text/csv')
+            revisions = schedule_store.history(feed['location'], day, month, int(year) + feed['year_offset'])
+        except ValueError:
+            self.send_response(400)
+            self.send_header('Content-type', 'application/json')
             self.end_headers()
-            self.wfile.write(data.encode())
-            
+            self.wfile.write(json.dumps({'error': 'Invalid date'}).encode())
+            return
+
+        self.send_payload(json.dumps({'service': service, 'revisions': revisions}).encode(), 'application/json')
+
+    def handle_feed_request(self, service, day, month, year):
+        """Serve one feed's raw CSV; the year is passed to Amion as given"""
+        location = amion.FEEDS[service]['location']
+        try:
+            data = amion.get_schedule_csv(location, day, month, year)
+        except ValueError:
+            self.send_payload(json.dumps({'error': 'Invalid date'}).encode(), 'application/json', status=400)
+            return
+        except upstream.CircuitOpenError as e:
+            # Amion is down for this feed and nothing is stored: fail fast
+            self.send_payload(json.dumps({'error': f'{service} schedule is unavailable; try again later'}).encode(),
+                              'application/json', status=503, headers={'Retry-After': str(e.retry_after)})
+            return
+        except upstream.UpstreamBusyError:
+            self.send_payload(json.dumps({'error': 'Schedule service busy'}).encode(), 'application/json', status=503,
+                              headers={'Retry-After': '1'})
+            return
         except Exception as e:
-            print(f"Error in handle_cardiac_request: {str(e)}")
-            self.send_response(500)
-            self.send_header('Content-type', 'application/json')
+            logger.error("Error fetching %s schedule: %s", service, e)
+            self.send_payload(json.dumps({'error': f'Failed to fetch {service} schedule'}).encode(),
+                              'application/json', status=502)
+            return
+
+        headers = {}
+        if isinstance(data, amion.StaleCSV):
+            headers = {'Warning': '110 - "Response is Stale"', 'X-Stored-At': data.stored_at}
+        self.send_payload(data.encode(), 'text/csv', headers=headers)
+
+    def send_payload(self, body, content_type, status=200, headers=None):
+        """Send a complete response body, gzip-compressed when it is large and the client accepts it"""
+        headers = dict(headers or {})
+        if len(body) >= Config.COMPRESSION_MIN_SIZE:
+            headers['Vary'] = 'Accept-Encoding'
+            if 'gzip' in compression.accepted_encodings(self.headers.get('Accept-Encoding')):
+                body = compression.gzip_compress(body)
+                headers['Content-Encoding'] = 'gzip'
+                # Strong validators must differ between encodings of the same entity
+                if 'ETag' in headers:
+                    headers['ETag'] = headers['ETag'][:-1] + '-gzip"'
+        self.send_response(status)
+        self.send_header('Content-type', content_type)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_json_validated(self, data):
+        """Send JSON with a strong ETag, answering 304 if the client already has it"""
+        body = json.dumps(data).encode()
+        etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+        if compression.etag_matches(self.headers.get('If-None-Match'), etag):
+            self.send_response(304)
+            self.send_header('ETag', etag)
             self.end_headers()
-            self.wfile.write(json.dumps({'error': str(e)}).encode())
+            return
+
+        self.send_payload(body, 'application/json', headers={'ETag': etag, 'Cache-Control': 'private, no-cache'})
+
+    def send_static_asset(self):
+        """Serve a text asset from memory, precompressed and with validators.
+
+        Content-hashed files from build_assets.py are marked immutable.
+        Returns False for anything the in-memory cache does not handle, which
+        is then left to SimpleHTTPRequestHandler.
+        """
+        url_path = urlparse(self.path).path
+        path = assets.manifest.resolve(url_path)
+        immutable = path is not None
+        if path is None and url_path in ('/', '/index.html'):
+            path = assets.manifest.index_path()
+        if path is None:
+            path = self.translate_path(self.path)
+            if os.path.isdir(path):
+                if not url_path.endswith('/'):
+                    return False
+                path = os.path.join(path, 'index.html')
+        asset = compression.static_cache.get(path)
+        if asset is None:
+            return False
+
+        encoding = compression.choose_encoding(self.headers.get('Accept-Encoding'), asset.variants)
+        etag = asset.variant_etag(encoding)
+        if_none_match = self.headers.get('If-None-Match')
+        if if_none_match:
+            not_modified = compression.etag_matches(if_none_match, asset.etag)
+        else:
+            not_modified = compression.not_modified_since(self.headers.get('If-Modified-Since'), asset.mtime)
+        if not_modified:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Vary', 'Accept-Encoding')
+            self.end_headers()
+            return True
+
+        body = asset.variants[encoding]
+        self.send_response(200)
+        self.send_header('Content-type', asset.content_type)
+        self.send_header('Content-Length', str(len(body)))
+        if encoding != 'identity':
+            self.send_header('Content-Encoding', encoding)
+        self.send_header('Vary', 'Accept-Encoding')
+        self.send_header('ETag', etag)
+        self.send_header('Last-Modified', asset.last_modified)
+        self.send_header('Cache-Control', assets.IMMUTABLE_CACHE_CONTROL if immutable else 'no-cache')
+        self.end_headers()
+        self.wfile.write(body)
+        return True
 
     def handle_phone_categories_request(self):
         try:
-            with get_db_connection() as conn:
-                cursor = conn.cursor()
-                categories = cursor.execute('SELECT * FROM categories').fetchall()
-                self.send_response(200)
-                self.send_header('Content-type', 'application/json')
-                self.end_headers()
-                # Convert rows to dictionaries
-                categories_list = [dict(zip([col[0] for col in cursor.description], row)) for row in categories]
-                self.wfile.write(json.dumps(categories_list).encode())
+            with phonebook.get_db_connection() as conn:
+                categories_list = phonebook.list_categories(conn)
+            self.send_json_validated(categories_list)
         except Exception as e:
-            print(f"Error handling categories request: {str(e)}")
+            logger.exception("Error handling categories request: %s", e)
             self.send_response(500)
             self.send_header('Content-type', 'application/json')
             self.end_headers()
@@ -252,117 +640,207 @@ class RequestHandler(SimpleHTTPRequestHandler):
     def handle_phone_contacts_request(self):
         try:
             # Parse query parameters
-            from urllib.parse import urlparse, parse_qs
             parsed_url = urlparse(self.path)
             query_params = parse_qs(parsed_url.query)
             
             category = query_params.get('category', [None])[0]
             search = query_params.get('search', [None])[0]
-            
-            print(f"Phone contacts request - category: {category}, search: {search}")  # Debug log
-            
-            with get_db_connection() as conn:
-                cursor = conn.cursor()
-                
-                query = '''
-                    SELECT 
-                        c.*,
-                        cat.name as category_name,
-                        cat.display_name as category_display_name
-                    FROM contacts c
-                    JOIN categories cat ON c.category_id = cat.id
-                    WHERE c.is_active = 1
-                '''
-                params = []
-                
-                if category and category != 'all':
-                    query += ' AND cat.name = ?'
-                    params.append(category)
-                    
-                if search:
-                    query += ' AND (c.name LIKE ? OR c.role LIKE ? OR c.phone_number LIKE ?)'
-                    search_param = f'%{search}%'
-                    params.extend([search_param, search_param, search_param])
-                
-                print(f"Executing query: {query} with params: {params}")  # Debug log
-                
-                cursor.execute(query, params)
-                contacts = cursor.fetchall()
-                
-                # Convert rows to dictionaries
-                contacts_list = []
-                columns = [col[0] for col in cursor.description]
-                for row in contacts:
-                    contact_dict = dict(zip(columns, row))
-                    contacts_list.append(contact_dict)
-                
-                print(f"Found {len(contacts_list)} contacts")  # Debug log
-                
+            since = query_params.get('since', [None])[0]
+            try:
+                fields = phonebook.parse_fields(query_params.get('fields', [''])[0])
+                limit, after = phonebook.parse_page(query_params.get('limit', [None])[0],
+                                                    query_params.get('cursor', [None])[0], search)
+            except ValueError as e:
+                self.send_response(400)
+                self.send_header('Content-type', 'application/json')
+                self.end_headers()
+                self.wfile.write(json.dumps({'error': str(e)}).encode())
+                return
+
+            if since is not None:
+                # Delta sync: everything changed since the client's cursor, filters ignored
+                with phonebook.get_db_connection() as conn:
+                    changes = phonebook.contacts_changed_since(conn, since, fields)
+                logger.debug("Phone contacts delta since %s: %d changed", since, len(changes['contacts']))
+                self.send_json_validated(changes)
+                return
+
+            logger.debug("Phone contacts request - category: %s, search: %s", category, search)
+
+            with phonebook.get_db_connection() as conn:
+                etag = phonebook.listing_etag(conn, category, search, fields, limit, after)
+                if etag is not None and compression.etag_matches(self.headers.get('If-None-Match'), etag):
+                    self.send_response(304)
+                    self.send_header('ETag', f'W/"{etag}"')
+                    self.send_header('Vary', 'Accept-Encoding')
+                    self.end_headers()
+                    return
+                # Fetch one extra row when paging so we know whether a next page exists
+                rows = phonebook.iter_contacts(conn, category, search, fields,
+                                               limit=limit + 1 if limit is not None else None, after=after)
+                compressor = None
                 self.send_response(200)
                 self.send_header('Content-type', 'application/json')
+                self.send_header('Vary', 'Accept-Encoding')
+                self.send_header('Cache-Control', 'private, no-cache')
+                if etag is not None:
+                    self.send_header('ETag', f'W/"{etag}"')
+                if 'gzip' in compression.accepted_encodings(self.headers.get('Accept-Encoding')):
+                    compressor = compression.gzip_stream()
+                    self.send_header('Content-Encoding', 'gzip')
                 self.end_headers()
-                self.wfile.write(json.dumps(contacts_list).encode())
-                
+                # Stream rows straight from the cursor instead of building the whole list
+                try:
+                    for chunk in phonebook.stream_contacts_json(rows, limit, pageable=not search):
+                        data = chunk.encode()
+                        data = compressor.compress(data) if compressor else data
+                        if data:
+                            self.wfile.write(data)
+                    if compressor:
+                        self.wfile.write(compressor.flush())
+                except Exception as e:
+                    # Headers are already out; closing the connection truncates the response
+                    logger.error("Error streaming contacts: %s", e)
+
         except Exception as e:
-            print(f"Error handling contacts request: {str(e)}")
-            print("Detailed error information:")
-            import traceback
-            traceback.print_exc()
+            logger.exception("Error handling contacts request: %s", e)
             self.send_response(500)
             self.send_header('Content-type', 'application/json')
             self.end_headers()
             self.wfile.write(json.dumps({'error': str(e)}).encode())
 
+def inherited_socket():
+    """The listening socket passed in by systemd socket activation, or None.
+
+    With a .socket unit the port stays bound across restarts, so connections
+    wait in the kernel's queue while the new process starts instead of being
+    refused.
+    """
+    if os.environ.get('LISTEN_PID') != str(os.getpid()) or int(os.environ.get('LISTEN_FDS', 0)) < 1:
+        return None
+    return socket.socket(fileno=3)  # SD_LISTEN_FDS_START
+
+def _warm_phonebook():
+    with phonebook.get_db_connection() as conn:
+        phonebook.list_categories(conn)
+        # One search reads the full-text index into the page cache
+        for _ in phonebook.iter_contacts(conn, search='a', limit=1):
+            pass
+
+def _warm_static_assets():
+    paths = assets.manifest.hashed_paths()
+    index = assets.manifest.index_path()
+    if index is None:
+        paths = [os.path.join(os.getcwd(), name) for name in ('index.html', 'script.js', 'styles.css')]
+    else:
+        paths.append(index)
+    for path in paths:
+        compression.static_cache.get(path)  # reads and precompresses the file
+
+def _warm_schedules():
+    today = date.today()
+    amion.fetch_feeds(list(amion.FEEDS), today.day, today.month, today.year)
+
+def warm_up():
+    """Open the databases and fill the caches a first page visit needs.
+
+    Returns the seconds each step took. Steps are best effort: one that fails
+    is logged and the server becomes ready anyway, since requests redo the
+    same work on demand.
+    """
+    steps = [('phonebook', _warm_phonebook), ('static', _warm_static_assets)]
+    if Config.SERVER_WARM_SCHEDULES:
+        steps.append(('schedules', _warm_schedules))
+    timings = {}
+    for name, step in steps:
+        start = time.perf_counter()
+        try:
+            step()
+        except Exception as e:
+            logger.warning("Warm-up step %s failed: %s", name, e)
+        timings[name] = time.perf_counter() - start
+    return timings
+
+def _record_startup(httpd, step, seconds):
+    httpd.startup[step] = seconds
+    metrics.startup_seconds.set(seconds, step)
+
+def start_warm_up(httpd):
+    """Warm up in the background and mark the server ready when done; requests are served meanwhile."""
+    def run():
+        for step, seconds in warm_up().items():
+            _record_startup(httpd, 'warm_' + step, seconds)
+        _record_startup(httpd, 'ready', time.perf_counter() - STARTED)
+        httpd.ready.set()
+        logger.info("Ready %.2fs after start (%s)", httpd.startup['ready'],
+                    ', '.join(f'{step} {seconds:.2f}s' for step, seconds in httpd.startup.items() if step != 'ready'))
+    threading.Thread(target=run, name='warm-up', daemon=True).start()
+
+def stop_on_signal(httpd):
+    """Begin a graceful shutdown on SIGTERM or SIGINT: /ready turns 503 and the accept loop stops."""
+    def handle(signum, frame):
+        if httpd.draining:
+            return
+        logger.info("Received %s, draining", signal.Signals(signum).name)
+        httpd.draining = True
+        # shutdown() waits for serve_forever, which is running in this (the main) thread
+        threading.Thread(target=httpd.shutdown, name='shutdown', daemon=True).start()
+    signal.signal(signal.SIGTERM, handle)
+    signal.signal(signal.SIGINT, handle)
+
 def run_server():
-    port = 8000
-    server_address = ('', port)
-    
+    logsetup.configure_logging()
+    port = Config.SERVER_PORT
+    imported = time.perf_counter() - STARTED
+
     try:
-        # Check if port is already in use
-        import socket
-        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        result = sock.connect_ex(('127.0.0.1', port))
-        if result == 0:
-            print(f"Error: Port {port} is already in use.")
-            print("Attempting to kill existing process...")
-            import os
-            os.system('pkill -f "python3 server.py"')
-            print("Waiting for port to be released...")
-            import time
-            time.sleep(2)
-        sock.close()
-        
-        # Start server
-        print(f"Starting server on port {port}...")
-        httpd = HTTPServer(server_address, RequestHandler)
-        print(f"Server is running at http://localhost:{port}")
-        httpd.serve_forever()
-    except Exception as e:
-        print(f"Error starting server: {str(e)}")
-        print("Detailed error information:")
-        import traceback
-        traceback.print_exc()
-        
-        if isinstance(e, OSError):
-            if e.errno == 48:  # Address already in use
-                print(f"\nPort {port} is already in use.")
-                print("Try one of the following:")
-                print("1. Close any other running instances of the server")
-                print("2. Wait a few seconds and try again")
-                print("3. Change the port number in the code")
-            elif e.errno == 13:  # Permission denied
-                print("\nPermission denied when trying to bind to port.")
-                print("Try running with sudo or choose a port number above 1024")
-        return
-
-@contextmanager
-def get_db_connection():
-    conn = sqlite3.connect('data/phonebook.db')
-    conn.row_factory = sqlite3.Row
+        sock = inherited_socket()
+        httpd = PooledHTTPServer(
+            ('', port), RequestHandler,
+            max_workers=Config.SERVER_MAX_WORKERS,
+            max_pending=Config.SERVER_MAX_PENDING,
+            upstream_workers=Config.SERVER_UPSTREAM_WORKERS,
+            sock=sock,
+            reuse_port=Config.SERVER_REUSE_PORT,
+        )
+    except OSError as e:
+        if e.errno == errno.EADDRINUSE:
+            logger.error("Port %d is already in use; stop the other server, or set SERVER_REUSE_PORT=true "
+                         "in both to run them side by side during a restart", port)
+        elif e.errno == errno.EACCES:
+            logger.error("Permission denied binding port %d; choose a port above 1024", port)
+        else:
+            logger.exception("Error starting server: %s", e)
+        return 1
+
+    _record_startup(httpd, 'imports', imported)
+    _record_startup(httpd, 'bind', time.perf_counter() - STARTED - imported)
+    stop_on_signal(httpd)
+    httpd.prefetcher = amion.start_prefetcher()
+    start_warm_up(httpd)
+    logger.info("Server is running at http://localhost:%d%s (%d workers, %d upstream)", httpd.server_port,
+                ' on an inherited socket' if sock is not None else '',
+                Config.SERVER_MAX_WORKERS, Config.SERVER_UPSTREAM_WORKERS)
     try:
-        yield conn
+        httpd.serve_forever()
+        # Stopped by a signal: finish what was already accepted, then exit
+        httpd.accept_pending()
+        httpd.socket.close()
+        live.close_subscribers()
+        if httpd.prefetcher is not None:
+            httpd.prefetcher.stop()
+        drained = httpd.drain(Config.SERVER_DRAIN_TIMEOUT)
+        if drained:
+            logger.info("Drained, exiting")
+        else:
+            logger.warning("%d requests still running after %.0fs, exiting anyway",
+                           httpd.active, Config.SERVER_DRAIN_TIMEOUT)
     finally:
-        conn.close()
+        httpd.server_close()
+    # A normal interpreter exit joins every executor thread, including
+    # requests and Amion fetches still running, which would undo the bound
+    logsetup.stop_logging()
+    os._exit(0 if drained else 1)
 
 if __name__ == '__main__':
-    run_server() 
\ No newline at end of file
+    sys.exit(run_server())
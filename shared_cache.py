@@ -0,0 +1,113 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+class SharedCache:
+    """Key/value entries with expiry in a local SQLite file, shared by every worker on the host.
+
+    Sits behind each worker's in-memory cache, so whichever gunicorn worker
+    fetches something first saves the others the trip. Values must be
+    JSON-serializable. Errors are logged and treated as misses: this is only
+    ever a cache.
+    """
+
+    SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS cache_entries (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL,
+            expires REAL NOT NULL
+        ) WITHOUT ROWID
+    '''
+
+    def __init__(self, path, max_entries):
+        self.path = path
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._writes = 0
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=1, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=OFF')  # losing the cache on power loss is harmless
+            conn.execute(self.SCHEMA)
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, key):
+        """Return ``(value, seconds left)`` for an unexpired entry, or None."""
+        now = time.time()
+        try:
+            row = self._connection().execute(
+                'SELECT value, expires FROM cache_entries WHERE key = ? AND expires > ?', (key, now)).fetchone()
+        except sqlite3.Error as e:
+            logger.warning("Shared cache read failed for %s: %s", key, e)
+            return None
+        if row is None:
+            return None
+        return json.loads(row[0]), row[1] - now
+
+    def set(self, key, value, ttl):
+        now = time.time()
+        try:
+            conn = self._connection()
+            conn.execute('INSERT OR REPLACE INTO cache_entries (key, value, expires) VALUES (?, ?, ?)',
+                         (key, json.dumps(value), now + ttl))
+            self._writes += 1
+            if self._writes % 100 == 0:
+                self._prune(conn, now)
+        except sqlite3.Error as e:
+            logger.warning("Shared cache write failed for %s: %s", key, e)
+
+    def claim(self, key, owner, ttl):
+        """Take or renew a lease on ``key`` for ``owner``, lasting ``ttl`` seconds.
+
+        Returns whether ``owner`` holds it afterwards: a lease can be taken when
+        nobody holds it, its holder let it expire, or it is already ours. Errors
+        report True, so a broken cache means duplicated work rather than none.
+        """
+        now = time.time()
+        value = json.dumps(owner)
+        try:
+            conn = self._connection()
+            conn.execute('''
+                INSERT INTO cache_entries (key, value, expires) VALUES (?, ?, ?)
+                ON CONFLICT (key) DO UPDATE SET value = excluded.value, expires = excluded.expires
+                WHERE cache_entries.expires <= ? OR cache_entries.value = excluded.value
+            ''', (key, value, now + ttl, now))
+            row = conn.execute('SELECT value FROM cache_entries WHERE key = ?', (key,)).fetchone()
+        except sqlite3.Error as e:
+            logger.warning("Shared cache lease failed for %s: %s", key, e)
+            return True
+        return row is not None and row[0] == value
+
+    def release(self, key, owner):
+        """Give up a lease taken with claim, if ``owner`` still holds it."""
+        try:
+            self._connection().execute('DELETE FROM cache_entries WHERE key = ? AND value = ?',
+                                       (key, json.dumps(owner)))
+        except sqlite3.Error as e:
+            logger.warning("Shared cache release failed for %s: %s", key, e)
+
+    def _prune(self, conn, now):
+        conn.execute('DELETE FROM cache_entries WHERE expires <= ?', (now,))
+        # Still too big: drop the entries closest to expiring
+        conn.execute('''
+            DELETE FROM cache_entries WHERE key IN (
+                SELECT key FROM cache_entries ORDER BY expires DESC LIMIT -1 OFFSET ?
+            )
+        ''', (self.max_entries,))
+
+shared_cache = None
+if Config.SHARED_CACHE_PATH:
+    shared_cache = SharedCache(Config.SHARED_CACHE_PATH, Config.SHARED_CACHE_MAX_ENTRIES)
@@ -0,0 +1,62 @@
+import os
+import shutil
+import subprocess
+import tempfile
+import unittest
+
+import build_assets
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def read(name):
+    with open(os.path.join(ROOT, name), encoding='utf-8') as f:
+        return f.read()
+
+class MinifyJsTest(unittest.TestCase):
+    def test_division_and_regex(self):
+        cases = {
+            'a = b / c / d;': 'a=b/c/d;\n',
+            'y = (a + b) / 2;': 'y=(a+b)/2;\n',
+            'z = arr[0] / 2;': 'z=arr[0]/2;\n',
+            'i++ / 2': 'i++/2\n',
+            'x = a-- / b': 'x=a--/b\n',
+            'x = /ab+c/g.test(y);': 'x=/ab+c/g.test(y);\n',
+            'if (/^\\d+$/.test(v)) {}': 'if(/^\\d+$/.test(v)){}\n',
+            'function f() { return /[/]x\\//.test(s) }': 'function f(){return/[/]x\\//.test(s)}\n',
+            'x = y + /r/.source': 'x=y+/r/.source\n',
+        }
+        for source, expected in cases.items():
+            with self.subTest(source=source):
+                self.assertEqual(build_assets.minify_js(source), expected)
+
+    def test_keeps_strings_templates_and_statement_breaks(self):
+        self.assertEqual(build_assets.minify_js('const s = "a  // b";'), 'const s="a  // b";\n')
+        self.assertEqual(build_assets.minify_js('const t = `a ${b / 2} c`;'), 'const t=`a ${b / 2} c`;\n')
+        self.assertEqual(build_assets.minify_js('a\n++b'), 'a\n++b\n')
+        self.assertEqual(build_assets.minify_js('return\nx'), 'return\nx\n')
+        self.assertEqual(build_assets.minify_js('a + +b'), 'a+ +b\n')
+
+    def test_script_js_round_trip(self):
+        minified = build_assets.minify_js(read('script.js'))
+        self.assertEqual(build_assets.minify_js(minified), minified)
+        if shutil.which('node') is None:
+            self.skipTest('node is not installed')
+        with tempfile.NamedTemporaryFile('w', suffix='.js', delete=False) as f:
+            f.write(minified)
+        try:
+            result = subprocess.run(['node', '--check', f.name], capture_output=True, text=True)
+        finally:
+            os.remove(f.name)
+        self.assertEqual(result.returncode, 0, result.stderr)
+
+class MinifyCssTest(unittest.TestCase):
+    def test_strips_comments_and_space_but_not_strings(self):
+        css = '/* x */ a , b { content: "a  ;  b" ; color: red ; }\n'
+        self.assertEqual(build_assets.minify_css(css), 'a,b{content:"a  ;  b";color:red}\n')
+
+    def test_styles_css_is_stable(self):
+        minified = build_assets.minify_css(read('styles.css'))
+        self.assertEqual(build_assets.minify_css(minified), minified)
+
+if __name__ == '__main__':
+    unittest.main()
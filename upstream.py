@@ -0,0 +1,241 @@
+import http.client
+import logging
+import queue
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# Statuses worth retrying; anything else outside 2xx fails immediately
+RETRY_STATUSES = {500, 502, 503, 504}
+
+class UpstreamError(Exception):
+    """An upstream request failed; ``status`` is set when the server answered."""
+
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+class UpstreamBusyError(UpstreamError):
+    """Raised without calling upstream when too many requests are already in flight."""
+
+    def __init__(self, message):
+        super().__init__(message, 503)
+
+class UpstreamTooLargeError(UpstreamError):
+    """The response was over the size limit; fetching it again would not help."""
+
+class CircuitOpenError(UpstreamError):
+    """Raised without calling upstream while a circuit breaker is open."""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message, 503)
+        self.retry_after = retry_after
+
+class CircuitBreaker:
+    """Stop calling a failing upstream for a while instead of waiting on every request.
+
+    After ``failure_threshold`` consecutive failures the breaker opens and
+    ``call`` raises CircuitOpenError immediately. Once ``reset_timeout`` has
+    passed a single trial call is let through (half-open): success closes the
+    breaker, failure opens it again.
+    """
+
+    def __init__(self, name, failure_threshold, reset_timeout):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return 'half-open'
+        return 'open'
+
+    def call(self, fn):
+        trial = False
+        with self._lock:
+            if self.opened_at is not None:
+                remaining = self.opened_at + self.reset_timeout - time.monotonic()
+                if remaining > 0 or self._trial_running:
+                    raise CircuitOpenError(f'{self.name} is unavailable; not retrying for now',
+                                           max(1, int(remaining + 0.999)))
+                self._trial_running = trial = True
+
+        try:
+            result = fn()
+        except UpstreamBusyError:
+            # Shed locally; says nothing about upstream's health
+            raise
+        except UpstreamTooLargeError:
+            # Upstream answered, just with more than we accept
+            self._record_success()
+            raise
+        except UpstreamError as e:
+            # Client errors (4xx) mean upstream is up; only failures to answer count
+            if e.status is None or e.status >= 500:
+                self._record_failure()
+            else:
+                self._record_success()
+            raise
+        finally:
+            # Whatever ended the trial (including unexpected errors), let the next one through
+            if trial:
+                with self._lock:
+                    self._trial_running = False
+        self._record_success()
+        return result
+
+    def _record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_running = False
+
+    def _record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_running = False
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                if self.opened_at is None:
+                    logger.warning("Circuit breaker for %s opened after %d failures", self.name, self.failures)
+                self.opened_at = time.monotonic()
+
+class UpstreamClient:
+    """Keep-alive HTTP client with a small connection pool per origin.
+
+    Connections are opened with ``connect_timeout`` and then switched to
+    ``read_timeout`` for the exchange. Failed requests (network errors and 5xx
+    responses) are retried up to ``retries`` times with jittered exponential
+    backoff, and bodies larger than ``max_bytes`` are refused. At most
+    ``max_concurrent`` requests are in flight at once; a caller that cannot get
+    a slot within ``admission_wait`` seconds gets UpstreamBusyError.
+    """
+
+    def __init__(self, connect_timeout, read_timeout, retries, backoff, max_bytes, pool_size,
+                 max_concurrent, admission_wait):
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_bytes = max_bytes
+        self.pool_size = pool_size
+        self.admission_wait = admission_wait
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+        self._pools = {}
+        self._lock = threading.Lock()
+
+    def get(self, url):
+        """GET a URL and return the response body as bytes."""
+        parts = urlsplit(url)
+        origin = (parts.scheme, parts.hostname, parts.port)
+        path = parts.path + ('?' + parts.query if parts.query else '')
+
+        if not self._slots.acquire(timeout=self.admission_wait):
+            raise UpstreamBusyError(f'Too many requests to {parts.hostname} in flight')
+        try:
+            return self._get_with_retries(origin, path)
+        finally:
+            self._slots.release()
+
+    def _get_with_retries(self, origin, path):
+        for attempt in range(self.retries + 1):
+            if attempt:
+                time.sleep(self.backoff * 2 ** (attempt - 1) * random.uniform(0.5, 1.5))
+            try:
+                return self._request(origin, path)
+            except UpstreamTooLargeError:
+                raise
+            except UpstreamError as e:
+                if e.status is not None and e.status not in RETRY_STATUSES:
+                    raise
+                if attempt == self.retries:
+                    raise
+
+    def _pool(self, origin):
+        with self._lock:
+            pool = self._pools.get(origin)
+            if pool is None:
+                pool = self._pools[origin] = queue.LifoQueue(maxsize=self.pool_size)
+            return pool
+
+    def _connect(self, origin):
+        scheme, host, port = origin
+        connection_class = http.client.HTTPSConnection if scheme == 'https' else http.client.HTTPConnection
+        return connection_class(host, port, timeout=self.connect_timeout)
+
+    def _checkout(self, origin):
+        try:
+            return self._pool(origin).get_nowait(), True
+        except queue.Empty:
+            return self._connect(origin), False
+
+    def _checkin(self, origin, conn):
+        try:
+            self._pool(origin).put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    def _request(self, origin, path):
+        conn, reused = self._checkout(origin)
+        while True:
+            try:
+                status, body, reusable = self._exchange(conn, path)
+                break
+            except (http.client.HTTPException, OSError) as e:
+                conn.close()
+                # Amion may have closed a pooled connection while it sat idle
+                if reused and not isinstance(e, TimeoutError):
+                    conn, reused = self._connect(origin), False
+                    continue
+                raise UpstreamError(f'Request to {origin[1]} failed: {e}') from e
+            except UpstreamError:
+                conn.close()
+                raise
+
+        if reusable:
+            self._checkin(origin, conn)
+        else:
+            conn.close()
+
+        if not 200 <= status < 300:
+            raise UpstreamError(f'{origin[1]} returned HTTP {status}', status)
+        return body
+
+    def _exchange(self, conn, path):
+        if conn.sock is None:
+            conn.connect()
+            conn.sock.settimeout(self.read_timeout)
+        conn.request('GET', path)
+        response = conn.getresponse()
+
+        length = response.getheader('Content-Length')
+        if length and length.isdigit() and int(length) > self.max_bytes:
+            raise UpstreamTooLargeError(f'Response of {length} bytes exceeds the {self.max_bytes} byte limit')
+        body = response.read(self.max_bytes + 1)
+        if len(body) > self.max_bytes:
+            raise UpstreamTooLargeError(f'Response exceeds the {self.max_bytes} byte limit')
+
+        # Only hand the connection back if the response was fully consumed
+        return response.status, body, response.isclosed() and not response.will_close
+
+client = UpstreamClient(
+    connect_timeout=Config.UPSTREAM_CONNECT_TIMEOUT,
+    read_timeout=Config.UPSTREAM_READ_TIMEOUT,
+    retries=Config.UPSTREAM_RETRIES,
+    backoff=Config.UPSTREAM_BACKOFF,
+    max_bytes=Config.UPSTREAM_MAX_BYTES,
+    pool_size=Config.UPSTREAM_POOL_SIZE,
+    max_concurrent=Config.UPSTREAM_MAX_CONCURRENT,
+    admission_wait=Config.UPSTREAM_ADMISSION_WAIT,
+)